@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+'''
+Peak memory and wall time of streaming convertuw on a synthetic image
+
+Inputs are sparse files so only the output .uw is written to disk.
+
+Usage:
+python benchmarks/bench_convertuw.py --nr 20000 --na 60000 -b 1024
+python benchmarks/bench_convertuw.py --nr 20000 --na 60000 --looks 2 4
+'''
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from isce2grimp.util.convertuw import convertuw
+from isce2grimp.util.multilook import parse_looks
+from isce2grimp.util.profiling import peak_rss
+
+GEODAT = Path(__file__).parent.parent / 'tests' / 'data' / 'geodat30x6.in'
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark convertuw')
+    parser.add_argument('--nr', type=int, default=20000,
+                        help='range samples')
+    parser.add_argument('--na', type=int, default=60000,
+                        help='azimuth lines')
+    parser.add_argument('-b', type=int, dest='nlines', default=1024,
+                        help='azimuth lines per block')
+    parser.add_argument('--looks', type=parse_looks, nargs='+', default=[],
+                        help='coarser levels, e.g. 2 4x2')
+    parser.add_argument('-d', type=str, dest='tmpdir', default=None,
+                        help='scratch directory')
+    return parser
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    with tempfile.TemporaryDirectory(dir=inps.tmpdir) as tmpdir:
+        isceUNW = os.path.join(tmpdir, 'filt_topophase.unw')
+        with open(isceUNW, 'wb') as f:
+            f.truncate(inps.nr * 2 * inps.na * 4)
+        with open(isceUNW + '.conncomp', 'wb') as f:
+            f.truncate(inps.nr * inps.na)
+        geodat = os.path.join(tmpdir, 'geodat30x6.in')
+        with open(GEODAT) as f:
+            text = f.read()
+        with open(geodat, 'w') as f:
+            f.write(text.replace('2218  2270', f'{inps.nr}  {inps.na}'))
+
+        rss0 = peak_rss()
+        t0 = time.perf_counter()
+        convertuw(isceUNW, geodat, nlines=inps.nlines, looks=inps.looks)
+        elapsed = time.perf_counter() - t0
+
+    size = inps.nr * inps.na * 4 / 1024**2
+    print(f'{inps.nr} x {inps.na} ({size:.0f} MB .uw), {inps.nlines} lines/block'
+          f', looks {inps.looks}')
+    print(f'wall time: {elapsed:.1f} s')
+    print(f'peak RSS: {peak_rss():.1f} MB (before conversion {rss0:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+'''
+Single-stream vs multi-connection download throughput from a local server
+that throttles each connection (like a busy archive or a long fat network)
+
+Usage:
+python benchmarks/bench_download.py --size 200 --rate 20 --connections 1 2 4 8
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from tests.httpstub import serve  # noqa: E402
+from isce2grimp.util.download import MB, downloader  # noqa: E402
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark downloads')
+    parser.add_argument('--size', type=int, default=200, help='file MB')
+    parser.add_argument('--rate', type=float, default=20,
+                        help='per-connection server limit MB/s (0 for none)')
+    parser.add_argument('--chunk', type=int, default=16, help='MB per range')
+    parser.add_argument('--connections', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('-d', type=str, dest='tmpdir', default=None,
+                        help='scratch directory')
+    return parser
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    data = np.random.default_rng(0).bytes(inps.size*MB)
+    server, url = serve({'/scene.zip': data}, rate=inps.rate*MB or None)
+    print(f'{inps.size} MB file, server limit {inps.rate} MB/s per connection')
+    with tempfile.TemporaryDirectory(dir=inps.tmpdir) as tmpdir:
+        for n in inps.connections:
+            dest = os.path.join(tmpdir, f'scene-{n}.zip')
+            dl = downloader(workers=1, connections=n,
+                            chunkSize=inps.chunk*MB, log=lambda x: None)
+            t0 = time.perf_counter()
+            if n == 1:
+                # plain streaming GET, as wget does
+                dl.probe = lambda url: (None, False)
+            dl.fetch(f'{url}/scene.zip', dest, size=len(data))
+            dt = time.perf_counter() - t0
+            label = 'single stream' if n == 1 else f'{n} connections'
+            print(f'{label:20s} {dt:8.2f} s {inps.size/dt:8.1f} MB/s')
+            dl.close()
+            os.remove(dest)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
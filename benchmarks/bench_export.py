@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+'''
+Storage size and window read latency of the .uw against its COG and Zarr
+copies
+
+A synthetic interferogram (smooth phase plus noise, a masked band and
+three connected components) is converted with export to every available
+format. Then --nwindows random -w x -w windows are read from each: the
+.uw as readImage (whole image) and as a memory map, the COG with a
+rasterio windowed read and the Zarr array by slicing (if zarr is
+installed). Reads are from the page cache, so latency is decode cost.
+The COG export is also timed on its own: the streamed pass into the
+temporary GeoTIFF, its size, and the COG driver's second pass over it.
+
+Usage:
+python benchmarks/bench_export.py --nr 5000 --na 10000 -w 256
+'''
+import argparse
+import importlib.util
+import os
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.windows import Window
+
+from isce2grimp.util.convertuw import NODATA, convertuw
+from isce2grimp.util.export import cogWriter
+from isce2grimp.util.readImage import mmapImage, readImage
+
+GEODAT = Path(__file__).parent.parent / 'tests' / 'data' / 'geodat30x6.in'
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark .uw exports')
+    parser.add_argument('--nr', type=int, default=5000, help='range samples')
+    parser.add_argument('--na', type=int, default=10000,
+                        help='azimuth lines')
+    parser.add_argument('-w', type=int, dest='window', default=256,
+                        help='window size')
+    parser.add_argument('--nwindows', type=int, default=50,
+                        help='windows read per format')
+    parser.add_argument('-d', type=str, dest='tmpdir', default=None,
+                        help='scratch directory')
+    return parser
+
+
+def synthetic(tmpdir, nr, na):
+    rng = np.random.default_rng(0)
+    isceUNW = os.path.join(tmpdir, 'filt_topophase.unw')
+    cc = np.ones((na, nr), dtype='u1')
+    cc[:, nr // 3:2 * nr // 3] = 2
+    cc[na // 2:na // 2 + na // 10] = 0
+    with open(isceUNW, 'wb') as f:
+        x = np.linspace(0, 30, nr, dtype='f4')
+        for line in range(na):
+            phase = x * np.cos(line / na) + rng.normal(0, 0.3, nr)
+            np.concatenate([np.ones(nr, 'f4'), phase.astype('f4')]).tofile(f)
+    cc.tofile(isceUNW + '.conncomp')
+    geodat = os.path.join(tmpdir, 'geodat30x6.in')
+    with open(geodat, 'w') as f:
+        f.write(GEODAT.read_text().replace('2218  2270', f'{nr}  {na}'))
+    return isceUNW, geodat
+
+
+def size(path):
+    path = Path(path)
+    if path.is_dir():
+        return sum(x.stat().st_size for x in path.rglob('*') if x.is_file())
+    return path.stat().st_size
+
+
+def cog_passes(uwFile, nr, na, nlines=1024):
+    ''' (streamed pass s, temporary MB, COG pass s) for the .uw phase '''
+    uw = mmapImage(uwFile, nr, na, '>f4')
+    path = f'{uwFile}.bench.tif'
+    t0 = time.perf_counter()
+    with warnings.catch_warnings():
+        # no GCPs here, only the passes are timed
+        warnings.simplefilter('ignore', NotGeoreferencedWarning)
+        writer = cogWriter(path, nr, na, 'float32', NODATA)
+    for line in range(0, na, nlines):
+        writer.add(uw[line:line + nlines])
+    t1 = time.perf_counter()
+    # close() flushes the last rows of tiles, then makes the COG
+    writer.close()
+    t2 = time.perf_counter()
+    uw._mmap.close()
+    os.remove(path)
+    return t1 - t0, writer.tmpBytes / 1024**2, t2 - t1
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    nr, na, w = inps.nr, inps.na, inps.window
+    formats = ['cog'] + (['zarr'] if importlib.util.find_spec('zarr') else [])
+    rng = np.random.default_rng(1)
+    corners = list(zip(rng.integers(0, na - w, inps.nwindows),
+                       rng.integers(0, nr - w, inps.nwindows)))
+
+    with tempfile.TemporaryDirectory(dir=inps.tmpdir) as tmpdir:
+        isceUNW, geodat = synthetic(tmpdir, nr, na)
+        t0 = time.perf_counter()
+        convertuw(isceUNW, geodat, export=[])
+        plain = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        convertuw(isceUNW, geodat, export=formats)
+        exported = time.perf_counter() - t0
+        uwFile = isceUNW.replace('unw', 'uw')
+
+        readers = {}
+        readers['uw readImage'] = (
+            uwFile, lambda r, c: readImage(uwFile, nr, na, '>f4')[r:r+w, c:c+w])
+        uw = mmapImage(uwFile, nr, na, '>f4')
+        readers['uw mmap'] = (uwFile, lambda r, c: np.array(uw[r:r+w, c:c+w]))
+        src = rasterio.open(f'{uwFile}.tif')
+        readers['cog window'] = (
+            f'{uwFile}.tif',
+            lambda r, c: src.read(1, window=Window(c, r, w, w)))
+        if 'zarr' in formats:
+            import zarr
+            store = isceUNW.replace('.unw', '.zarr')
+            phase = zarr.open_group(store, mode='r')['phase']
+            readers['zarr slice'] = (store, lambda r, c: phase[r:r+w, c:c+w])
+
+        print(f'{nr} x {na}, convertuw {plain:.1f} s, with {formats} '
+              f'{exported:.1f} s')
+        print(f'{"reader":14s} {"size (MB)":>10s} {"median (ms)":>12s} '
+              f'{"p95 (ms)":>9s}')
+        for name, (path, read) in readers.items():
+            times = []
+            for r, c in corners[:5 if 'readImage' in name else None]:
+                t0 = time.perf_counter()
+                read(r, c)
+                times.append((time.perf_counter() - t0) * 1e3)
+            print(f'{name:14s} {size(path) / 1024**2:10.1f} '
+                  f'{np.median(times):12.2f} {np.percentile(times, 95):9.2f}')
+        src.close()
+        uw._mmap.close()
+        if 'cog' in formats:
+            first, tmpMB, second = cog_passes(uwFile, nr, na)
+            print(f'cog export: {first:.2f} s to the {tmpMB:.1f} MB '
+                  f'temporary GeoTIFF, {second:.2f} s to the COG')
+
+
+if __name__ == '__main__':
+    main()
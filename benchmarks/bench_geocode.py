@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+'''
+Compare scalar geodatrxa.llzPtToRA against the vectorized llzToRA
+
+The scalar path is timed on at most --nscalar points and extrapolated.
+
+Usage:
+python benchmarks/bench_geocode.py -n 1000 100000 10000000
+'''
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from isce2grimp.util import geodatrxa
+from isce2grimp.util.profiling import peak_rss
+
+GEODAT = Path(__file__).parent.parent / 'tests' / 'data' / 'geodat30x6.in'
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark geocoding')
+    parser.add_argument('-n', type=int, nargs='+', dest='npoints',
+                        default=[1000, 100000, 10000000],
+                        help='number of points')
+    parser.add_argument('--nscalar', type=int, default=1000,
+                        help='max points for the scalar path')
+    parser.add_argument('-g', type=str, dest='geodat', default=str(GEODAT),
+                        help='geodat file')
+    return parser
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    geodat = geodatrxa(file=inps.geodat)
+    lat0, lon0 = geodat.corners[4]
+    rng = np.random.default_rng(0)
+    print(f'{"points":>10s} {"scalar (s)":>12s} {"vector (s)":>12s} '
+          f'{"speedup":>8s} {"peak RSS":>10s}')
+    for n in inps.npoints:
+        lat = lat0 + rng.uniform(-0.8, 0.8, n)
+        lon = lon0 + rng.uniform(-3, 3, n)
+        z = rng.uniform(0, 3000, n)
+
+        t0 = time.perf_counter()
+        geodat.llzToRA(lat, lon, z)
+        vector = time.perf_counter() - t0
+
+        ns = min(n, inps.nscalar)
+        t0 = time.perf_counter()
+        for i in range(ns):
+            geodat.llzPtToRA(lat[i], lon[i], z[i])
+        scalar = (time.perf_counter() - t0) * n / ns
+
+        print(f'{n:10d} {scalar:12.2f} {vector:12.3f} {scalar/vector:8.0f} '
+              f'{peak_rss():8.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+'''
+Opens per second for many generated geodat files
+
+eager   : parse and build the pyproj transformer (cost of every open
+          before the transformer was deferred)
+parse   : parse only
+cold    : parse and write the .cache.json sidecar
+warm    : read the sidecar
+
+Usage:
+python benchmarks/bench_geodat_open.py -n 10000
+'''
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from isce2grimp.util import geodatrxa
+
+GEODAT = Path(__file__).parent.parent / 'tests' / 'data' / 'geodat30x6.in'
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark geodat opens')
+    parser.add_argument('-n', type=int, dest='nfiles', default=10000,
+                        help='number of geodat files')
+    parser.add_argument('-d', type=str, dest='tmpdir', default=None,
+                        help='scratch directory')
+    return parser
+
+
+def open_all(files, mode):
+    t0 = time.perf_counter()
+    for file in files:
+        if mode == 'eager':
+            geodatrxa(file=file).llzToEcef
+        elif mode == 'parse':
+            geodatrxa(file=file)
+        else:
+            geodatrxa(file=file, cache=True)
+    return len(files) / (time.perf_counter() - t0)
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    with open(GEODAT) as f:
+        text = f.read()
+    with tempfile.TemporaryDirectory(dir=inps.tmpdir) as tmpdir:
+        files = []
+        for i in range(inps.nfiles):
+            file = os.path.join(tmpdir, f'geodat30x6.{i}.in')
+            with open(file, 'w') as f:
+                f.write(text.replace('2218  2270', f'{2218 + i}  2270'))
+            files.append(file)
+        for mode in ['eager', 'parse', 'cold', 'warm']:
+            print(f'{mode:6s} {open_all(files, mode):10.0f} opens/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+'''
+Time the per-pixel geometry layers for a geodat file
+
+Computes all layers with 1..--workers processes and reports pixels per
+second and peak memory.
+
+Usage:
+python benchmarks/bench_geometry.py -w 1 4 8 -b 256
+'''
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from isce2grimp.util import geodatrxa
+from isce2grimp.util.geometry import geometry_layers
+from isce2grimp.util.profiling import peak_rss
+
+GEODAT = Path(__file__).parent.parent / 'tests' / 'data' / 'geodat30x6.in'
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark geometry layers')
+    parser.add_argument('-w', type=int, nargs='+', dest='workers',
+                        default=[1, 2, 4], help='worker processes')
+    parser.add_argument('-b', type=int, dest='nlines', default=256,
+                        help='azimuth lines per block')
+    parser.add_argument('-g', type=str, dest='geodat', default=str(GEODAT),
+                        help='geodat file')
+    parser.add_argument('--dem', type=str, dest='dem', default=None,
+                        help='EPSG:4326 DEM')
+    return parser
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    geodat = geodatrxa(file=inps.geodat)
+    npixels = geodat.nr * geodat.na
+    print(f'{geodat.nr} x {geodat.na} pixels, {inps.nlines} lines per block')
+    print(f'{"workers":>8s} {"seconds":>9s} {"Mpixel/s":>9s} {"peak RSS":>10s}')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for workers in inps.workers:
+            t0 = time.perf_counter()
+            geometry_layers(inps.geodat, f'{tmpdir}/geometry', dem=inps.dem,
+                            nlines=inps.nlines, workers=workers)
+            seconds = time.perf_counter() - t0
+            print(f'{workers:8d} {seconds:9.2f} {npixels/seconds/1e6:9.2f} '
+                  f'{peak_rss():8.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
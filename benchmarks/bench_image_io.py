@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+'''
+Compare peak RSS and wall time of readImage/writeImage against the
+memory-mapped mmapImage/readImageBlocks/writeImageBlocks
+
+Each case runs in a fresh process so peak RSS is not shared between cases.
+
+Usage:
+python benchmarks/bench_image_io.py --nx 20000 --ny 20000
+'''
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import isce2grimp.util as u
+from isce2grimp.util.profiling import peak_rss
+
+CASES = ['readImage', 'mmapImage', 'readImageBlocks',
+         'writeImage', 'writeImageBlocks']
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark image io')
+    parser.add_argument('--nx', type=int, default=20000, help='samples')
+    parser.add_argument('--ny', type=int, default=20000, help='lines')
+    parser.add_argument('-b', type=int, dest='nlines', default=1024,
+                        help='lines per block')
+    parser.add_argument('-d', type=str, dest='tmpdir', default=None,
+                        help='scratch directory')
+    parser.add_argument('--case', type=str, choices=CASES,
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--file', type=str, help=argparse.SUPPRESS)
+    return parser
+
+
+def run_case(inps):
+    ''' time one case and compute the image sum so all data is touched '''
+    nx, ny, nlines = inps.nx, inps.ny, inps.nlines
+    t0 = time.perf_counter()
+    if inps.case == 'readImage':
+        total = u.readImage(inps.file, nx, ny, '>f4').sum(dtype='f8')
+    elif inps.case == 'mmapImage':
+        x = u.mmapImage(inps.file, nx, ny, '>f4')
+        total = sum(x[i:i+nlines].sum(dtype='f8') for i in range(0, ny, nlines))
+    elif inps.case == 'readImageBlocks':
+        total = sum(b.sum(dtype='f8') for _, b in
+                    u.readImageBlocks(inps.file, nx, ny, '>f4', nlines))
+    elif inps.case == 'writeImage':
+        x = np.ones((ny, nx), dtype='f4')
+        u.writeImage(inps.file + '.out', x, '>f4')
+        total = 0
+    elif inps.case == 'writeImageBlocks':
+        blocks = (np.ones((min(nlines, ny - i), nx), dtype='f4')
+                  for i in range(0, ny, nlines))
+        u.writeImageBlocks(inps.file + '.out', blocks, nx, ny, '>f4')
+        total = 0
+    print(f'{inps.case:18s} {time.perf_counter() - t0:8.2f} s '
+          f'{peak_rss():10.1f} MB  ({total:.0f})')
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    if inps.case:
+        run_case(inps)
+        return
+
+    with tempfile.TemporaryDirectory(dir=inps.tmpdir) as tmpdir:
+        fileName = os.path.join(tmpdir, 'image')
+        blocks = (np.full((min(inps.nlines, inps.ny - i), inps.nx), 1.0)
+                  for i in range(0, inps.ny, inps.nlines))
+        u.writeImageBlocks(fileName, blocks, inps.nx, inps.ny, '>f4')
+        size = inps.nx * inps.ny * 4 / 1024**2
+        print(f'{inps.nx} x {inps.ny} >f4 image ({size:.0f} MB)')
+        print(f'{"case":18s} {"wall":>10s} {"peak RSS":>13s}')
+        for case in CASES:
+            cmd = [sys.executable, __file__, '--nx', str(inps.nx),
+                   '--ny', str(inps.ny), '-b', str(inps.nlines),
+                   '--case', case, '--file', fileName]
+            subprocess.run(cmd)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+'''
+Single-path query time from the layered GPKG vs the GeoParquet store
+
+Usage:
+python benchmarks/bench_inventory.py --paths 40 --nacq 500 --nframes 50
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from tests.synthetic import make_inventory, write_gpkg  # noqa: E402
+from isce2grimp.util import inventory  # noqa: E402
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark inventory reads')
+    parser.add_argument('--paths', type=int, default=40,
+                        help='number of relative orbits')
+    parser.add_argument('--nacq', type=int, default=500,
+                        help='acquisitions per path')
+    parser.add_argument('--nframes', type=int, default=50,
+                        help='frames per acquisition')
+    parser.add_argument('-d', type=str, dest='tmpdir', default=None,
+                        help='scratch directory')
+    return parser
+
+
+def timed(label, **kwargs):
+    t0 = time.perf_counter()
+    gf = inventory.read_inventory(**kwargs)
+    print(f'{label:45s} {time.perf_counter() - t0:8.3f} s {len(gf):8d} rows')
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    gf = make_inventory(paths=range(1, inps.paths + 1), start='2016-01-01',
+                        nacq=inps.nacq, nframes=inps.nframes)
+    print(f'{len(gf)} scenes')
+    with tempfile.TemporaryDirectory(dir=inps.tmpdir) as tmpdir:
+        gpkg = os.path.join(tmpdir, 'asf_inventory.gpkg')
+        store = os.path.join(tmpdir, 'asf_inventory.parquet')
+        missing = os.path.join(tmpdir, 'missing')
+        write_gpkg(gf, gpkg)
+        inventory.gpkg_to_parquet(gpkg, store)
+        del gf
+        query = dict(path=17, start='2018-01-01', end='2018-12-31', frame=210)
+        for label, source in [('gpkg', missing), ('parquet', store)]:
+            timed(f'{label}: path 17', path=17, gpkg=gpkg, store=source)
+            timed(f'{label}: path 17, 2018, frame 210', **query,
+                  gpkg=gpkg, store=source)
+            timed(f'{label}: path 17, 2018, frame 210, 3 columns', **query,
+                  columns=['orbit', 'startTime', 'url'], gpkg=gpkg,
+                  store=source)
+
+
+if __name__ == '__main__':
+    main()
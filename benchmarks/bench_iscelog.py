@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+'''
+Ascending node time from a long isce.log: grep | cut subprocess (as
+convert_isce used to do) vs the memory mapped iscelog scan
+
+Usage:
+python benchmarks/bench_iscelog.py --lines 2000000 --restarts 1
+'''
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from tests.synthetic import write_isce_log  # noqa: E402
+from isce2grimp.util.iscelog import read_sensor_metadata  # noqa: E402
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark isce.log scan')
+    parser.add_argument('--lines', type=int, default=2000000,
+                        help='processing lines after each catalog')
+    parser.add_argument('--restarts', type=int, default=1,
+                        help='restarted runs appended to the log')
+    parser.add_argument('--repeat', type=int, default=5)
+    return parser
+
+
+def grep(intdir):
+    cmd = (f'grep reference.sensor.ascendingnodetime {intdir}/isce.log '
+           f'| cut -d "=" -f2')
+    r = subprocess.run(cmd, stdout=subprocess.PIPE, universal_newlines=True,
+                       shell=True)
+    return r.stdout.split('\n')[0].strip()
+
+
+def scan(intdir):
+    return read_sensor_metadata(intdir)['reference.sensor.ascendingnodetime']
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    with tempfile.TemporaryDirectory() as intdir:
+        size = write_isce_log(os.path.join(intdir, 'isce.log'),
+                              nfiller=inps.lines, restarts=inps.restarts)
+        print(f'isce.log {size / 1024**2:.0f} MB')
+        results = {}
+        for name, func in [('grep | cut', grep), ('iscelog', scan)]:
+            times = []
+            for _ in range(inps.repeat):
+                t0 = time.perf_counter()
+                results[name] = func(intdir)
+                times.append(time.perf_counter() - t0)
+            print(f'{name:<12} {min(times)*1e3:10.2f} ms  ({results[name]})')
+        assert len(set(results.values())) == 1
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+'''
+Frame-overlap search on one path layer: per-row shapely map (as prep_stack
+used to do over a 200 row window) vs the STRtree overlapIndex over all rows
+
+Usage:
+python benchmarks/bench_overlap.py --nacq 2500 --nframes 20 --queries 20
+'''
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from tests.synthetic import make_inventory  # noqa: E402
+from isce2grimp.util.overlap import overlapIndex  # noqa: E402
+
+
+def cmdLineParse():
+    parser = argparse.ArgumentParser(description='benchmark overlap search')
+    parser.add_argument('--nacq', type=int, default=2500,
+                        help='acquisitions in the path layer')
+    parser.add_argument('--nframes', type=int, default=20,
+                        help='frames per acquisition')
+    parser.add_argument('--queries', type=int, default=20,
+                        help='reference footprints to search for')
+    return parser
+
+
+def main():
+    inps = cmdLineParse().parse_args()
+    gf = make_inventory(paths=(90,), start='2015-01-01', nacq=inps.nacq,
+                        nframes=inps.nframes, jitter=0.8)
+    print(f'{len(gf)} scenes')
+    refs = gf.geometry.iloc[np.linspace(0, len(gf) - 1, inps.queries,
+                                        dtype=int)]
+
+    t0 = time.perf_counter()
+    for ref in refs:
+        old = gf.geometry.map(lambda x: x.intersection(ref).area/ref.area)
+    dt = (time.perf_counter() - t0) / inps.queries
+    print(f'{"map over all rows":30s} {dt:8.4f} s/query')
+
+    t0 = time.perf_counter()
+    index = overlapIndex(gf)
+    print(f'{"build STRtree":30s} {time.perf_counter() - t0:8.4f} s')
+    t0 = time.perf_counter()
+    for ref in refs:
+        new = index.fractions(ref)
+    dt2 = (time.perf_counter() - t0) / inps.queries
+    print(f'{"overlapIndex.fractions":30s} {dt2:8.4f} s/query '
+          f'({dt/dt2:.0f}x)')
+    assert np.allclose(old, new)
+
+    # one year of a long stack
+    start = gf.startTime.iloc[len(gf)//2]
+    end = start + np.timedelta64(365, 'D')
+    t0 = time.perf_counter()
+    for ref in refs:
+        index.fractions(ref, start=start, end=end)
+    dt3 = (time.perf_counter() - t0) / inps.queries
+    print(f'{"overlapIndex.fractions 1 year":30s} {dt3:8.4f} s/query '
+          f'({dt/dt3:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
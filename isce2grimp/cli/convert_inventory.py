@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+'''
+Convert the layered GPKG inventory into a GeoParquet store partitioned by
+relative orbit and year. Once the store exists query_inventory, prep_pair
+and prep_stack read from it, and update_inventory keeps it up to date.
+
+Usage:
+convert_inventory
+convert_inventory -i asf_inventory.gpkg -o asf_inventory.parquet --overwrite
+'''
+import argparse
+from isce2grimp.util.inventory import INVENTORY, PARQUET, gpkg_to_parquet
+
+
+def cmdLineParse():
+    """Command line parser."""
+    parser = argparse.ArgumentParser(description="GPKG inventory to GeoParquet")
+    parser.add_argument(
+        "-i", type=str, dest="gpkg", default=str(INVENTORY), help="input GPKG"
+    )
+    parser.add_argument(
+        "-o", type=str, dest="store", default=str(PARQUET),
+        help="output parquet directory"
+    )
+    parser.add_argument(
+        "--overwrite", action='store_true', default=False,
+        help="replace existing parquet store"
+    )
+
+    return parser
+
+
+def main():
+    """Run as a script with args coming from argparse."""
+    parser = cmdLineParse()
+    inps = parser.parse_args()
+    print(f'Converting {inps.gpkg} to {inps.store}...')
+    gpkg_to_parquet(inps.gpkg, inps.store, overwrite=inps.overwrite)
+
+
+if __name__ == "__main__":
+    main()
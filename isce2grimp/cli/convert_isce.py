@@ -9,67 +9,135 @@ convertuw.py for GrIMP offset processing.
 - maybe look at contrib/frameUtils/FrameInfoExtractor.py
 
 # Common errors:
-ValueError: time data '' does not match format '%Y-%m-%d %H:%M:%S.%f'
-*currently a bit of a hack solution to extract time from isce.log, so make sure it is in the int directory
+ValueError: reference.sensor.ascendingnodetime not in .../isce.log or the product XMLs in ...
+*ascending node time is read from isce.log in the int directory, or referencedir/fine_coreg IW*.xml
+
+Corners, centroid, incidence and the optional --footprint outline come
+from a vectorized zero-Doppler solver on the merged orbit
+(isce2grimp.util.geolocate) rather than ISCE's per-point rdr2geo.
+-c --looks 2 4x2 also writes filt_topophase.RLxAL.uw with geodatRLxAL.in for
+each factor (range x azimuth, relative to the topsApp looks), averaged in
+the same pass weighted by connected component and merged/phsig.cor.
+-c --export cog zarr also writes the .uw and .conncomp as cloud optimized
+GeoTIFFs and/or a Zarr store (radar coordinates, geodat as tags). The
+COGs are made from temporary uncompressed GeoTIFFs in OUTDIR, which the
+COG driver reads once more to compress them and add overviews.
+--geometry writes per-pixel lat, lon, incidence, heading and look vector
+layers in the .uw geometry (isce2grimp.util.geometry), on the ellipsoid
+or on --dem.
+
+The first conversion caches the product metadata it needs in
+INTDIR/isce2grimp.metadata.json, later conversions read it and skip
+loading the ISCE products.
+
+Products are copied to OUTDIR by a few threads, cloned or (--hardlink)
+linked on the same filesystem, with a sha256 manifest in
+OUTDIR/isce2grimp.manifest.json; unchanged files are not copied again.
+--copy-merged also copies merged/, --zstd compresses its large rasters.
+
+Each stage's wall time, CPU time and peak memory are written to
+OUTDIR/convert_isce.stages.json, --profile also writes cProfile stats to
+OUTDIR/convert_isce.prof (view with python -m pstats or snakeviz).
 
 Example:
 convert_isce.py -c -i /Volumes/insar10/scott/isce-frames/2018-11/A90-13416-24487 -o /Volumes/insar10/scott/grimpout/2018-11/A90-13416-24487
 
+Batch mode: with several -i directories or a glob, each directory is
+converted to OUTDIR/<intdir name> by -w worker processes (each imports
+ISCE once), directories whose outputs are newer than their ISCE products
+are skipped unless --force, and a summary table is printed at the end.
+convert_isce.py -c -i '/Volumes/insar10/scott/isce-frames/2018-11/A90-*' -o /Volumes/insar10/scott/grimpout/2018-11 -w 8
+
 Author: Scott Henderson
 Date: 05/02/2019
 '''
-import isce
-from imageMath import IML
-from iscesys import DateTimeUtil as DTU
-from topsApp import TopsInSAR
-from isceobj.Planet.Planet import Planet
-from subprocess import PIPE, run
-import numpy as np
+import sys
 import argparse
 import datetime
 import os
 import glob
-import shutil
+import json
 
 import isce2grimp.util as u 
-
-# Hard coded values for Sentinel-1 IW Mode
-# -----------------
-params = {}
-params['look_direction'] = 'right'
-params['wavelength'] = 0.05546576
-params['range_posting'] = 2.329562
-params['az_posting'] = 13.894780
-params['sv_dt'] = 10.0
-params['ReMajor'] = 6378.1370
-params['ReMinor'] = 6356.7520
-# ----------------
-
+from isce2grimp.util.batch import expand_dirs, format_summary, run_batch
+from isce2grimp.util.export import FORMATS
+from isce2grimp.util.geolocate import footprint, scene_geometry
+from isce2grimp.util.geometry import geometry_layers
+from isce2grimp.util.iscelog import parse_time, read_sensor_metadata
+from isce2grimp.util.metadata import (METADATA, geodat_params, load_metadata,
+                                      multilook_metadata, orbit_metadata,
+                                      save_metadata, swath_metadata,
+                                      write_geodat_config)
+from isce2grimp.util.multilook import parse_looks
+from isce2grimp.util.profiling import profiled, stageTimer
+from isce2grimp.util.transfer import transfer
 
 def cmdLineParse():
     """Command line parser."""
     parser = argparse.ArgumentParser(
                         description='convert ISCE outputs to GrIMP')
     parser.add_argument('-i', type=str, dest='intdir', required=True,
-                        help='path to ISCE int-date1-date2 directory')
+                        nargs='+',
+                        help='path to ISCE int-date1-date2 directory (several or a glob for batch mode)')
     parser.add_argument('-o', type=str, dest='outdir', required=True,
-                        help='path to output directory')
+                        help='path to output directory (parent directory in batch mode)')
     parser.add_argument('-c', dest='convert', action='store_true',
                         required=False, default=False,
                         help='Run convertuw.py in output folder')
+    parser.add_argument('-b', type=int, dest='nlines', required=False,
+                        default=1024,
+                        help='azimuth lines per block when converting .unw')
+    parser.add_argument('--looks', type=parse_looks, dest='looks',
+                        nargs='+', required=False, default=[],
+                        metavar='RxA',
+                        help='with -c, also write .uw coarser by these factors (e.g. 2 4x2)')
+    parser.add_argument('--export', type=str, dest='export', nargs='+',
+                        choices=FORMATS, required=False, default=[],
+                        help='with -c, also write tiled copies of the .uw and .conncomp '
+                             '(cog needs a temporary uncompressed GeoTIFF of each, '
+                             '5 bytes per pixel in all, read again to make the COG)')
+    parser.add_argument('--copy-merged', dest='merged', action='store_true',
+                        required=False, default=False,
+                        help='also copy the whole merged/ directory to OUTDIR/merged')
+    parser.add_argument('--zstd', dest='compress', action='store_true',
+                        required=False, default=False,
+                        help='store OUTDIR/merged rasters of 64 MB or more zstd compressed')
+    parser.add_argument('--hardlink', dest='hardlink', action='store_true',
+                        required=False, default=False,
+                        help='hardlink instead of copying when OUTDIR is on the same filesystem')
+    parser.add_argument('--copy-workers', type=int, dest='copyWorkers',
+                        required=False, default=4,
+                        help='parallel file copies')
+    parser.add_argument('--profile', dest='profile', action='store_true',
+                        required=False, default=False,
+                        help='write cProfile stats to OUTDIR/convert_isce.prof')
+    parser.add_argument('-w', type=int, dest='workers', required=False,
+                        default=1,
+                        help='worker processes in batch mode')
+    parser.add_argument('--force', dest='force', action='store_true',
+                        required=False, default=False,
+                        help='convert directories that are already up to date')
+    parser.add_argument('--footprint', type=float, dest='footprint',
+                        required=False, default=None, metavar='KM',
+                        help='write OUTDIR/footprint.geojson with a point every KM along the edges')
+    parser.add_argument('--geometry', dest='geometry', action='store_true',
+                        required=False, default=False,
+                        help='write per-pixel geometry layers OUTDIR/geometryRLxAL.*')
+    parser.add_argument('--dem', type=str, dest='dem', required=False,
+                        default=None,
+                        help='EPSG:4326 DEM for --geometry (default ellipsoid)')
+    parser.add_argument('--refresh-metadata', dest='refresh',
+                        action='store_true', required=False, default=False,
+                        help='reload the ISCE products even if INTDIR/isce2grimp.metadata.json is current')
     return parser
 
 
-def get_ascNodeTime():
+def get_ascNodeTime(intdir):
     ''' get ascending node time '''
     # self.reference.product.ascendingNodeTime not showing up in python :(
-    cmd = 'grep reference.sensor.ascendingnodetime isce.log | cut -d "=" -f2'
-    r = run(cmd, stdout=PIPE, stderr=PIPE, universal_newlines=True, shell=True)
-    result = r.stdout.split('\n')[0].strip() # get rid of extra occurances from restarts
-    fmt = "%Y-%m-%d %H:%M:%S.%f"
-    ascNodeTime = datetime.datetime.strptime(result, fmt)
-    with open('ascendingNodeTime', 'w') as f:
-        f.write(ascNodeTime.strftime("%Y-%m-%dT%H:%M:%S.%f"))
+    # first occurrence in isce.log (restarts repeat it), else product XMLs
+    fields = read_sensor_metadata(intdir)
+    ascNodeTime = parse_time(fields['reference.sensor.ascendingnodetime'])
 
     return ascNodeTime
 
@@ -83,13 +151,13 @@ def get_frame_number(burstTime, ascNodeTime):
     return frame
 
 
-def get_frames(self):
+def get_frames(self, intdir):
     ''' get collection of all bursts used in processing '''
     # self is instance of topsApp.TopsInSAR
     frames = []
     for swath in self.catalog['swaths']:
         referenceProduct = self._insar.loadProduct(os.path.join(
-            self._insar.fineCoregDirname, 'IW{0}.xml'.format(swath)))
+            intdir, self._insar.fineCoregDirname, 'IW{0}.xml'.format(swath)))
         frames.append(referenceProduct)
 
     return frames
@@ -103,21 +171,6 @@ def get_merged_orbit(self, frames):
     return mergedOrbit
 
 
-def get_statevecs(mergedOrbit):
-    ''' Read topsApp.xml configuration/run topsApp programmatically '''
-
-    nvecs = len(mergedOrbit._stateVectors)
-    svt0 = DTU.seconds_since_midnight(
-                            mergedOrbit._stateVectors[0].getTime())
-    sv_list = []
-    for sv in mergedOrbit._stateVectors:
-        sv_list.append('{0:.6E} {1:.6E} {2:.6E}'.format(*sv.getPosition()))
-        sv_list.append('{0:.6E} {1:.6E} {2:.6E}'.format(*sv.getVelocity()))
-    stateVecs = '\n'.join(sv_list)
-
-    return nvecs, svt0, stateVecs
-
-
 def get_azimuth_info(self, frames):
     ''' Sensing start, prf '''
     # see /opt/isce2-2.3.1/isce/components/isceobj/TopsProc/runGeocode.py
@@ -159,263 +212,185 @@ def get_ranges(self, frames):
     return rangeFirstSample, rangeMid, rangeFar
 
 
-def get_altitude(orbit, tmid):
-    ''' get spacecraft altitude along orbit at given time '''
-    peg = orbit.interpolateOrbit(tmid, method='hermite')
-    refElp = Planet(pname='Earth').ellipsoid
-    llh = refElp.xyz_to_llh(peg.getPosition())
-    altitude = llh[2]
-
-    return altitude
-
-
-def get_mid_incidence(rangeMid, timeMid, orbit):
-    ''' use trig to calculate incidence angle from ECEF coords'''
-    # currently within 0.5 deg of los.rdr
-    # satellite position
-    peg = orbit.interpolateOrbit(timeMid, method='hermite')
-    sat_ecef = peg.getPosition()  # ecef xyz
-    refElp = Planet(pname='Earth').ellipsoid
-    sat_llh = refElp.xyz_to_llh(sat_ecef)
-    # H = llh[2]
-    Re = refElp.localRadius(sat_llh)
-
-    # image midpoint
-    mid_llh = orbit.rdr2geo(timeMid, rangeMid)
-    mid_ecef = refElp.llh_to_xyz(mid_llh)
-
-    # trig to get phic
-    lam = (np.arccos(
-            np.dot(sat_ecef, mid_ecef) /
-            (np.linalg.norm(sat_ecef) * np.linalg.norm(mid_ecef)))
-           )
-    eta = np.arcsin((Re * np.sin(lam)) / rangeMid)
-    phic = np.degrees(eta + lam)
-
-    return phic
-
-
-def get_corner_coordinates(self, frames, orbit):
-    ''' corner coords based on '''
-    r0, rm, r1 = get_ranges(self, frames)
-    t0, tm, t1 = get_azimuth_info(self, frames)
-    # warning copied from isce rdr2geo documentation:
-    ## Returns point on ground at given height and doppler frequency.
-    ## Never to be used for heavy duty computing.
-    earlyNear = orbit.rdr2geo(t0, r0)[:2]
-    earlyFar = orbit.rdr2geo(t0, r1)[:2]
-    lateFar = orbit.rdr2geo(t1, r1)[:2]
-    lateNear = orbit.rdr2geo(t1, r0)[:2]
-    centroid = orbit.rdr2geo(tm, rm)[:2]
-
-    # string format coords - double check w/ kmls
-    if frames[0].bursts[0].passDirection == 'ASCENDING':
-        ll = '{0:.6f} {1:.6f}'.format(*earlyNear)
-        lr = '{0:.6f} {1:.6f}'.format(*earlyFar)
-        ur = '{0:.6f} {1:.6f}'.format(*lateFar)
-        ul = '{0:.6f} {1:.6f}'.format(*lateNear)
-    else:
-        ur = '{0:.6f} {1:.6f}'.format(*earlyNear)
-        ul = '{0:.6f} {1:.6f}'.format(*earlyFar)
-        ll = '{0:.6f} {1:.6f}'.format(*lateFar)
-        lr = '{0:.6f} {1:.6f}'.format(*lateNear)
-
-    center = '{0:.6f} {1:.6f}'.format(*centroid)
-
-    return ll, lr, ul, ur, center
-
-
-def write_geodat_config(params, outdir):
-    ''' write output geodat.in file for GrIMP processing '''
-    output = '''; Image name: {name}
-; Image date: {date}
-; Image time: {time}
-; Nominal center lat,lon: 0.000000 0.000000
-; track direction: 0.000000
-; S/C altitude: {altitude}
-; Average height above terrain: 0.000000
-; Vel along track: 0.000000
-; PRF :   {prf}
-; near/cen/far range : {ranges}
-; Range pixel spacing :   {rangePixelSpacing}
-; Number of looks (rg,az) :   {rlooks} {alooks}
-; Azimuth pixel spacing :   {azimuthPixelSpacing}
-; Number of pixels (rg,az) :  {shape}
-; Number of state vectors :   {nvecs}
-; Start time of state vectors :   {svt0}
-; Interval between 2 state vectors :   {sv_dt}
-; Look direction  :   1.000000
-; Offset of first recordin complex image (s) : 0.000000
-; Skew offset (s), squint (deg) : 0.000000  0.000000
-;
-; {passDir} Pass
-;
-; rangesize,azimuthsize,nrangelooks,nazimuthlooks
-;
-{width}  {length}  {rlooks}  {alooks}
-;
-; ReMajor, ReMinor, Rc, phic, h
-;
-{ReMajor}    {ReMinor}   {rangeMid_km}  {incidenceMid}   {altitude_km}
-;
-; ll,lr,ul,ur,center
-;
-{ll}
-{lr}
-{ul}
-{ur}
-{center}
-;
-; Range/azimuth single look pixel sizes
-;
-{range_posting}  {az_posting}
-;
-{passDir}
-;
-; Look direction
-;
-right
-;
-; Flag to indicate state vectors and associated data
-;
-state
-; time after squint and skew corrections
-{time}
-; prf
-{prf}
-; wavelength
-{wavelength}
-; number of state vectors
-{nvecs}
-; time of first vector
-{svt0}
-; state vector interval
-{sv_dt}
-; state vectors
-{stateVecs}
-'''.format(**params)
-    outpath = f"{outdir}/geodat{params['rlooks']}x{params['alooks']}.in"
-    with open(outpath, 'w') as f:
-        f.write(output)
-
-
-def copy_outputs(outdir):
-    ''' copy select files from isce merged/ directory '''
+def copy_outputs(intdir, outdir, workers=4, merged=False, compress=False,
+                 hardlink=False):
+    ''' copy select files (and with merged the whole merged/ directory)
+    from the isce directory, see isce2grimp.util.transfer. Missing files
+    are reported, any other failure raises once the rest are copied '''
     print(f'copying files to {outdir}')
-    files = glob.glob('merged/filt_topophase.unw*')
-    files += glob.glob('frames.*')
-    files += ['topsApp.xml', 'isce.log', 'topsProc.xml']
-    files += ['nohup.out', 'stderr.txt', 'stdout.txt']
-    files += ['ascendingNodeTime']
-    for file in files:
-        #print(file)
-        try:
-          shutil.copy(file, outdir)
-        except:
-          print('not found:',file)
-    # Also make copy of entire merged folder
-    #shutil.copytree('merged', outdir + '/merged')
-
-
-def convertuw(isceUNW, geodat):
-    ''' Convert geomosaicked sigma to tiff for GrIMP'''
-    uwFile=isceUNW.replace('unw','uw')
-    # input image
-    print(isceUNW,geodat,uwFile)
-
-    georxa=u.geodatrxa(file=geodat)
-    print(georxa.nr,georxa.na)
-    #exit()
-    cc =u.readImage(isceUNW+'.conncomp',georxa.nr,georxa.na,'u1')
-    print(np.min(cc),np.max(cc))
-    unw=u.readImage(isceUNW,georxa.nr*2,georxa.na,'f4')
-    uw=unw[0:,georxa.nr:]
-    uw[cc == 0] = -2.0e9
-    print(np.min(uw),np.max(uw))
-    u.writeImage(uwFile,uw,'>f4')
-
-    print(unw.shape,uw.shape)
-
-
-def main():
+    files = glob.glob(os.path.join(intdir, 'merged/filt_topophase.unw*'))
+    files += glob.glob(os.path.join(intdir, 'frames.*'))
+    files += [os.path.join(intdir, x) for x in
+              ['topsApp.xml', 'isce.log', 'topsProc.xml',
+               'nohup.out', 'stderr.txt', 'stdout.txt', 'ascendingNodeTime',
+               METADATA]]
+    if merged:
+        mergedDir = os.path.join(intdir, 'merged')
+        for root, _, names in os.walk(mergedDir):
+            files += [(os.path.join(root, x), os.path.relpath(
+                os.path.join(root, x), intdir)) for x in sorted(names)]
+    # convertuw reads the top level copies, only merged/ is compressed
+    rows = transfer(files, outdir, workers=workers, hardlink=hardlink,
+                    compress=['merged/*'] if compress else ())
+    failed = [r for r in rows if r['status'] == 'failed']
+    if failed:
+        raise RuntimeError(f'{len(failed)} files not copied to {outdir}: '
+                           + ', '.join(r['file'] for r in failed))
+    return rows
+
+
+def main(argv=None):
     print('\n======\n Converting ISCE outputs to GrIMP... \n======\n')
     parser = cmdLineParse()
-    inps = parser.parse_args()
-    
+    inps = parser.parse_args(argv)
+    if (inps.looks or inps.export) and not inps.convert:
+        parser.error('--looks and --export need -c')
+
     # make sure output directory path is absolute
     inps.outdir = os.path.abspath(inps.outdir)
-    os.chdir(inps.intdir)
-
-    self = TopsInSAR(cmdline='topsApp.xml')  # topsApp.TopsInSAR
-    self.configure()  # overwrites defaults by reading topsApp.xml
+    if inps.dem:
+        inps.dem = os.path.abspath(inps.dem)
+    options = dict(convert=inps.convert, nlines=inps.nlines, looks=inps.looks,
+                   export=inps.export,
+                   copy=dict(workers=inps.copyWorkers, merged=inps.merged,
+                             compress=inps.compress, hardlink=inps.hardlink),
+                   profile=inps.profile, refresh=inps.refresh,
+                   footprint=inps.footprint,
+                   geometry=inps.geometry, dem=inps.dem)
+    single = len(inps.intdir) == 1 and not glob.has_magic(inps.intdir[0])
+    if single:
+        convert_intdir(os.path.abspath(inps.intdir[0]), inps.outdir,
+                       **options)
+        print('Done!')
+        return 0
+
+    intdirs = expand_dirs(inps.intdir)
+    pairs = [(x, os.path.join(inps.outdir, os.path.basename(x)))
+             for x in intdirs]
+    rows = run_batch(convert_intdir, pairs, workers=inps.workers,
+                     force=inps.force, **options)
+    print(format_summary(rows))
+    return int(any(r['status'] == 'failed' for r in rows))
+
+
+def convert_intdir(intdir, outdir, convert=False, nlines=1024, profile=False,
+                   refresh=False, footprint=None, geometry=False, dem=None,
+                   looks=(), export=(), copy=None):
+    ''' geodat file and copies of intdir products in outdir, timing each
+    stage in outdir/convert_isce.stages.json '''
+    timer = stageTimer()
+    profile = f'{outdir}/convert_isce.prof' if profile else None
+    try:
+        with profiled(profile):
+            convert_stages(intdir, outdir, timer, convert, nlines, refresh,
+                           footprint, geometry, dem, looks, export, copy)
+    finally:
+        timer.save(f'{outdir}/convert_isce.stages.json')
+        print(timer.summary())
+
+
+def extract_metadata(intdir, timer):
+    ''' everything the conversion needs from the ISCE products. ISCE is
+    only imported here, cached conversions never load it '''
+    with timer.stage('import_isce'):
+        import isce  # noqa: F401
+        from imageMath import IML
+        from topsApp import TopsInSAR
+    with timer.stage('configure'):
+        self = TopsInSAR(cmdline=os.path.join(intdir, 'topsApp.xml'))
+        self.configure()  # overwrites defaults by reading topsApp.xml
     # NOTE! self._insar is instance of <isceobj.TopsProc.TopsProc.TopsProc>
     # insar = self._insar #create mapping in functions if needed
-    rlooks = self.numberRangeLooks
-    alooks = self.numberAzimuthLooks
 
-    frames = get_frames(self)  # can be slow
-    orientation = frames[0].bursts[0].passDirection.lower()
-    # is aziTimeInt constant for IW globally? 0.002055556299999998
-    prf = 1.0 / frames[0].bursts[0].azimuthTimeInterval
+    with timer.stage('get_frames'):
+        frames = get_frames(self, intdir)  # can be slow
 
-    orbit = get_merged_orbit(self, frames)
-    nvecs, svt0, stateVecs = get_statevecs(orbit)
+    with timer.stage('merge_orbit'):
+        orbit = get_merged_orbit(self, frames)
 
-    rangeFirstSample, rangeMid, rangeFar = get_ranges(self, frames)
-    sensingStart, sensingMid, sensingStop = get_azimuth_info(self, frames)
-    # Write frame numbers
-    ascNodeTime = get_ascNodeTime()
-    f0 = get_frame_number(sensingStart, ascNodeTime)
-    ff = get_frame_number(sensingStop, ascNodeTime)
-    with open(f'frames.{f0}.{ff}', 'w') as f:
-        f.write('')
-
-    altitude = get_altitude(orbit, sensingMid)
-    phic = get_mid_incidence(rangeMid, sensingMid, orbit)
-    ll, lr, ul, ur, center = get_corner_coordinates(self, frames, orbit)
+    with timer.stage('frame_numbers'):
+        ranges = get_ranges(self, frames)
+        sensingStart, sensingMid, sensingStop = get_azimuth_info(self, frames)
+        ascNodeTime = get_ascNodeTime(intdir)
+        f0 = get_frame_number(sensingStart, ascNodeTime)
+        ff = get_frame_number(sensingStop, ascNodeTime)
 
     # Load unwrapped image to get dimensions
-    img, dataname, metaname = IML.loadImage('merged/filt_topophase.unw')
-
-    params['prf'] = prf
-    params['name'] = self.catalog['reference']['safe'][0]
-    params['date'] = sensingStart.strftime('%-d %b %Y').upper()
-    params['time'] = sensingStart.strftime('%-H %-M %-S.%f')
-    params['ranges'] = f'{rangeFirstSample:.6f} {rangeMid:.6f} {rangeFar:.6f}'
-    params['rangeMid_km'] = f'{rangeMid/1e3:.6f}'
-    params['rlooks'] = rlooks
-    params['alooks'] = alooks
-    params['width'] = img.width
-    params['length'] = img.length
-    params['shape'] = f'{img.width} {img.length}'
-    params['rangePixelSpacing'] = params['range_posting'] * rlooks
-    params['azimuthPixelSpacing'] = params['az_posting'] * alooks
-    params['altitude'] = altitude
-    params['altitude_km'] = f'{altitude/1e3:.6f}'
-    params['incidenceMid'] = f'{phic:.6f}'
-    params['passDir'] = orientation
-    params['svt0'] = svt0
-    params['nvecs'] = nvecs
-    params['stateVecs'] = stateVecs
-
-    params['ll'] = ll
-    params['lr'] = lr
-    params['ul'] = ul
-    params['ur'] = ur
-    params['center'] = center
-    #print(params)
-
-    if not os.path.isdir(inps.outdir):
-        os.makedirs(inps.outdir)
-    write_geodat_config(params, inps.outdir)
-    copy_outputs(inps.outdir)
-
-    if inps.convert is True:
-        geodat = f'{inps.outdir}/geodat{rlooks}x{alooks}.in'
-        convertuw(f'{inps.outdir}/filt_topophase.unw', geodat)
-
-    print('Done!')
+    with timer.stage('load_image'):
+        img, dataname, metaname = IML.loadImage(
+            os.path.join(intdir, 'merged/filt_topophase.unw'))
+
+    meta = dict(
+        name=self.catalog['reference']['safe'][0],
+        rlooks=self.numberRangeLooks, alooks=self.numberAzimuthLooks,
+        width=img.width, length=img.length,
+        passDirection=frames[0].bursts[0].passDirection,
+        # is aziTimeInt constant for IW globally? 0.002055556299999998
+        prf=1.0 / frames[0].bursts[0].azimuthTimeInterval,
+        sensing=[x.isoformat(timespec='microseconds')
+                 for x in (sensingStart, sensingMid, sensingStop)],
+        ranges=list(ranges),
+        ascendingNodeTime=ascNodeTime.isoformat(timespec='microseconds'),
+        frames=[f0, ff],
+        swaths=[swath_metadata(x) for x in frames],
+        orbit=orbit_metadata(orbit))
+
+    # corners, centroid and incidence from the merged orbit in one call
+    with timer.stage('rdr2geo'):
+        meta['geometry'] = scene_geometry(meta)
+
+    return meta
+
+
+def convert_stages(intdir, outdir, timer, convert=False, nlines=1024,
+                   refresh=False, footprintKm=None, geometry=False,
+                   dem=None, looks=(), export=(), copy=None):
+    ''' all paths are absolute so several directories can be converted
+    in one process. ISCE is only used if the metadata cache is missing
+    or out of date '''
+    with timer.stage('load_metadata'):
+        meta = None if refresh else load_metadata(intdir)
+    if meta is None:
+        meta = extract_metadata(intdir, timer)
+        with timer.stage('save_metadata'):
+            save_metadata(meta, intdir)
 
-if __name__ == "__main__":
-    main()
+    # Write frame numbers
+    f0, ff = meta['frames']
+    with open(os.path.join(intdir, f'frames.{f0}.{ff}'), 'w') as f:
+        f.write('')
+    with open(os.path.join(intdir, 'ascendingNodeTime'), 'w') as f:
+        f.write(meta['ascendingNodeTime'])
+
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    with timer.stage('write_geodat'):
+        params = geodat_params(meta)
+        write_geodat_config(params, outdir)
+    with timer.stage('copy_outputs'):
+        copy_outputs(intdir, outdir, **(copy or {}))
+    if footprintKm:
+        with timer.stage('footprint'):
+            with open(f'{outdir}/footprint.geojson', 'w') as f:
+                json.dump(footprint(meta, spacing=footprintKm * 1e3), f)
+
+    lookStr = f"{meta['rlooks']}x{meta['alooks']}"
+    geodat = f'{outdir}/geodat{lookStr}.in'
+    if convert is True:
+        if looks:
+            with timer.stage('write_geodat_looks'):
+                for rfactor, afactor in looks:
+                    write_geodat_config(geodat_params(multilook_metadata(
+                        meta, rfactor, afactor)), outdir)
+        coherence = os.path.join(intdir, 'merged/phsig.cor')
+        with timer.stage('convertuw'):
+            u.convertuw(f'{outdir}/filt_topophase.unw', geodat,
+                        nlines=nlines, looks=looks, export=export,
+                        coherence=coherence if os.path.isfile(coherence)
+                        else None)
+    if geometry:
+        with timer.stage('geometry'):
+            geometry_layers(geodat, f'{outdir}/geometry{lookStr}', dem=dem)
 
+if __name__ == "__main__":
+    sys.exit(main())
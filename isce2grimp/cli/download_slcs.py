@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Download the files listed in download-links.txt
+
+Replaces aria2c/wget: files are fetched concurrently, each over several
+range requests, resumed if interrupted, and (with --verify) checked against
+the inventory's bytes and md5sum columns. Progress is printed to stderr as
+one JSON object per line.
+
+Example
+-------
+$ download_slcs -i download-links.txt -w 4 -n 8 --limit 200 --verify
+
+Credentials for ASF are read from ~/.netrc
+"""
+import argparse
+import os
+import sys
+from isce2grimp.util.download import MB, downloader
+from isce2grimp.util.inventory import read_inventory
+
+
+def cmdLineParse():
+    """Command line parser."""
+    parser = argparse.ArgumentParser(description="download SLCs")
+    parser.add_argument(
+        "-i", type=str, dest="links", default='download-links.txt',
+        help="file with one url per line"
+    )
+    parser.add_argument(
+        "-d", type=str, dest="outdir", default='.', help="output directory"
+    )
+    parser.add_argument(
+        "-w", type=int, dest="workers", default=4,
+        help="files downloaded at once"
+    )
+    parser.add_argument(
+        "-n", type=int, dest="connections", default=4,
+        help="connections (range requests) per file"
+    )
+    parser.add_argument(
+        "--chunk", type=int, dest="chunk", default=64,
+        help="MB per range request"
+    )
+    parser.add_argument(
+        "--limit", type=float, dest="limit", default=None,
+        help="total bandwidth limit in MB/s"
+    )
+    parser.add_argument(
+        "--verify", action='store_true',
+        help="check bytes and md5sum from the local inventory"
+    )
+
+    return parser
+
+
+def inventory_checksums(fileNames):
+    """{fileName: (bytes, md5sum)} from the local inventory"""
+    gf = read_inventory(columns=['fileName', 'bytes', 'md5sum'])
+    gf = gf[gf.fileName.isin(fileNames)]
+    return {row.fileName: (int(row.bytes), row.md5sum)
+            for row in gf.itertuples()}
+
+
+def main(argv=None):
+    """Run as a script with args coming from argparse."""
+    inps = cmdLineParse().parse_args(argv)
+    with open(inps.links) as f:
+        urls = [line.strip() for line in f if line.strip()]
+    names = [os.path.basename(url) for url in urls]
+    checksums = inventory_checksums(names) if inps.verify else {}
+    items = [(url, os.path.join(inps.outdir, name),
+              *checksums.get(name, (None, None)))
+             for url, name in zip(urls, names)]
+
+    limit = inps.limit*MB if inps.limit else None
+    dl = downloader(workers=inps.workers, connections=inps.connections,
+                    chunkSize=inps.chunk*MB, rateLimit=limit)
+    results = dl.fetch_all(items)
+    dl.close()
+    failed = [dest for dest, x in results.items() if isinstance(x, Exception)]
+    for dest in failed:
+        print(f'FAILED: {dest}: {results[dest]}', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
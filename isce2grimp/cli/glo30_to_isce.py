@@ -2,6 +2,14 @@
 '''
 Download a Copernicus DEM (30m) and mosaic for ISCE processing
 https://copernicus-dem-30m.s3.amazonaws.com/readme.html
+
+1-degree output tiles are resampled and converted from EGM2008 to WGS84
+ellipsoid heights in parallel (isce2grimp.util.dem), no GDAL command line
+tools are needed. Each tile is resampled with the edges of its neighbours,
+so tile seams match a single mosaic. With --cache (or
+$ISCE2GRIMP_DEM_CACHE) GLO-30 tiles, including the ring around the ROI,
+are downloaded once and processed tiles are kept per posting, so a later
+ROI only downloads and processes the tiles not in the cache yet.
 # example for ISCE dem over grand mesa (native 30m/ posting)
 ./get_glo30dem.py -d -r 36 40 -110 -106 
 # example for ISCE dem over greenland (~90m posting at mid latitude)
@@ -19,7 +27,9 @@ import numpy as np
 import sys
 import os
 import logging
-from multiprocessing.pool import ThreadPool as Pool
+from isce2grimp.util.dem import build_dem, pixels_per_degree, roi_tiles, tile_url
+from isce2grimp.util.demcache import demCache
+from isce2grimp.util.download import downloader
 
 def cmdLineParse():
     """Command line parser."""
@@ -36,6 +46,18 @@ def cmdLineParse():
     parser.add_argument('-tr', type=float, dest='resolution', required=False,
                         default=0.000277777777778,
                         help='target posting (degrees)')
+    parser.add_argument('-g', type=str, dest='geoid', required=False,
+                        default='egm08_25.gtx',
+                        help='EGM2008 geoid grid (path or PROJ grid name)')
+    parser.add_argument('-w', type=int, dest='workers', required=False,
+                        default=None,
+                        help='processes building 1-degree tiles (default all CPUs)')
+    parser.add_argument('-o', type=str, dest='outname', required=False,
+                        default='glo30_isce.dem.wgs84',
+                        help='output ISCE DEM')
+    parser.add_argument('--cache', type=str, dest='cache', required=False,
+                        default=os.environ.get('ISCE2GRIMP_DEM_CACHE'),
+                        help='DEM tile cache directory (default $ISCE2GRIMP_DEM_CACHE)')
     return parser
 
 
@@ -58,19 +80,22 @@ def hillshade(vrt):
         run_bash_command(cmd)
 
 
-def download(s3uri):
-    """Download all sequentially"""
-    if not os.path.exists(os.path.basename(s3uri)):
-        cmd = f'aws --no-sign-request s3 cp {s3uri} .'
-        run_bash_command(cmd)
+def download(s3uri, dl=None):
+    """Download one tile over https (public bucket, no credentials)"""
+    dl = dl or downloader(workers=1)
+    dl.fetch(s3uri, os.path.basename(s3uri))
 
 
-def parallel_download(fileList):
-    with open(fileList, 'r') as f:
-        urls = [x.rstrip() for x in f.readlines()]
+def parallel_download(urls, workers=8):
     logging.debug(urls)
-    pool = Pool()
-    pool.map(download, urls)
+    dl = downloader(workers=workers, connections=1,
+                    log=logging.getLogger(__name__).debug)
+    results = dl.fetch_all([(url, os.path.basename(url)) for url in urls])
+    dl.close()
+    for dest, result in results.items():
+        # ocean tiles do not exist
+        if isinstance(result, Exception):
+            logging.warning(f'{dest}: {result}')
 
 
 def construct_urls(lats, lons, bucket, res=10):
@@ -79,11 +104,7 @@ def construct_urls(lats, lons, bucket, res=10):
     logging.info(f'{lats}, {lons}')
     for lat in lats:
         for lon in lons:
-            lathemi = 'S' if lat < 0 else 'N'
-            lonhemi = 'W' if lon < 0 else 'E'
-            folder = f'Copernicus_DSM_COG_{res}_{lathemi}{abs(lat):02d}_00_{lonhemi}{abs(lon):03d}_00_DEM'
-            scene = f'{folder}.tif'
-            URLs.append(os.path.join(bucket, folder, scene))
+            URLs.append(tile_url(lat, lon, bucket, res))
 
     return URLs
 
@@ -97,62 +118,21 @@ def get_file_list(roi, bucket):
     # Buffer? # for now go to North-1 East-1 b/c tiles ref LL corner
     lats = np.arange(S, N)
     lons = np.arange(W, E)
-    URLs = construct_urls(lats, lons, bucket)
-
-    with open('download-list.txt', 'w') as f:
-        f.write('\n'.join(URLs))
+    return construct_urls(lats, lons, bucket)
 
-    with open('gdal-list.txt', 'w') as f:
-        #gdalURLs = [x.replace('s3://', '/vsis3/') for x in URLs]
-        # download tiles in parallel, then work with local files
-        gdalURLs = [os.path.basename(x) for x in URLs]
-        f.write('\n'.join(gdalURLs))
-
-    return URLs
 
+def find_geoid(geoid):
+    """Geoid grid path, also looked up in the PROJ data directory"""
+    if os.path.exists(geoid):
+        return geoid
+    from pyproj import datadir
+    for directory in [datadir.get_data_dir(), datadir.get_user_data_dir()]:
+        path = os.path.join(directory, geoid)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f'geoid grid {geoid} not found, download it '
+                            'with projsync or give its path with -g')
 
-def mosaic(roi, resolution, outname='mosaic.vrt', inputlist='gdal-list.txt', tiff=False, isce=False):
-    """Build VRT from list of tif files """
-    # NOTE: for some reason can't open ISCE directly with QGIS, but works fine with rasterio, xarray...
-    S, N, W, E = np.round(roi).astype('int')
-    # NOTE: consider -resolution highest here for higher latitudes
-    cmd = f'gdalbuildvrt -overwrite mosaic.vrt *tif'
-    run_bash_command(cmd)
-    # Vertical datum correction (Earth Gravitational Model 2008) to WGS84 ellipsoid heights
-    cmd = f'gdalwarp -r bilinear -tr {resolution} {resolution} -of VRT -multi -overwrite -s_srs "+proj=longlat +datum=WGS84 +no_defs +geoidgrids=egm08_25.gtx" -t_srs EPSG:4326 mosaic.vrt mosaic_wgs84.vrt'
-    run_bash_command(cmd)
-    # Write to disk for ISCE processing
-    cmd = f'gdal_translate -of ISCE -a_ullr {W} {N} {E} {S} mosaic_wgs84.vrt glo30_isce.dem.wgs84'
-    run_bash_command(cmd)
-    cmd = f'gdal_translate -of VRT glo30_isce.dem.wgs84 glo30_isce.dem.wgs84.vrt'
-    run_bash_command(cmd)
-
-    with open('glo30_isce.dem.wgs84.xml') as f:
-        text = f.read()
-    append_text = '''<imageFile>
-<property name="family">
-    <value>demimage</value>
-    <doc>Instance family name</doc>
-</property>
-<property name="name">
-    <value>demimage_name</value>
-    <doc>Instance name</doc>
-</property>
-<property name="image_type">
-    <value>dem</value>
-    <doc>Image type used for displaying.</doc>
-</property>
-<property name="reference">
-    <value>WGS84</value>
-    <doc>Geodetic datum</doc>
-</property>
-<property name="extra_file_name">
-    <value>glo30_isce.dem.wgs84.vrt</value>
-    <doc>For example name of vrt metadata.</doc>
-</property>'''
-    modtext = text.replace('<imageFile>', append_text)
-    with open('glo30_isce.dem.wgs84.xml', 'w') as f:
-        text = f.write(modtext)
 
 def main(parser):
     """Run as a script with args coming from argparse."""
@@ -160,10 +140,17 @@ def main(parser):
     args = parser.parse_args()
     # NOTE: need to fix list of tiles for high latitutudes
     # Copernicus_DSM_COG_10_N77_00_W010_00_DEM.tif: No such file or directory
-    if args.download:
-        get_file_list(args.roi, args.bucket) #writes download-list.txt
-        parallel_download('download-list.txt')
-    mosaic(args.roi, args.resolution)
+    geoid = find_geoid(args.geoid)
+    cache = demCache(args.cache) if args.cache else None
+    if args.download and cache is not None:
+        n = cache.fetch(roi_tiles(args.roi), args.bucket,
+                        n=pixels_per_degree(args.resolution), geoid=geoid)
+        logging.info(f'downloaded {n} tiles to {cache.root}')
+    elif args.download:
+        parallel_download(get_file_list(args.roi, args.bucket))
+    width, length = build_dem(args.roi, args.resolution, outname=args.outname,
+                              geoid=geoid, workers=args.workers, cache=cache)
+    logging.info(f'wrote {args.outname} ({width} x {length}) with .xml and .vrt')
 
 
 if __name__ == '__main__':
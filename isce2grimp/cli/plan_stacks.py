@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Prepare many prep_stack style stacks in one pass.
+
+Jobs are listed in a YAML config, top level keys are defaults for every job:
+
+template: /path/to/template-noion.yml
+npairs: 10
+jobs:
+  - {path: 90, frame: 227, start: 2016-10-06, end: 2016-11-06, jump: 2}
+  - {path: 83, frame: 374, reference: 39530, npairs: 1}
+
+The inventory is read once, every topsApp.xml is written, and each
+tmp-data-PATH/download-links.txt holds the union of the scenes needed.
+
+Example
+-------
+$ plan_stacks jobs.yml --dry-run
+$ plan_stacks jobs.yml -o /path/to/processing
+"""
+import argparse
+import os
+import isce2grimp.util.planner as planner
+from isce2grimp.util.inventory import INVENTORY, PARQUET
+from isce2grimp.util.slccache import slcCache
+
+
+def cmdLineParse():
+    """Command line parser."""
+    parser = argparse.ArgumentParser(description="prepare many topsApp.py stacks")
+    parser.add_argument("config", type=str, help="YAML jobs config")
+    parser.add_argument(
+        "-o", type=str, dest="outdir", default='.', help="output directory"
+    )
+    parser.add_argument(
+        "--dry-run", dest="dryrun", action='store_true',
+        help="print the planned pairs without writing anything"
+    )
+    parser.add_argument(
+        "--gpkg", type=str, default=str(INVENTORY), help="inventory GPKG"
+    )
+    parser.add_argument(
+        "--parquet", type=str, default=str(PARQUET),
+        help="inventory GeoParquet store (used if it exists)"
+    )
+    parser.add_argument(
+        "--cache", type=str, dest="cache",
+        default=os.environ.get('ISCE2GRIMP_SLC_CACHE'),
+        help="shared SLC cache directory, tmp-data zips are linked from it (default $ISCE2GRIMP_SLC_CACHE)"
+    )
+
+    return parser
+
+
+def main(argv=None):
+    """Run as a script with args coming from argparse."""
+    inps = cmdLineParse().parse_args(argv)
+
+    jobs = planner.read_jobs(inps.config)
+    layers = planner.load_inventory(jobs, gpkg=inps.gpkg, store=inps.parquet)
+    print(f'{len(jobs)} jobs, {sum(len(x) for x in layers.values())} '
+          f'scenes from {len(layers)} relative orbits')
+    plan = planner.plan_jobs(jobs, layers)
+
+    if inps.dryrun:
+        print(planner.format_plan(plan))
+    else:
+        cache = slcCache(inps.cache) if inps.cache else None
+        planner.write_plan(plan, inps.outdir, cache=cache)
+        print(f'prepared {len(plan)} pairs in {inps.outdir}')
+
+
+if __name__ == "__main__":
+    main()
@@ -19,11 +19,11 @@ import argparse
 import os
 import isce2grimp.util.dinosar as dinosar
 import datetime
-import geopandas as gpd
+from isce2grimp.util.inventory import read_inventory
+from isce2grimp.util.slccache import slcCache
 from pathlib import Path
 
 ROOTDIR = Path(__file__).parent.parent
-INVENTORY = os.path.join(ROOTDIR, 'data', 'asf_inventory.gpkg')
 TEMPLATE = os.path.join(ROOTDIR, 'data', 'template.yml')
 
 def cmdLineParse():
@@ -53,6 +53,11 @@ def cmdLineParse():
     parser.add_argument(
         "-f", type=int, dest="frame", required=True, help="ASF Frame"
     )
+    parser.add_argument(
+        "--cache", type=str, dest="cache", required=False,
+        default=os.environ.get('ISCE2GRIMP_SLC_CACHE'),
+        help="shared SLC cache directory, SAFE zips are linked from it (default $ISCE2GRIMP_SLC_CACHE)"
+    )
 
     return parser
 
@@ -63,8 +68,8 @@ def main():
     parser = cmdLineParse()
     inps = parser.parse_args()
 
-    gf = gpd.read_file(INVENTORY, layer=str(inps.path))
-    gf = gf.query('frameNumber == @inps.frame')
+    gf = read_inventory(inps.path, frame=inps.frame,
+                        orbit=[inps.reference, inps.secondary])
     #print(gf.loc[:,['startTime','orbit']])
 
     print(f"Reading from template file: {inps.template}...")
@@ -102,6 +107,10 @@ def main():
     dinosar.write_xml(xml)
     # Create a download file
     dinosar.write_download_urls(downloadList)
+    if inps.cache:
+        scenes = ref.iloc[:1].to_dict('records') + sec.iloc[:1].to_dict('records')
+        slcCache(inps.cache).add(scenes, '.', links='.')
+        print(f"Linked SLCs from cache {inps.cache}")
     print(f"Generated download-links.txt and topsApp.xml in {intdir}")
 
 
@@ -14,15 +14,16 @@ Updated: 07/2021
 """
 import isce2grimp.util.dinosar as dinosar
 import argparse
-import geopandas as gpd
 import pandas as pd
 import os
+from isce2grimp.util.inventory import INVENTORY, PARQUET, read_inventory
+from isce2grimp.util.overlap import overlapIndex
+from isce2grimp.util.slccache import slcCache
 from pathlib import Path
 
 pd.options.mode.chained_assignment = None  # default='warn'
 
 ROOTDIR = Path(__file__).parent.parent
-INVENTORY = os.path.join(ROOTDIR, 'data', 'asf_inventory.gpkg')
 TEMPLATE = os.path.join(ROOTDIR, 'data', 'template.yml')
 
 
@@ -67,6 +68,11 @@ def cmdLineParse():
         "-j", dest="jump", required=False, default=0, type=int,
         help="jump acquitions (-j 2 will skip 2 6-day acquisitions, forming 18-day pairs)"
     )
+    parser.add_argument(
+        "--cache", type=str, dest="cache", required=False,
+        default=os.environ.get('ISCE2GRIMP_SLC_CACHE'),
+        help="shared SLC cache directory, tmp-data zips are linked from it (default $ISCE2GRIMP_SLC_CACHE)"
+    )
 
     return parser
 
@@ -110,6 +116,10 @@ def create_proc_dir(gf, inps):
 
     os.chdir('../')
 
+    if inps.cache:
+        scenes = gf.query('orbit == @inps.reference or orbit == @inps.secondary')
+        slcCache(inps.cache).add(scenes.to_dict('records'), intdir, links=tmpData)
+
     # overwrite download-links with union of new urls
     newurls = list(set(urls).union(downloadList))
     newurls.sort()
@@ -117,12 +127,10 @@ def create_proc_dir(gf, inps):
         f.write('\n'.join(newurls))
 
 
-def get_overlap_area(gf, gfREF):
-    # want frames with > 10% overlap
-    frame_area = gfREF.iloc[0].geometry.area
-    overlaps = gf.geometry.map(lambda x: x.intersection(gfREF.geometry.iloc[0]).area/frame_area)
-
-    return overlaps
+def get_overlap_area(gf, gfREF, start=None):
+    # want frames with > 10% overlap, one index over the whole layer
+    index = overlapIndex(gf)
+    return index.fractions(gfREF.geometry.iloc[0], start=start)
 
 
 def get_nearest_orbit(gf, date):
@@ -141,8 +149,10 @@ def main():
     parser = cmdLineParse()
     inps = parser.parse_args()
 
-    print(f'reading relative orbit {inps.path} from {INVENTORY}...')
-    gf = gpd.read_file(INVENTORY, layer=str(inps.path))
+    source = PARQUET if Path(PARQUET).is_dir() else INVENTORY
+    print(f'reading relative orbit {inps.path} from {source}...')
+    # startTime <= end is a superset of the stopTime <= end crop below
+    gf = read_inventory(inps.path, start=inps.start, end=inps.end)
     print("temporal span: ", gf.startTime.min(), gf.stopTime.max())
     print('frames:', len(gf))
 
@@ -181,8 +191,10 @@ def main():
         gf = gfREF.loc[startInd:]
     else:
         # Since framing of consecutive frames don't always line up, find overlaps
-        gf = gf.loc[startInd:startInd+200]
-        gf['overlap'] = get_overlap_area(gf, gfREF)
+        # from the reference acquisition through the end of the layer
+        refOrbit = gfREF.loc[startInd, 'orbit']
+        START = gf.query('orbit == @refOrbit').startTime.min()
+        gf['overlap'] = get_overlap_area(gf, gfREF.loc[[startInd]], start=START)
         #print(gf.loc[:,['frameNumber','overlap']])
         gf = gf.query('overlap >= 0.1').reset_index()
 
@@ -15,16 +15,13 @@ print(gf.groupby(['platform','frameNumber']).sceneName.count())
 print(gf.groupby(['date','platform','orbit']).frameNumber.count())
 '''
 import argparse
-import geopandas as gpd
 import pandas as pd
 import sys
-from isce2grimp.cli.update_inventory import read_all_layers
+from isce2grimp.util.inventory import INVENTORY, PARQUET, read_inventory
 from pathlib import Path
 
 pd.options.mode.chained_assignment = None  # default='warn'
 
-ROOTDIR = Path(__file__).parent.parent
-INVENTORY = Path(ROOTDIR, 'data', 'asf_inventory.gpkg')
 
 def cmdLineParse():
     """Command line parser."""
@@ -56,35 +53,30 @@ def main():
     parser = cmdLineParse()
     inps = parser.parse_args()
 
+    source = PARQUET if Path(PARQUET).is_dir() else INVENTORY
     if inps.path:
-        print(f'Reading {INVENTORY} for relative orbit {inps.path}...')
-        # Layer as integer seems to correctly parse datetimes?...
-        gf = gpd.read_file(INVENTORY, layer=str(inps.path))
+        print(f'Reading {source} for relative orbit {inps.path}...')
+        # frame and date selection are pushed down to the parquet reader
+        gf = read_inventory(inps.path, start=inps.start, end=inps.end,
+                            frame=inps.frame)
         print(len(gf),'acquisitions in inventory')
         print(len(gf.orbit.unique()),'orbits')
     else:
         parser.print_help(sys.stderr)
-        print(f'Generating full summary for {INVENTORY}...')
-        gf = read_all_layers(INVENTORY)
+        print(f'Generating full summary for {source}...')
+        columns = ['sceneName', 'pathNumber', 'frameNumber', 'orbit',
+                   'startTime', 'stopTime']
+        gf = read_inventory(columns=columns)
         print('Total frames=',len(gf))
         summary = gf.groupby(['pathNumber']).agg(dict(sceneName='count', frameNumber='nunique', orbit='nunique',startTime='min', stopTime='max'))
         summary = summary.rename(columns={'sceneName':'totalScenes','frameNumber':'uniqueFrames','orbit':'relativeOrbits'})
         print(summary)
         sys.exit()
 
-    if inps.frame:
-        gf = gf.query('frameNumber == @inps.frame')
-
     # convert dtypes
     print(gf.startTime)
     gf['date'] = gf.startTime.dt.date
 
-    if inps.start:
-        gf = gf.query('startTime >= @inps.start')
-
-    if inps.end:
-        gf = gf.query('startTime <= @inps.end')
-
     # Add timespans with '0' for first entry instead of 'NaT'
     gf['dt_days'] = pd.to_datetime(gf.date).diff().dt.days.fillna(0).astype(int)
 
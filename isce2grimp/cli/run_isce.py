@@ -6,46 +6,145 @@ Example
 Use 12 CPUs, single socket
 $ run_isce -i 90-231-13416-24487 -n 12
 
+Queue many interferograms, 8 CPUs each, packed onto the node's sockets
+$ run_isce --queue 90-227-* -n 8 --mem 16
+
+Same, downloading SLCs for the next 3 interferograms while others process
+$ run_isce --queue 90-227-* -n 8 --prefetch 3 --downloads 4
+
 Author: Scott Henderson (scottyh@uw.edu)
 Updated: 07/2021
 """
 import argparse
 import os
-import isce
+from pathlib import Path
+from isce2grimp.util.pipeline import pipelineQueue
+from isce2grimp.util.scheduler import GB, jobQueue
+from isce2grimp.util.slccache import slcCache
+from isce2grimp.cli import download_slcs
+
+# NOTE: this requires ~/.netrc
+DOWNLOAD = 'download_slcs -i download-links.txt'
+TOPSAPP = 'topsApp.py --end=unwrap'
+
+
+def setup_isce():
+    """Set up environment variables (imports isce only when running it)."""
+    import isce
+    os.environ['ISCE_HOME'] = os.path.dirname(isce.__file__)
+    os.environ['ISCE_ROOT'] = os.path.dirname(os.environ['ISCE_HOME'])
+    os.environ['PATH']+=':{ISCE_HOME}/bin:{ISCE_HOME}/applications'.format(**os.environ)
+    print(os.environ['PATH'])
 
-# Set up environment variables
-os.environ['ISCE_HOME'] = os.path.dirname(isce.__file__)
-os.environ['ISCE_ROOT'] = os.path.dirname(os.environ['ISCE_HOME'])
-os.environ['PATH']+='{ISCE_HOME}/bin:{ISCE_HOME}/applications'.format(**os.environ)
-print(os.environ['PATH'])
 
 def cmdLineParse():
     """Command line parser."""
     parser = argparse.ArgumentParser(description="run ISCE 2.5.2 topsApp.py")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "-i", type=str, dest="intdir", help="interferogram directory"
+    )
+    group.add_argument(
+        "--queue", type=str, nargs='+', dest="queue",
+        help="interferogram directories to run concurrently"
+    )
+    parser.add_argument(
+        "-n", type=int, dest="cpus", required=False, default=8, help="number of CPUs to use (per job with --queue)"
+    )
+    parser.add_argument(
+        "--mem", type=float, dest="mem", default=16,
+        help="GB of free memory needed to start another job (--queue)"
+    )
+    parser.add_argument(
+        "--jobs", type=int, dest="jobs", default=None,
+        help="maximum concurrent jobs (--queue, default CPUs // n)"
+    )
+    parser.add_argument(
+        "--state", type=str, dest="state", default='run_isce_state.json',
+        help="job status file (--queue)"
+    )
+    parser.add_argument(
+        "--prefetch", type=int, dest="prefetch", default=0,
+        help="download SLCs for this many queued interferograms ahead of processing (--queue)"
+    )
+    parser.add_argument(
+        "--downloads", type=int, dest="downloads", default=4,
+        help="concurrent SLC downloads (--prefetch)"
+    )
+    parser.add_argument(
+        "--retries", type=int, dest="retries", default=0,
+        help="times to rerun a failed job (--queue), downloads are retried 3 times"
+    )
     parser.add_argument(
-        "-i", type=str, dest="intdir", required=True, help="interferogram directory"
+        "--cache", type=str, dest="cache",
+        default=os.environ.get('ISCE2GRIMP_SLC_CACHE'),
+        help="shared SLC cache used by prep_pair/prep_stack (default $ISCE2GRIMP_SLC_CACHE)"
     )
     parser.add_argument(
-        "-n", type=int, dest="cpus", required=False, default=8, help="number of CPUs to use"
+        "--cache-size", type=float, dest="cacheSize", default=None,
+        help="GB to keep in the SLC cache, scenes no queued pair needs are evicted (--queue)"
+    )
+    parser.add_argument(
+        "--command", type=str, dest="command", default=None,
+        help=f"command to run in each directory (default '{DOWNLOAD} && {TOPSAPP}')"
     )
 
     return parser
 
 
-def main():
+def run_queue(inps):
+    """Run every directory in inps.queue with the local scheduler."""
+    kwargs = dict(cpus=inps.cpus, memory=inps.mem*GB, maxJobs=inps.jobs,
+                  stateFile=inps.state, retries=inps.retries)
+    cache = slcCache(inps.cache) if inps.cache else None
+    if cache is not None:
+
+        def release(intdir, returncode):
+            # failed pairs keep their scenes for a rerun
+            if returncode == 0:
+                cache.release(intdir)
+                if inps.cacheSize is not None:
+                    cache.evict(inps.cacheSize*GB)
+        kwargs['onFinish'] = release
+    if inps.prefetch > 0:
+        # downloads run in their own stage
+        statsFile = str(Path(inps.state).with_suffix('.stats.json'))
+        queue = pipelineQueue(inps.queue, inps.command or TOPSAPP,
+                              prefetch=inps.prefetch,
+                              downloadWorkers=inps.downloads,
+                              statsFile=statsFile,
+                              expected=cache.expected if cache else None,
+                              **kwargs)
+    else:
+        command = inps.command or f'{DOWNLOAD} && {TOPSAPP}'
+        queue = jobQueue(inps.queue, command, **kwargs)
+    state = queue.run()
+    failed = [x for x, key in zip(inps.queue, queue.directories)
+              if state[key]['status'] == 'failed']
+    for intdir in failed:
+        print(f'FAILED: {intdir}, see {intdir}/{queue.logName}')
+    return len(failed)
+
+
+def main(argv=None):
     """Run as a script with args coming from argparse."""
     parser = cmdLineParse()
-    inps = parser.parse_args()
+    inps = parser.parse_args(argv)
+    if inps.command is None:
+        setup_isce()
+    if inps.queue:
+        return run_queue(inps)
     print(f'Processing interferogram in {inps.intdir}...')
     os.chdir(inps.intdir)
+    if inps.command:
+        os.system(inps.command)
+        return
     print('Downloading SLCs...')
-    # NOTE: this requires ~/.netrc
-    #cmd = 'wget -nc --input-file=download-links.txt'
-    cmd = 'aria2c -c -i download-links.txt'  # -x 8 -s 8, not sure if faster w/ multiple connections
-    print(cmd)
-    os.system(cmd)
+    if download_slcs.main(['-i', 'download-links.txt']) != 0:
+        print('SLC download failed, rerun to resume')
+        return 1
     print('Running ISCE...')
-    cmd = f"OMP_NUM_THREADS={inps.cpus} OMP_PLACES='sockets(1)' nohup topsApp.py --end=unwrap"
+    cmd = f"OMP_NUM_THREADS={inps.cpus} OMP_PLACES='sockets(1)' nohup {TOPSAPP}"
     print(cmd)
     os.system(cmd)
 
@@ -1,20 +1,106 @@
 #!/usr/bin/env python3
 '''
-Download json inventory for ASF Sentinel-1 archive with greenland.geojson 
-
-Usage: ./get_asf_inventory.py
+Download json inventory for ASF Sentinel-1 archive with greenland.geojson
+
+Monthly query windows are fetched concurrently over a pooled, retrying
+requests.Session. Windows with a truncated response are bisected until
+every piece is complete. A response whose oldest scene is more than
+--max-gap days after the window start (ASF returns the newest scenes
+first, so a silently cut response loses the oldest) is kept for the
+part it covers and the start of the window is queried again. Each finished window is saved to a checkpoint
+directory with a manifest, so an interrupted run resumes where it stopped. New scenes
+are only added to the inventory, in chronological order, once every window
+has succeeded.
+
+Usage: update_inventory [-w 4]
 '''
+import argparse
+import json
+import os
+import shutil
+import threading
 import requests
 import geopandas as gpd
 import pandas as pd
 import fiona
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from isce2grimp.util.inventory import INVENTORY, PARQUET, write_parquet
 
 ROOTDIR = Path(__file__).parent.parent
-INVENTORY = Path(ROOTDIR, 'data', 'asf_inventory.gpkg')
-TODAY = str(str(pd.Timestamp.today()))
+# a date, so reruns and resumed runs the same day share the last window
+TODAY = pd.Timestamp.today().strftime('%Y-%m-%d')
+BASEURL = "https://api.daac.asf.alaska.edu/services/search/param"
+FIRST_DATE = '2014-01-01'
+# results per query, a full response means the window was truncated
+MAX_RESULTS = 2000
+# seconds, ASF search API has a 15 minute limit
+TIMEOUT = 900
+# busy windows are bisected down to this length
+MIN_WINDOW = pd.Timedelta(minutes=1)
+# days without scenes at the start of a window before it is queried
+# again, Greenland is imaged several times a day
+MAX_GAP = 2.0
+
+
+def cmdLineParse():
+    """Command line parser."""
+    parser = argparse.ArgumentParser(description="update ASF inventory")
+    parser.add_argument(
+        "-w", type=int, dest="workers", default=4,
+        help="number of concurrent ASF queries"
+    )
+    parser.add_argument(
+        "-e", type=str, dest="end", default=TODAY, help="update through date"
+    )
+    parser.add_argument(
+        "-i", type=str, dest="inventory", default=str(INVENTORY),
+        help="inventory GPKG"
+    )
+    parser.add_argument(
+        "--retries", type=int, default=5, help="retries per HTTP request"
+    )
+    parser.add_argument(
+        "--url", type=str, default=BASEURL, help="ASF search API endpoint"
+    )
+    parser.add_argument(
+        "--max-results", type=int, dest="maxResults", default=MAX_RESULTS,
+        help="ASF results per query, full windows are split in two"
+    )
+    parser.add_argument(
+        "--max-gap", type=float, dest="maxGap", default=MAX_GAP,
+        help="days from a window start to its oldest scene before the "
+             "start is queried again"
+    )
+
+    return parser
+
+
+@lru_cache()
+def get_aoi_wkt():
+    ''' Greenland search polygon, read once '''
+    gf = gpd.read_file(Path(ROOTDIR,'data','greenland.json'))
+    return gf.geometry[0].wkt
+
+
+def get_session(retries=5, workers=4):
+    ''' pooled session retrying connection errors and busy responses.
+    Read timeouts are not retried but raised as requests Timeout, so
+    ingest splits the window rather than repeating a query that already
+    ran for TIMEOUT seconds (read=0 would raise ConnectionError instead) '''
+    retry = Retry(total=retries, read=False, backoff_factor=1,
+                  status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['GET'])
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=workers,
+                          pool_maxsize=workers)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
-print(f"Updating {INVENTORY} through {TODAY}")
 
 def query_asf(
     sat="Sentinel-1",
@@ -23,6 +109,9 @@ def query_asf(
     stop=None,
     beam="IW",
     flightDirection=None,
+    session=None,
+    baseurl=BASEURL,
+    maxResults=MAX_RESULTS,
 ):
     """Search ASF API and return GeoJSON
 
@@ -30,10 +119,8 @@ def query_asf(
     NOTE: 15 minute time limit on running Search API queries
     """
     print(f"Querying ASF Vertex between {start} and {stop}...")
-    gf = gpd.read_file(Path(ROOTDIR,'data','greenland.json'))
-    polygonWKT = gf.geometry[0].wkt
+    polygonWKT = get_aoi_wkt()
 
-    baseurl = "https://api.daac.asf.alaska.edu/services/search/param"
     # relativeOrbit=$ORBIT
     data = dict(
         intersectsWith=polygonWKT,
@@ -41,6 +128,7 @@ def query_asf(
         processingLevel="SLC",
         beamMode=beam,
         output='geojson',
+        maxResults=maxResults,
     )
     if orbit:
         data["relativeOrbit"] = orbit
@@ -51,15 +139,18 @@ def query_asf(
     if flightDirection:
         data["flightDirection"] = flightDirection
 
-    r = requests.get(baseurl, params=data)
+    if session is None:
+        session = requests
+    r = session.get(baseurl, params=data, timeout=TIMEOUT)
     #print(r.url)
-    #print(r.status_code)    
+    #print(r.status_code)
+    r.raise_for_status()
     return r.json()
 
 
 def convert_dtypes(df):
     # https://stackoverflow.com/questions/61704608/pandas-infer-objects-doesnt-convert-string-columns-to-numeric
-    
+
     ints = ['bytes','frameNumber','orbit','pathNumber']
     dates = ['processingDate','startTime','stopTime']
     strings = ['beamModeType', 'fileID','fileName','flightDirection',
@@ -93,16 +184,18 @@ def asfjson2geopandas(json):
     return gf
 
 
+def last_stop_time(path, layer=None):
+    ''' stopTime of the last row, the most recent scene '''
+    # negative row slices need the fiona engine
+    gf = gpd.read_file(path, rows=slice(-1,None), layer=layer, engine='fiona')
+    return pd.Timestamp(gf.stopTime.values[0])
+
+
 def get_last_date_layered(path):
     ''' assumes data stored such that rows top to bottom are ascending chronological'''
-    dates = []
-    layers = fiona.listlayers(path)
-    for layer in layers:    
-        gf = gpd.read_file(path, rows=slice(-1,None), layer=layer)
-        dates.append(gf.stopTime.values[0])
-    
+    dates = [last_stop_time(path, layer) for layer in fiona.listlayers(path)]
     date = pd.to_datetime(dates).max()
-        
+
     # Add one second to avoid getting repeats
     datestr = str(date + pd.Timedelta(seconds=1))
 
@@ -111,7 +204,7 @@ def get_last_date_layered(path):
 
 def get_last_date(path):
     ''' for single dataframe, assume last row is most recent date '''
-    gf = gpd.read_file(path, rows=slice(-1,None))
+    gf = gpd.read_file(path, rows=slice(-1,None), engine='fiona')
     date = pd.to_datetime(gf.stopTime.values[0])
     # Add one second to avoid getting repeats
     datestr = str(date + pd.Timedelta(seconds=1))
@@ -119,65 +212,314 @@ def get_last_date(path):
     return datestr
 
 
-def write_layers(gf):
-    ''' write each relative orbit as a separate layer'''
-    if Path(INVENTORY).is_file():
-        layers = fiona.listlayers(INVENTORY)
+def write_layers(gf, inventory=INVENTORY, store=PARQUET):
+    ''' write each relative orbit as a separate layer. Scenes that do not
+    start after a layer's last scene are already there (a rerun after a
+    write failed part way) and are not appended again '''
+    if Path(inventory).is_file():
+        layers = fiona.listlayers(inventory)
     else:
         layers = []
 
     for relOrb in gf.pathNumber.sort_values().unique():
         subset = gf.query('pathNumber == @relOrb')
-        print(f'adding {len(subset)} scenes to relative orbit = {relOrb}')
-        
         # DriverError: NULL pointer error if writing new layer with mode='a'
         if str(relOrb) in layers:
             mode = 'a'
+            subset = subset[subset.startTime >
+                            last_stop_time(inventory, str(relOrb))]
+            if len(subset) == 0:
+                continue
         else:
             mode = 'w'
 
-        subset = gf.query('pathNumber == @relOrb')
-        subset.to_file(INVENTORY, driver='GPKG', layer=str(relOrb), mode=mode)
-    
+        print(f'adding {len(subset)} scenes to relative orbit = {relOrb}')
+        subset.to_file(inventory, driver='GPKG', layer=str(relOrb), mode=mode)
 
-def read_all_layers(path):
-    ''' read geopackage file with multiple layers into single dataframe'''
-    layers = fiona.listlayers(path) 
-    gf = gpd.read_file(path, driver='GPKG', layer=layers.pop(0)) # get first layer
-    for layer in layers:
-        tmp = gpd.read_file(path, layer=layer)
-        gf = gf.append(tmp, ignore_index=True)
+    # keep GeoParquet store (see convert_inventory) in sync
+    if Path(store).is_dir():
+        write_parquet(gf, store)
 
-    return gf
 
-
-def update_inventory(start, end):
+def update_inventory(start, end, inventory=INVENTORY):
     ''' update inventory through date=end '''
     response = query_asf(start=start, stop=end)
     if len(response['features']) > 0:
         gf = asfjson2geopandas(response)
         print(f'found {len(gf)} scenes')
-        write_layers(gf)
+        write_layers(gf, inventory)
     else:
         print('No new scenes found.')
 
 
-def main():
+def get_windows(start, end):
+    ''' monthly [start, end] query windows, to avoid more than 2000
+    results per search https://github.com/scottyhq/isce2grimp/issues/15 '''
+    edges = [pd.Timestamp(start)]
+    edges += [x for x in pd.date_range(edges[0].normalize(), end, freq='1MS')
+              if x > edges[0]]
+    if pd.Timestamp(end) > edges[-1]:
+        edges.append(pd.Timestamp(end))
+    return [(str(t0), str(t1)) for t0, t1 in zip(edges[:-1], edges[1:])]
+
+
+def bisect_window(window):
+    ''' split [start, end] window in two at the midpoint (whole seconds) '''
+    t0, t1 = pd.Timestamp(window[0]), pd.Timestamp(window[1])
+    mid = (t0 + (t1 - t0)/2).floor('s')
+    return [(str(t0), str(mid)), (str(mid), str(t1))]
+
+
+def uncovered(window, response, maxGap=MAX_GAP):
+    ''' (window start, oldest scene start) if the oldest scene in response
+    is more than maxGap days after the window start, else None. Scenes
+    only at the window end (windows share end points) are no coverage
+    of an earlier part '''
+    if not response['features']:
+        return None
+    times = pd.to_datetime([f['properties']['startTime']
+                            for f in response['features']],
+                           format='ISO8601', utc=True).tz_localize(None)
+    t0, t1 = pd.Timestamp(window[0]), pd.Timestamp(window[1])
+    oldest = times.min().floor('s')
+    if oldest - t0 <= pd.Timedelta(days=maxGap) or oldest >= t1:
+        return None
+    return (str(t0), str(oldest))
+
+
+def can_split(window):
+    t0, t1 = pd.Timestamp(window[0]), pd.Timestamp(window[1])
+    return t1 - t0 > MIN_WINDOW
+
+
+class checkpoint:
+
+    """ Manifest of query windows and their saved GeoJSON responses
+
+    Each window is 'complete' (response saved to file), 'failed', or
+    'split' into two child windows because the response was truncated.
+    Split windows and per-window counts are also kept in a history file
+    that outlives the checkpoint, so later runs pre-split busy windows
+    instead of repeating oversized queries. """
+
+    def __init__(self, directory, history=None):
+        self.directory = Path(directory)
+        self.manifestFile = Path(directory, 'manifest.json')
+        self.historyFile = history
+        self.lock = threading.Lock()
+        if self.manifestFile.is_file():
+            with open(self.manifestFile) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = dict(start=None, windows={})
+        self.history = {}
+        if history is not None and Path(history).is_file():
+            with open(history) as f:
+                self.history = json.load(f)
+
+    @property
+    def start(self):
+        return self.manifest['start']
+
+    def begin(self, start):
+        ''' new run starting at start, unless resuming an earlier one '''
+        if self.start is None:
+            self.manifest['start'] = start
+            os.makedirs(self.directory, exist_ok=True)
+            self.save()
+        else:
+            print(f'Resuming interrupted update from {self.start}')
+
+    def key(self, window):
+        return f'{window[0]}/{window[1]}'
+
+    def is_complete(self, window):
+        entry = self.manifest['windows'].get(self.key(window))
+        return entry is not None and entry['status'] == 'complete'
+
+    def pending(self, window):
+        ''' windows still to query to cover window, using known splits '''
+        key = self.key(window)
+        entry = self.manifest['windows'].get(key)
+        if entry is None and self.history.get(key, {}).get('status') == 'split':
+            entry = self.history[key]
+            with self.lock:
+                self.manifest['windows'][key] = entry
+        if entry is None or entry['status'] == 'failed':
+            return [window]
+        if entry['status'] == 'complete':
+            return []
+        return [w for child in entry['children']
+                for w in self.pending(tuple(child))]
+
+    def record(self, window, response=None, error=None):
+        ''' save window response (or error) and update the manifest '''
+        entry = dict(start=window[0], end=window[1])
+        if error is None:
+            t0, t1 = pd.Timestamp(window[0]), pd.Timestamp(window[1])
+            entry['file'] = f'window-{t0:%Y%m%dT%H%M%S}-{t1:%Y%m%dT%H%M%S}.json'
+            with open(Path(self.directory, entry['file']), 'w') as f:
+                json.dump(response, f)
+            entry.update(status='complete', count=len(response['features']))
+        else:
+            entry.update(status='failed', error=str(error))
+        self._set(window, entry)
+
+    def record_split(self, window, children, count=None):
+        ''' window was truncated (count results) and is replaced by children '''
+        entry = dict(start=window[0], end=window[1], status='split',
+                     count=count, children=[list(c) for c in children])
+        self._set(window, entry)
+
+    def _set(self, window, entry):
+        with self.lock:
+            self.manifest['windows'][self.key(window)] = entry
+            self.save()
+
+    def save(self):
+        tmpfile = Path(self.directory, 'manifest.json.tmp')
+        with open(tmpfile, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmpfile, self.manifestFile)
+
+    def leaves(self, window):
+        ''' complete windows covering window '''
+        entry = self.manifest['windows'][self.key(window)]
+        if entry['status'] == 'complete':
+            return [window]
+        return [w for child in entry['children']
+                for w in self.leaves(tuple(child))]
+
+    def features(self, windows):
+        ''' saved features for windows in chronological order '''
+        leaves = [w for window in windows for w in self.leaves(window)]
+        features = []
+        for window in sorted(leaves, key=lambda x: pd.Timestamp(x[0])):
+            entry = self.manifest['windows'][self.key(window)]
+            with open(Path(self.directory, entry['file'])) as f:
+                features += json.load(f)['features']
+        return features
+
+    def save_history(self):
+        ''' keep splits and counts (not responses) for later runs '''
+        if self.historyFile is None:
+            return
+        for key, entry in self.manifest['windows'].items():
+            if entry['status'] != 'failed':
+                self.history[key] = {k: v for k, v in entry.items()
+                                     if k != 'file'}
+        with open(self.historyFile, 'w') as f:
+            json.dump(self.history, f, indent=1)
+
+    def remove(self):
+        shutil.rmtree(self.directory)
+
+
+def ingest(start, end, workers=4, retries=5, baseurl=BASEURL,
+           checkpointDir=None, history=None, maxResults=MAX_RESULTS,
+           maxGap=MAX_GAP):
+    ''' query all windows between start and end concurrently, return new
+    scenes as a GeoDataFrame (None if there are none). Windows whose
+    response is truncated (maxResults scenes) or times out are bisected
+    until every piece is complete, and the start of windows whose oldest
+    scene is more than maxGap days in is queried again. Raises
+    RuntimeError leaving the checkpoint in place if any window fails '''
+    ckpt = checkpoint(checkpointDir, history=history)
+    ckpt.begin(start)
+    windows = get_windows(ckpt.start, end)
+    todo = [w for window in windows for w in ckpt.pending(window)]
+    done = sum(ckpt.is_complete(w) for w in windows)
+    print(f'{len(windows)} query windows, {done} already done, '
+          f'{len(todo)} queries to run using {workers} workers')
+
+    session = get_session(retries=retries, workers=workers)
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def submit(window):
+            return pool.submit(query_asf, start=window[0], stop=window[1],
+                               session=session, baseurl=baseurl,
+                               maxResults=maxResults)
+
+        futures = {submit(w): w for w in todo}
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                window = futures.pop(future)
+                try:
+                    response = future.result()
+                    count = len(response['features'])
+                    truncated = count >= maxResults
+                    gap = None if truncated else \
+                        uncovered(window, response, maxGap)
+                except requests.exceptions.Timeout as e:
+                    # ASF search queries are limited to 15 minutes
+                    response, count, truncated = e, None, True
+                except Exception as e:
+                    print(f'query {window[0]} to {window[1]} failed: {e}')
+                    ckpt.record(window, error=e)
+                    failed.append(window)
+                    continue
+                if truncated and can_split(window):
+                    children = bisect_window(window)
+                    print(f'splitting {window[0]} to {window[1]} '
+                          f'({count} results)')
+                    ckpt.record_split(window, children, count=count)
+                    futures.update({submit(w): w for w in children})
+                elif gap is not None:
+                    children = [gap, (gap[1], window[1])]
+                    print(f'{window[0]} to {window[1]} only covered from '
+                          f'{gap[1]}, querying the start again')
+                    ckpt.record_split(window, children, count=count)
+                    ckpt.record(children[1], response=response)
+                    futures[submit(gap)] = gap
+                elif isinstance(response, Exception):
+                    ckpt.record(window, error=response)
+                    failed.append(window)
+                else:
+                    if truncated:
+                        print(f'WARNING: {window[0]} to {window[1]} still '
+                              f'has {count} results')
+                    ckpt.record(window, response=response)
+    if failed:
+        raise RuntimeError(f'{len(failed)} queries failed, rerun to resume '
+                           f'from {ckpt.manifestFile}')
+
+    ckpt.save_history()
+    features = ckpt.features(windows)
+    if len(features) == 0:
+        return None
+    gf = asfjson2geopandas(dict(type='FeatureCollection', features=features))
+    # windows share their end points
+    gf = gf.drop_duplicates('sceneName').reset_index(drop=True)
+
+    return gf
+
+
+def main(argv=None):
     ''' create greenland inventory file '''
-    # For initial inventory creation loop over years
-    if not Path(INVENTORY).exists():
-        # create .GPKG with first year
-        update_inventory('2014-01-01', '2015-01-01') 
+    parser = cmdLineParse()
+    inps = parser.parse_args(argv)
+    print(f"Updating {inps.inventory} through {inps.end}")
+    checkpointDir = inps.inventory + '.checkpoint'
 
-    start = get_last_date_layered(INVENTORY)    
-    end_range = TODAY  
-    # Loop over month at a time to avoid more than 2000 results per search
-    # https://github.com/scottyhq/isce2grimp/issues/15
-    ranges = pd.date_range(start, end_range, freq='1MS')
+    if Path(inps.inventory).exists():
+        start = get_last_date_layered(inps.inventory)
+    else:
+        start = FIRST_DATE
 
-    for end in ranges:
-        start = get_last_date_layered(INVENTORY)
-        update_inventory(start, end)
+    gf = ingest(start, inps.end, workers=inps.workers, retries=inps.retries,
+                baseurl=inps.url, checkpointDir=checkpointDir,
+                history=inps.inventory + '.windows.json',
+                maxResults=inps.maxResults, maxGap=inps.maxGap)
+    if gf is None:
+        print('No new scenes found.')
+    else:
+        print(f'found {len(gf)} scenes')
+        store = PARQUET if inps.inventory == str(INVENTORY) else \
+            Path(inps.inventory).with_suffix('.parquet')
+        write_layers(gf, inps.inventory, store)
+    checkpoint(checkpointDir).remove()
 
 if __name__ == "__main__":
-    main() 
+    main()
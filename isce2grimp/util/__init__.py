@@ -1,6 +1,7 @@
 """ISCE2GIMP"""
 
+from .convertuw import convertuw
 from .geodatrxa import geodatrxa
 from .myerror import myerror
-from .readImage import readImage
-from .writeImage import writeImage
+from .readImage import readImage, mmapImage, readImageBlocks
+from .writeImage import writeImage, writeImageBlocks
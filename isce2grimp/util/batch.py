@@ -0,0 +1,98 @@
+"""
+Run one conversion per interferogram directory in a process pool
+
+convert_isce uses these to convert many directories in a few long lived
+worker processes, so the isce/topsApp import is paid once per worker
+rather than once per directory, and directories whose outputs are newer
+than their ISCE inputs are skipped.
+"""
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# ISCE products the GrIMP outputs are made from
+INPUTS = ['topsApp.xml', 'isce.log', 'merged/filt_topophase.unw',
+          'merged/filt_topophase.unw.xml', 'merged/filt_topophase.unw.conncomp']
+
+
+def expand_dirs(patterns):
+    ''' absolute interferogram directories matching paths or globs, in
+    order and without duplicates '''
+    dirs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) \
+            else [pattern]
+        for match in matches:
+            match = os.path.abspath(match)
+            if os.path.isdir(match) and match not in dirs:
+                dirs.append(match)
+    return dirs
+
+
+def is_up_to_date(intdir, outdir, convert=False):
+    ''' outputs (geodat*.in, filt_topophase.unw, and .uw with convert)
+    exist and are newer than every input '''
+    outputs = [os.path.join(outdir, 'filt_topophase.unw')]
+    if convert:
+        outputs.append(os.path.join(outdir, 'filt_topophase.uw'))
+    geodats = glob.glob(os.path.join(outdir, 'geodat*.in'))
+    if not geodats or not all(os.path.isfile(x) for x in outputs):
+        return False
+    inputs = [os.path.join(intdir, x) for x in INPUTS]
+    newest = max((os.path.getmtime(x) for x in inputs if os.path.exists(x)),
+                 default=0)
+    return min(os.path.getmtime(x) for x in outputs + geodats) >= newest
+
+
+def _run(func, intdir, outdir, kwargs):
+    ''' worker: one directory, exceptions become a failed row '''
+    t0 = time.perf_counter()
+    row = dict(intdir=intdir, outdir=outdir, status='converted', error='')
+    try:
+        func(intdir, outdir, **kwargs)
+    except Exception as e:
+        row.update(status='failed', error=f'{type(e).__name__}: {e}')
+        traceback.print_exc()
+    row['seconds'] = round(time.perf_counter() - t0, 3)
+    return row
+
+
+def run_batch(func, pairs, workers=1, force=False, convert=False, **kwargs):
+    ''' func(intdir, outdir, convert=convert, **kwargs) for each
+    (intdir, outdir), up to workers at once. Returns one row per
+    directory (intdir, outdir, status, error, seconds) in input order '''
+    rows = {}
+    todo = []
+    for intdir, outdir in pairs:
+        if not force and is_up_to_date(intdir, outdir, convert):
+            rows[intdir] = dict(intdir=intdir, outdir=outdir,
+                                status='skipped', error='', seconds=0.0)
+        else:
+            todo.append((intdir, outdir))
+    kwargs['convert'] = convert
+    if workers <= 1:
+        for intdir, outdir in todo:
+            rows[intdir] = _run(func, intdir, outdir, kwargs)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run, func, intdir, outdir, kwargs)
+                       for intdir, outdir in todo]
+            for future in as_completed(futures):
+                row = future.result()
+                rows[row['intdir']] = row
+    return [rows[intdir] for intdir, _ in pairs]
+
+
+def format_summary(rows):
+    ''' table of directories, status and time, with totals '''
+    width = max([len(os.path.basename(r['intdir'])) for r in rows] + [6])
+    lines = [f'{"intdir":<{width}}  {"status":<9}  {"seconds":>8}  error']
+    for r in rows:
+        lines.append(f'{os.path.basename(r["intdir"]):<{width}}  '
+                     f'{r["status"]:<9}  {r["seconds"]:8.1f}  {r["error"]}')
+    counts = {s: sum(r['status'] == s for r in rows)
+              for s in ['converted', 'skipped', 'failed']}
+    lines.append(', '.join(f'{n} {s}' for s, n in counts.items()))
+    return '\n'.join(lines)
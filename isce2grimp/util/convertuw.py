@@ -0,0 +1,85 @@
+"""
+Convert ISCE unwrapped phase to GrIMP .uw format
+"""
+import numpy as np
+
+from .export import exporters
+from .geodatrxa import geodatrxa
+from .multilook import lookAverager
+from .profiling import peak_rss
+from .readImage import readImageBlocks
+from .writeImage import writeImageBlocks
+
+NODATA = -2.0e9
+
+
+def look_file(uwFile, rlooks, alooks):
+    ''' filt_topophase.uw -> filt_topophase.RLxAL.uw '''
+    root, ext = uwFile.rsplit('.', 1)
+    return f'{root}.{rlooks}x{alooks}.{ext}'
+
+
+def convertuw(isceUNW, geodat, nlines=1024, looks=(), coherence=None,
+              export=()):
+    ''' Convert ISCE filt_topophase.unw to big-endian GrIMP .uw
+
+    The two-band BIL .unw (amplitude, phase) and the .conncomp are streamed
+    nlines azimuth lines at a time, so memory stays bounded regardless of
+    image size. Pixels with connected component 0 are set to NODATA.
+
+    looks is a list of (rfactor, afactor): each also gets a coarser .uw,
+    filt_topophase.RLxAL.uw for RL = rfactor x the geodat range looks etc.,
+    averaged in the same pass and weighted by the coherence file (single
+    band float32 such as merged/phsig.cor) if given. Returns the .uw files.
+
+    export lists formats of util.export ('cog', 'zarr') to also write the
+    .uw and .conncomp to, from the same blocks.
+    '''
+    uwFile = isceUNW.replace('unw', 'uw')
+    print(isceUNW, geodat, uwFile)
+
+    georxa = geodatrxa(file=geodat)
+    nr, na = georxa.nr, georxa.na
+    print(nr, na)
+    levels = [lookAverager(look_file(uwFile, georxa.nlr * rf, georxa.nla * af),
+                           nr, na, rf, af, NODATA) for rf, af in looks]
+    copies = exporters(uwFile, georxa, export, NODATA) if export else []
+
+    stats = dict(ccMin=np.inf, ccMax=-np.inf, uwMin=np.inf, uwMax=-np.inf)
+
+    def blocks():
+        unwBlocks = readImageBlocks(isceUNW, 2*nr, na, 'f4', nlines=nlines)
+        ccBlocks = readImageBlocks(isceUNW + '.conncomp', nr, na, 'u1',
+                                   nlines=nlines)
+        corBlocks = readImageBlocks(coherence, nr, na, 'f4', nlines=nlines) \
+            if coherence and levels else None
+        for (_, unw), (_, cc) in zip(unwBlocks, ccBlocks):
+            # second band of each BIL line is unwrapped phase
+            uw = unw[:, nr:]
+            uw[cc == 0] = NODATA
+            if levels:
+                weight = (cc > 0).astype('f4')
+                if corBlocks is not None:
+                    weight *= np.nan_to_num(next(corBlocks)[1], nan=0.0)
+                for level in levels:
+                    level.add(uw, weight)
+            for phase, conncomp in copies:
+                phase.add(uw)
+                conncomp.add(cc)
+            stats['ccMin'] = min(stats['ccMin'], cc.min())
+            stats['ccMax'] = max(stats['ccMax'], cc.max())
+            stats['uwMin'] = min(stats['uwMin'], uw.min())
+            stats['uwMax'] = max(stats['uwMax'], uw.max())
+            yield uw
+
+    writeImageBlocks(uwFile, blocks(), nr, na, '>f4')
+    for level in levels:
+        level.close()
+    for phase, conncomp in copies:
+        phase.close()
+        conncomp.close()
+
+    print(stats['ccMin'], stats['ccMax'])
+    print(stats['uwMin'], stats['uwMax'])
+    print(f'peak memory: {peak_rss():.1f} MB')
+    return [uwFile] + [level.fileName for level in levels]
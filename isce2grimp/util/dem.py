@@ -0,0 +1,287 @@
+"""
+Build an ISCE DEM (WGS84 ellipsoid heights) from Copernicus GLO-30 tiles
+
+The output grid is split into 1-degree tiles that are built in parallel by
+a process pool. Each worker resamples its GLO-30 tile, with a margin of
+pixels from the neighbouring tiles so the tile edges match a full mosaic,
+onto its part of the grid (bilinear, GDAL windowed reads), adds the EGM2008 geoid
+undulation interpolated from a geoid grid (e.g. egm08_25.gtx) and writes
+its rows straight into the memory mapped output. The ISCE .xml header and
+a GDAL .vrt are written directly rather than by gdal_translate.
+
+Copernicus_DSM_COG_10_N69_00_W050_00_DEM.tif covers 69-70N, 50-49W, so the
+output is aligned to whole degrees and 1/resolution must be a whole number
+of pixels per degree.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+DTYPE = 'f4'
+ISCE_TYPES = {'f4': 'FLOAT', 'i2': 'SHORT'}
+GDAL_TYPES = {'f4': 'Float32', 'i2': 'Int16'}
+
+
+def tile_name(lat, lon, res=10):
+    ''' Copernicus tile (folder) name for the tile with lower left corner
+    lat, lon, res in arcsec (10 = 30 m) '''
+    lathemi = 'S' if lat < 0 else 'N'
+    lonhemi = 'W' if lon < 0 else 'E'
+    return (f'Copernicus_DSM_COG_{res}_{lathemi}{abs(lat):02d}_00_'
+            f'{lonhemi}{abs(lon):03d}_00_DEM')
+
+
+def tile_url(lat, lon, bucket='s3://copernicus-dem-30m/', res=10):
+    name = tile_name(lat, lon, res)
+    return os.path.join(bucket, name, f'{name}.tif')
+
+
+def roi_tiles(roi):
+    ''' (lat, lon) lower left corners of the 1-degree tiles covering roi
+    [S, N, W, E] rounded to whole degrees '''
+    S, N, W, E = np.round(roi).astype('int')
+    return [(lat, lon) for lat in range(N - 1, S - 1, -1)
+            for lon in range(W, E)]
+
+
+def neighbours(lat, lon):
+    ''' (lat, lon) of the tile and the up to 8 tiles around it, the tile
+    itself first '''
+    tiles = [(lat, lon)]
+    for dlat in (-1, 0, 1):
+        for dlon in (-1, 0, 1):
+            if (dlat or dlon) and -90 <= lat + dlat < 90 and \
+                    -180 <= lon + dlon < 180:
+                tiles.append((lat + dlat, lon + dlon))
+    return tiles
+
+
+def pixels_per_degree(resolution):
+    n = int(round(1 / resolution))
+    if not np.isclose(n * resolution, 1, atol=1e-6):
+        raise ValueError(f'resolution {resolution} is not a whole number of '
+                         f'pixels per degree')
+    return n
+
+
+def geoid_undulation(geoid, lon, lat):
+    ''' bilinear geoid height (m) on the grid of 1-D lon, lat pixel
+    centres (shape len(lat) x len(lon)) from a geoid raster. The
+    interpolation is separable, so only the few geoid rows/columns
+    around the grid are read and no 2-D coordinate arrays are made '''
+    import rasterio
+    with rasterio.open(geoid) as src:
+        t = src.transform
+        # geoid grids may run 0-360 or -180-180
+        lon = np.where(lon < t.c, lon + 360, lon)
+        lon = np.where(lon > t.c + t.a * src.width, lon - 360, lon)
+        col = (lon - t.c) / t.a - 0.5
+        row = (lat - t.f) / t.e - 0.5
+        r0 = max(int(np.floor(row.min())), 0)
+        c0 = max(int(np.floor(col.min())), 0)
+        r1 = min(int(np.floor(row.max())) + 2, src.height)
+        c1 = min(int(np.floor(col.max())) + 2, src.width)
+        grid = src.read(1, window=((r0, r1), (c0, c1))).astype('f8')
+
+    def weights(x, size):
+        x = np.clip(x, 0, size - 1)
+        i = np.clip(np.floor(x).astype(int), 0, max(size - 2, 0))
+        return i, np.minimum(i + 1, size - 1), x - i
+
+    i0, i1, di = weights(row - r0, grid.shape[0])
+    j0, j1, dj = weights(col - c0, grid.shape[1])
+    # along longitude for each geoid row, then along latitude
+    alongLon = grid[:, j0] * (1 - dj) + grid[:, j1] * dj
+    return (alongLon[i0] * (1 - di)[:, None]
+            + alongLon[i1] * di[:, None]).astype('f4')
+
+
+def build_tile(lat, lon, n, sources, geoid=None):
+    ''' ellipsoid heights on the n x n grid of the tile at lat, lon from
+    the GLO-30 files in sources, the tile's own file first and then any
+    neighbours (nan where none covers a pixel). The sources are mosaicked
+    on the own tile's posting over the tile plus a margin for the
+    bilinear kernel, and GDAL only reads the source blocks that needs '''
+    import rasterio
+    from rasterio.merge import merge
+    from rasterio.transform import from_origin
+    from rasterio.warp import Resampling, reproject
+
+    res = 1.0 / n
+    transform = from_origin(lon, lat + 1, res, res)
+    dem = np.full((n, n), np.nan, dtype='f4')
+    if sources:
+        with rasterio.open(sources[0]) as src:
+            dx, dy = src.res
+        # source pixels beyond the tile edge that bilinear may use
+        mx = int(np.ceil(2 * res / dx)) + 1
+        my = int(np.ceil(2 * res / dy)) + 1
+        mosaic, mosaicTransform = merge(
+            sources, bounds=(lon - mx*dx, lat - my*dy, lon + 1 + mx*dx,
+                             lat + 1 + my*dy),
+            res=(dx, dy), nodata=np.nan, dtype='float32',
+            resampling=Resampling.bilinear)
+        reproject(mosaic[0], dem, src_transform=mosaicTransform,
+                  src_crs='EPSG:4326', src_nodata=np.nan,
+                  dst_transform=transform, dst_crs='EPSG:4326',
+                  dst_nodata=np.nan, init_dest_nodata=False,
+                  resampling=Resampling.bilinear)
+    if geoid is not None:
+        # EGM2008 orthometric to WGS84 ellipsoid heights
+        centers = (np.arange(n) + 0.5) * res
+        dem += geoid_undulation(geoid, lon + centers, lat + 1 - centers)
+    return dem
+
+
+def save_tile(path, dem):
+    ''' atomic write of a processed tile, concurrent runs may build the
+    same tile '''
+    os.makedirs(path.parent, exist_ok=True)
+    tmpfile = path.with_name(f'.{path.stem}.{os.getpid()}.npy')
+    np.save(tmpfile, dem)
+    os.replace(tmpfile, path)
+
+
+def _build_into(args):
+    ''' worker: build one tile (or load it from the tile cache) and copy
+    it into the output memmap '''
+    lat, lon, n, sources, geoid, outFile, shape, row0, col0, tileFile = args
+    cached = tileFile is not None and tileFile.is_file()
+    if cached:
+        dem = np.load(tileFile, mmap_mode='r')
+    else:
+        dem = build_tile(lat, lon, n, sources, geoid)
+        # ocean tiles are cheap to rebuild, do not store them
+        if tileFile is not None and sources:
+            save_tile(tileFile, dem)
+    out = np.memmap(outFile, dtype=DTYPE, mode='r+', shape=shape)
+    out[row0:row0 + n, col0:col0 + n] = dem
+    out.flush()
+    del out
+    return lat, lon, int(np.isnan(dem).sum()), cached
+
+
+def build_dem(roi, resolution, tiledir='.', outname='glo30_isce.dem.wgs84',
+              geoid=None, workers=None, nodata=-32768, cache=None):
+    ''' mosaic GLO-30 tiles in tiledir covering roi [S, N, W, E] into an
+    ISCE DEM with resolution degree posting. Missing tiles (ocean) and
+    pixels are set to nodata. With a demCache, tiles come from the cache
+    and tiles not processed yet are added to it. Returns (width, length) '''
+    S, N, W, E = np.round(roi).astype('int')
+    n = pixels_per_degree(resolution)
+    shape = ((N - S) * n, (E - W) * n)
+    with open(outname, 'wb') as f:
+        f.truncate(shape[0] * shape[1] * np.dtype(DTYPE).itemsize)
+
+    tasks = []
+    for lat, lon in roi_tiles(roi):
+        tileFile = None
+        if cache is not None:
+            sources = cache.sources(lat, lon)
+            # a tile built without a neighbour the bucket may have is not
+            # kept, its edge would differ from a larger ROI's
+            tileFile = cache.tile_path(lat, lon, n, geoid) \
+                if cache.has_neighbours(lat, lon) else None
+        else:
+            sources = [str(Path(tiledir, f'{tile_name(*x)}.tif'))
+                       for x in neighbours(lat, lon)]
+            # ocean tiles stay nodata, also next to land
+            sources = [x for x in sources if os.path.exists(x)] \
+                if os.path.exists(sources[0]) else []
+        if not sources and not (tileFile and tileFile.is_file()):
+            print(f'no tile {tile_name(lat, lon)}, filling with {nodata}')
+        tasks.append((lat, lon, n, sources, geoid, outname, shape,
+                      (N - 1 - lat) * n, (lon - W) * n, tileFile))
+
+    reused = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for lat, lon, missing, cached in pool.map(_build_into, tasks):
+            reused += cached
+            if missing:
+                print(f'tile {lat} {lon}: {missing} pixels without data')
+    if cache is not None:
+        print(f'{reused} of {len(tasks)} tiles from {cache.root}')
+
+    out = np.memmap(outname, dtype=DTYPE, mode='r+', shape=shape)
+    for row0 in range(0, shape[0], n):
+        block = out[row0:row0 + n]
+        block[np.isnan(block)] = nodata
+    out.flush()
+    del out
+
+    write_isce_xml(outname, shape[1], shape[0], W, N, 1.0 / n, -1.0 / n)
+    write_vrt(outname, shape[1], shape[0], W, N, 1.0 / n, -1.0 / n,
+              nodata=nodata)
+    return shape[1], shape[0]
+
+
+def write_isce_xml(fileName, width, length, x0, y0, dx, dy, dataType=DTYPE):
+    ''' ISCE demimage header fileName.xml; x0, y0 upper left corner '''
+    base = os.path.basename(fileName)
+
+    def prop(name, value, indent='    '):
+        return (f'{indent}<property name="{name}">\n'
+                f'{indent}    <value>{value}</value>\n'
+                f'{indent}</property>\n')
+
+    def coordinate(name, doc, start, delta, size):
+        return (f'    <component name="{name}">\n'
+                f'        <factorymodule>isceobj.Image</factorymodule>\n'
+                f'        <factoryname>createCoordinate</factoryname>\n'
+                f'        <doc>{doc}</doc>\n'
+                + prop('delta', delta, ' '*8)
+                + prop('endingvalue', start + delta*size, ' '*8)
+                + prop('family', 'imagecoordinate', ' '*8)
+                + prop('name', 'imagecoordinate_name', ' '*8)
+                + prop('size', size, ' '*8)
+                + prop('startingvalue', start, ' '*8)
+                + '    </component>\n')
+
+    xml = ('<imageFile>\n'
+           + prop('access_mode', 'read')
+           + prop('byte_order', 'l')
+           + prop('data_type', ISCE_TYPES[dataType])
+           + prop('extra_file_name', f'{base}.vrt')
+           + prop('family', 'demimage')
+           + prop('file_name', base)
+           + prop('image_type', 'dem')
+           + prop('length', length)
+           + prop('name', 'demimage_name')
+           + prop('number_bands', 1)
+           + prop('reference', 'WGS84')
+           + prop('scheme', 'BIL')
+           + prop('width', width)
+           + prop('xmax', x0 + dx*width)
+           + prop('xmin', x0)
+           + coordinate('coordinate1', 'First coordinate of a 2D image '
+                        '(width).', x0, dx, width)
+           + coordinate('coordinate2', 'Second coordinate of a 2D image '
+                        '(length).', y0, dy, length)
+           + '</imageFile>\n')
+    with open(f'{fileName}.xml', 'w') as f:
+        f.write(xml)
+
+
+def write_vrt(fileName, width, length, x0, y0, dx, dy, dataType=DTYPE,
+              nodata=None):
+    ''' GDAL VRT for the raw DEM so QGIS/rasterio can read it '''
+    base = os.path.basename(fileName)
+    itemsize = np.dtype(dataType).itemsize
+    nodataTag = '' if nodata is None else f'    <NoDataValue>{nodata}</NoDataValue>\n'
+    vrt = (f'<VRTDataset rasterXSize="{width}" rasterYSize="{length}">\n'
+           f'  <SRS>EPSG:4326</SRS>\n'
+           f'  <GeoTransform>{x0}, {dx}, 0.0, {y0}, 0.0, {dy}</GeoTransform>\n'
+           f'  <VRTRasterBand dataType="{GDAL_TYPES[dataType]}" band="1" '
+           f'subClass="VRTRawRasterBand">\n'
+           f'{nodataTag}'
+           f'    <SourceFilename relativeToVRT="1">{base}</SourceFilename>\n'
+           f'    <ByteOrder>LSB</ByteOrder>\n'
+           f'    <ImageOffset>0</ImageOffset>\n'
+           f'    <PixelOffset>{itemsize}</PixelOffset>\n'
+           f'    <LineOffset>{itemsize*width}</LineOffset>\n'
+           f'  </VRTRasterBand>\n'
+           f'</VRTDataset>\n')
+    with open(f'{fileName}.vrt', 'w') as f:
+        f.write(vrt)
@@ -0,0 +1,125 @@
+"""
+Persistent store of Copernicus GLO-30 tiles and processed DEM tiles
+
+CACHE/raw/<tileName>.tif                  downloaded once
+CACHE/tiles/<n>-<geoid>/<tileName>.npy    ellipsoid heights, n pixels/degree
+
+A processed tile is the 1-degree block build_tile makes for one output
+posting and geoid grid, so any ROI at that posting is assembled from the
+cached tiles. Tiles are only kept once all their neighbours have been
+downloaded (or are known not to exist), as build_tile uses them at the
+tile edges and only tiles not yet in the cache are downloaded and
+processed. Tiles the bucket does not have (ocean) are recorded in
+CACHE/index.json so they are not requested again. The index is only
+changed while holding an exclusive lock on CACHE/.lock and processed
+tiles are written to a temporary file and renamed (dem.save_tile), so
+several runs can share one cache.
+"""
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+from .dem import neighbours, tile_name, tile_url
+from .download import downloader
+
+
+class demCache:
+
+    """ DEM tile store shared by glo30_to_isce runs.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root).resolve()
+        self.indexFile = Path(self.root, 'index.json')
+        os.makedirs(Path(self.root, 'raw'), exist_ok=True)
+        os.makedirs(Path(self.root, 'tiles'), exist_ok=True)
+
+    @contextmanager
+    def index(self):
+        ''' locked read-modify-write of the index '''
+        with open(Path(self.root, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = dict(missing=[])
+            if self.indexFile.is_file():
+                with open(self.indexFile) as f:
+                    index = json.load(f)
+            yield index
+            tmpfile = Path(self.root, 'index.json.tmp')
+            with open(tmpfile, 'w') as f:
+                json.dump(index, f, indent=1)
+            os.replace(tmpfile, self.indexFile)
+
+    def missing(self):
+        ''' names of tiles the bucket does not have '''
+        with open(Path(self.root, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            if not self.indexFile.is_file():
+                return set()
+            with open(self.indexFile) as f:
+                return set(json.load(f)['missing'])
+
+    def raw_path(self, lat, lon):
+        return Path(self.root, 'raw', f'{tile_name(lat, lon)}.tif')
+
+    def tile_path(self, lat, lon, n, geoid=None):
+        ''' processed tile for n pixels per degree, ellipsoid heights with
+        geoid, EGM2008 heights without '''
+        datum = Path(geoid).stem if geoid else 'egm2008'
+        return Path(self.root, 'tiles', f'{n}-{datum}',
+                    f'{tile_name(lat, lon)}.npy')
+
+    def sources(self, lat, lon):
+        ''' GLO-30 files of the tile at lat, lon and its neighbours in the
+        cache (none if the tile itself is not there) '''
+        if not self.raw_path(lat, lon).is_file():
+            return []
+        return [str(self.raw_path(*x)) for x in neighbours(lat, lon)
+                if self.raw_path(*x).is_file()]
+
+    def has_neighbours(self, lat, lon):
+        ''' every neighbour of the tile at lat, lon is in the cache or
+        known to be missing from the bucket '''
+        missing = self.missing()
+        return all(self.raw_path(*x).is_file() or tile_name(*x) in missing
+                   for x in neighbours(lat, lon)[1:])
+
+    def fetch(self, tiles, bucket, n=None, geoid=None, workers=8):
+        ''' download the (lat, lon) tiles not in the cache yet, and their
+        neighbours, skipping tiles already processed for n and geoid.
+        Returns the number of tiles downloaded '''
+        missing = self.missing()
+        process = [(lat, lon) for lat, lon in tiles
+                   if not (n and self.tile_path(lat, lon, n, geoid).is_file())]
+        todo = []
+        for lat, lon in process:
+            todo += [x for x in neighbours(lat, lon) if x not in todo
+                     and tile_name(*x) not in missing
+                     and not self.raw_path(*x).is_file()]
+        if not todo:
+            return 0
+        dl = downloader(workers=workers, connections=1,
+                        log=lambda line: None)
+        results = dl.fetch_all([(tile_url(lat, lon, bucket),
+                                 str(self.raw_path(lat, lon)))
+                                for lat, lon in todo])
+        dl.close()
+        ocean = []
+        for dest, result in results.items():
+            if not isinstance(result, Exception):
+                continue
+            cause = result.__cause__
+            if (isinstance(cause, requests.HTTPError) and cause.response is
+                    not None and cause.response.status_code in (403, 404)):
+                ocean.append(Path(dest).stem)
+            else:
+                raise result
+        if ocean:
+            with self.index() as index:
+                index['missing'] = sorted(set(index['missing']).union(ocean))
+                index['updated'] = time.time()
+        return len(todo) - len(ocean)
@@ -0,0 +1,288 @@
+"""
+Concurrent HTTP downloader with resume and checksum verification
+
+Files are fetched over a pooled, retrying requests.Session (credentials
+for ASF come from ~/.netrc as with wget/aria2c). If the server accepts
+range requests a file is split into chunks fetched over several
+connections and written in place into DEST.part; the chunks already
+written are listed in DEST.part.json so an interrupted download resumes
+where it stopped. The finished file is checked against the expected
+size and md5sum (e.g. the inventory's bytes and md5sum columns) before
+it is renamed to DEST. If DEST is a symlink, as left by slcCache, the
+file it points to is downloaded instead.
+
+Progress and errors are reported as one JSON object per line:
+
+{"event": "done", "url": ..., "dest": ..., "bytes": ..., "seconds": ..., "rate": ...}
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+MB = 1024**2
+CHUNK = 64*MB
+BLOCK = 1*MB
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+def get_session(retries=5, connections=8):
+    ''' pooled session retrying connection errors and busy responses '''
+    retry = Retry(total=retries, backoff_factor=1,
+                  status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['HEAD', 'GET'])
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=connections,
+                          pool_maxsize=connections)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def s3_to_https(uri):
+    ''' public s3://bucket/key as an https url '''
+    if not uri.startswith('s3://'):
+        return uri
+    bucket, key = uri[5:].split('/', 1)
+    return f'https://{bucket}.s3.amazonaws.com/{key}'
+
+
+def md5sum(path, blockSize=16*MB):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class rateLimiter:
+
+    """ Token bucket shared by every connection, bytesPerSecond=None is
+    unlimited """
+
+    def __init__(self, bytesPerSecond=None):
+        self.rate = bytesPerSecond
+        self.lock = threading.Lock()
+        self.allowance = 0.0
+        self.last = time.monotonic()
+
+    def consume(self, nbytes):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            # at most one second of burst
+            self.allowance = min(self.allowance + (now - self.last)*self.rate,
+                                 self.rate)
+            self.last = now
+            self.allowance -= nbytes
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class downloader:
+
+    """ Download up to workers files at once, each over up to connections
+    range requests, sharing one connection pool and rate limit.
+
+    log is called with each JSON progress line (default: print to stderr)
+    """
+
+    def __init__(self, workers=4, connections=4, chunkSize=CHUNK,
+                 rateLimit=None, retries=5, session=None, log=None,
+                 progressInterval=5.0):
+        self.workers = workers
+        self.connections = connections
+        self.chunkSize = chunkSize
+        self.limiter = rateLimiter(rateLimit)
+        self.retries = retries
+        self.session = session or get_session(retries, workers*connections)
+        self.log = log or (lambda line: print(line, file=sys.stderr))
+        self.progressInterval = progressInterval
+
+    def report(self, event, **kwargs):
+        self.log(json.dumps(dict(event=event, time=time.time(), **kwargs)))
+
+    def fetch_all(self, items):
+        ''' download [(url, dest, bytes, md5sum)] concurrently, returns
+        {dest: bytes transferred or exception} '''
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {item[1]: pool.submit(self.fetch, *item)
+                       for item in items}
+        return {dest: f.exception() or f.result()
+                for dest, f in futures.items()}
+
+    def fetch(self, url, dest, size=None, md5=None):
+        ''' download url to dest, return bytes transferred (0 if dest is
+        already complete). Raises DownloadError '''
+        url = s3_to_https(url)
+        dest = str(dest)
+        # write through a link (e.g. to an slcCache object) to its target,
+        # renaming onto the link would replace it with a copy
+        if os.path.islink(dest):
+            dest = os.path.realpath(dest)
+        t0 = time.perf_counter()
+        try:
+            # like wget -nc, an existing file with nothing to check it
+            # against is complete
+            if os.path.exists(dest) and self.verify(dest, size, md5):
+                self.report('skip', url=url, dest=dest, bytes=0)
+                return 0
+            total, ranges = self.probe(url)
+            if size is not None and total is not None and total != size:
+                raise DownloadError(f'{url} is {total} bytes, expected {size}')
+            total = total if total is not None else size
+            self.report('start', url=url, dest=dest, total=total)
+            if ranges and total:
+                nbytes = self.fetch_ranges(url, dest, total)
+            else:
+                nbytes = self.fetch_stream(url, dest)
+            part = f'{dest}.part'
+            if not self.verify(part, size or total, md5):
+                os.remove(part)
+                raise DownloadError(f'{url}: size or md5sum check failed')
+            os.replace(part, dest)
+            if os.path.exists(f'{part}.json'):
+                os.remove(f'{part}.json')
+        except Exception as e:
+            self.report('error', url=url, dest=dest, error=str(e),
+                        type=type(e).__name__)
+            if isinstance(e, DownloadError):
+                raise
+            raise DownloadError(f'{url}: {e}') from e
+        seconds = time.perf_counter() - t0
+        self.report('done', url=url, dest=dest, bytes=nbytes,
+                    seconds=round(seconds, 3),
+                    rate=round(nbytes / max(seconds, 1e-9)))
+        return nbytes
+
+    def verify(self, path, size=None, md5=None):
+        ''' path has the expected size and md5sum (if given) '''
+        if size is not None and os.path.getsize(path) != size:
+            return False
+        if md5 is not None and md5sum(path) != md5:
+            return False
+        return True
+
+    def probe(self, url):
+        ''' (content length, accepts ranges) from a HEAD request '''
+        r = self.session.head(url, allow_redirects=True, timeout=60)
+        if r.status_code >= 400:
+            # some servers do not allow HEAD
+            return None, False
+        total = r.headers.get('Content-Length')
+        ranges = r.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        return (int(total) if total is not None else None), ranges
+
+    def fetch_ranges(self, url, dest, total):
+        ''' chunks of dest.part in parallel, resuming from dest.part.json '''
+        part, stateFile = f'{dest}.part', f'{dest}.part.json'
+        chunks = [(start, min(start + self.chunkSize, total))
+                  for start in range(0, total, self.chunkSize)]
+        done = set()
+        if os.path.exists(part) and os.path.exists(stateFile):
+            with open(stateFile) as f:
+                state = json.load(f)
+            if state['total'] == total and state['chunkSize'] == self.chunkSize:
+                done = set(state['done'])
+        if not done:
+            with open(part, 'wb') as f:
+                f.truncate(total)
+        lock = threading.Lock()
+        progress = dict(bytes=0, last=time.perf_counter())
+
+        def save():
+            tmpfile = f'{stateFile}.tmp'
+            with open(tmpfile, 'w') as f:
+                json.dump(dict(url=url, total=total,
+                               chunkSize=self.chunkSize,
+                               done=sorted(done)), f)
+            os.replace(tmpfile, stateFile)
+
+        def fetch_chunk(i, fd):
+            start, stop = chunks[i]
+            headers = {'Range': f'bytes={start}-{stop - 1}'}
+            for attempt in range(self.retries + 1):
+                offset = start
+                try:
+                    with self.session.get(url, headers=headers, stream=True,
+                                          timeout=60) as r:
+                        if r.status_code != 206:
+                            raise DownloadError(f'{url}: range request '
+                                                f'returned {r.status_code}')
+                        for block in r.iter_content(BLOCK):
+                            self.limiter.consume(len(block))
+                            os.pwrite(fd, block, offset)
+                            offset += len(block)
+                            self.progress(url, dest, progress, lock,
+                                          len(block), total)
+                    if offset != stop:
+                        raise DownloadError(f'{url}: short range '
+                                            f'{start}-{stop}')
+                    break
+                except (requests.RequestException, DownloadError) as e:
+                    if attempt == self.retries:
+                        raise
+                    self.report('retry', url=url, dest=dest, range=[start, stop],
+                                error=str(e))
+                    time.sleep(2**attempt)
+            with lock:
+                done.add(i)
+                save()
+            return stop - start
+
+        todo = [i for i in range(len(chunks)) if i not in done]
+        fd = os.open(part, os.O_WRONLY)
+        try:
+            with ThreadPoolExecutor(max_workers=self.connections) as pool:
+                futures = [pool.submit(fetch_chunk, i, fd) for i in todo]
+                return sum(f.result() for f in futures)
+        finally:
+            os.close(fd)
+
+    def fetch_stream(self, url, dest):
+        ''' single connection, appending to dest.part if the server allows '''
+        part = f'{dest}.part'
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        lock = threading.Lock()
+        progress = dict(bytes=0, last=time.perf_counter())
+        with self.session.get(url, headers=headers, stream=True,
+                              timeout=60) as r:
+            r.raise_for_status()
+            mode = 'ab' if r.status_code == 206 else 'wb'
+            total = r.headers.get('Content-Length')
+            total = int(total) + (offset if mode == 'ab' else 0) if total else None
+            nbytes = 0
+            with open(part, mode) as f:
+                for block in r.iter_content(BLOCK):
+                    self.limiter.consume(len(block))
+                    f.write(block)
+                    nbytes += len(block)
+                    self.progress(url, dest, progress, lock, len(block),
+                                  total)
+        return nbytes
+
+    def progress(self, url, dest, progress, lock, nbytes, total):
+        with lock:
+            progress['bytes'] += nbytes
+            now = time.perf_counter()
+            if now - progress['last'] < self.progressInterval:
+                return
+            progress['last'] = now
+            done = progress['bytes']
+        self.report('progress', url=url, dest=dest, bytes=done, total=total)
+
+    def close(self):
+        self.session.close()
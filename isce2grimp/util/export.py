@@ -0,0 +1,195 @@
+"""
+Tiled GeoTIFF (COG) and Zarr copies of the .uw and .conncomp
+
+convertuw can hand every streamed block of the masked phase and the
+connected components to exporters, so the ISCE .unw is still read once:
+
+filt_topophase.uw.tif, filt_topophase.conncomp.tif
+    Cloud optimized GeoTIFFs, 512 x 512 compressed tiles with overviews
+    (average for the phase, ignoring NODATA, nearest for conncomp).
+    Blocks go into an uncompressed tiled GeoTIFF a whole row of tiles at
+    a time, which the COG driver then reads again to compress it and add
+    the overviews. That second pass needs the temporary file (4 bytes a
+    pixel for the phase, 1 for conncomp) next to the output; compressing
+    it as well saves little disk on noisy phase and is slower overall,
+    as the COG driver re-encodes every tile anyway.
+filt_topophase.zarr
+    phase and conncomp arrays in 512 x 512 chunks (needs zarr), written a
+    whole row of chunks at a time so no chunk is rewritten.
+
+Both stay in radar coordinates (row = azimuth line, column = range
+pixel). The geodat file and its main parameters are kept as GeoTIFF tags
+and Zarr attributes, and the GeoTIFFs carry a 5 x 5 grid of lat/lon
+ground control points from geolocate.rdr2geo so GDAL and web viewers can
+place them.
+"""
+import abc
+import os
+
+import numpy as np
+
+from .geolocate import rdr2geo
+
+FORMATS = ('cog', 'zarr')
+TILE = 512
+
+
+def geodat_tags(georxa):
+    ''' geodat parameters worth having without parsing the geodat '''
+    with open(georxa.file) as f:
+        text = f.read()
+    return dict(GEODAT=text, GEODAT_FILE=os.path.basename(georxa.file),
+                RANGE_SIZE=georxa.nr, AZIMUTH_SIZE=georxa.na,
+                RANGE_LOOKS=georxa.nlr, AZIMUTH_LOOKS=georxa.nla,
+                NEAR_RANGE=georxa.nearRangem(), FAR_RANGE=georxa.farRangem(),
+                RANGE_PIXEL_SIZE=georxa.slpRg * georxa.nlr,
+                FIRST_LINE_TIME=georxa.t0, PRF=georxa.prf,
+                DATE=georxa.midnight.strftime('%Y-%m-%d'),
+                WAVELENGTH=georxa.wavelength, PASS=georxa.ascdesc,
+                LOOK_DIRECTION=georxa.lookdir)
+
+
+def radar_gcps(georxa, n=5):
+    ''' n x n rasterio ground control points (pixel centres, lon/lat) '''
+    from rasterio.control import GroundControlPoint
+    if georxa.orbit is None:
+        georxa.setupInterpState()
+    rows = np.linspace(0, georxa.na - 1, n).round().astype(int)
+    cols = np.linspace(0, georxa.nr - 1, n).round().astype(int)
+    t = georxa.t0 + rows * georxa.nla / georxa.prf
+    r = georxa.nearRangem() + cols * georxa.nlr * georxa.slpRg
+    lat, lon, _ = rdr2geo(georxa.orbit, t[:, None], r[None, :],
+                          lookSide=georxa.lookdir or 'right')
+    return [GroundControlPoint(row=float(row) + 0.5, col=float(col) + 0.5,
+                               x=float(lon[i, j]), y=float(lat[i, j]))
+            for i, row in enumerate(rows) for j, col in enumerate(cols)]
+
+
+class blockExporter(abc.ABC):
+
+    """ Collects row blocks of an nr by na image and writes them in
+    groups of whole tile rows (plus the remainder at the end).
+    """
+
+    def __init__(self, nr, na, rows=TILE):
+        self.nr, self.na, self.rows = nr, na, rows
+        self.line = 0
+        self.pending = []
+
+    def add(self, block):
+        self.pending.append(np.array(block))
+        buffered = sum(len(x) for x in self.pending)
+        if buffered >= self.rows:
+            data = np.vstack(self.pending)
+            n = len(data) // self.rows * self.rows
+            self._write(self.line, data[:n])
+            self.line += n
+            self.pending = [data[n:]] if n < len(data) else []
+
+    def close(self):
+        if self.pending:
+            data = np.vstack(self.pending)
+            self._write(self.line, data)
+            self.line += len(data)
+            self.pending = []
+        if self.line != self.na:
+            raise ValueError(f'{self.path}: got {self.line} of {self.na} '
+                             f'lines')
+
+    @abc.abstractmethod
+    def _write(self, line0, data):
+        ''' write data as lines line0 onwards '''
+
+
+class cogWriter(blockExporter):
+
+    """ Streamed band written to a tiled GeoTIFF, then copied to a COG.
+    Deflate rather than zstd, which not every web viewer decodes.
+    """
+
+    def __init__(self, path, nr, na, dtype, nodata=None, tags=None,
+                 gcps=None, tile=TILE, compress='deflate',
+                 resampling='average'):
+        import rasterio
+        super().__init__(nr, na, tile)
+        self.path, self.tile = path, tile
+        self.compress, self.resampling = compress, resampling
+        self.tmpfile = f'{path}.tmp.tif'
+        # floating point predictor for the phase, horizontal for integers
+        self.predictor = 3 if np.dtype(dtype).kind == 'f' else 2
+        georeference = dict(gcps=gcps, crs='EPSG:4326') if gcps else {}
+        self.dst = rasterio.open(
+            self.tmpfile, 'w', driver='GTiff', width=nr, height=na, count=1,
+            dtype=dtype, nodata=nodata, tiled=True, blockxsize=tile,
+            blockysize=tile, BIGTIFF='IF_SAFER', **georeference)
+        if tags:
+            self.dst.update_tags(**tags)
+
+    def _write(self, line0, data):
+        from rasterio.windows import Window
+        self.dst.write(data, 1, window=Window(0, line0, self.nr, len(data)))
+
+    def close(self):
+        import rasterio.shutil
+        super().close()
+        self.dst.close()
+        self.tmpBytes = os.path.getsize(self.tmpfile)
+        rasterio.shutil.copy(self.tmpfile, self.path, driver='COG',
+                             BLOCKSIZE=self.tile, COMPRESS=self.compress,
+                             PREDICTOR=self.predictor, OVERVIEWS='AUTO',
+                             RESAMPLING=self.resampling, BIGTIFF='IF_SAFER')
+        os.remove(self.tmpfile)
+
+
+class zarrWriter(blockExporter):
+
+    """ Streamed array in a Zarr group, whole rows of chunks at a time.
+    """
+
+    def __init__(self, path, group, name, nr, na, dtype, nodata=None,
+                 chunk=TILE):
+        super().__init__(nr, na, chunk)
+        self.path = f'{path}/{name}'
+        # zarr 3 create_array, zarr 2 create_dataset
+        create = getattr(group, 'create_array', None) or group.create_dataset
+        self.array = create(name, shape=(na, nr), chunks=(chunk, chunk),
+                            dtype=dtype, fill_value=nodata)
+
+    def _write(self, line0, data):
+        self.array[line0:line0 + len(data)] = data
+
+
+def open_zarr(path, attrs):
+    ''' new Zarr group at path with attrs '''
+    try:
+        import zarr
+    except ImportError as e:
+        raise ImportError('zarr export needs zarr (pip install zarr)') from e
+    group = zarr.open_group(path, mode='w')
+    group.attrs.update(attrs)
+    return group
+
+
+def exporters(uwFile, georxa, formats, nodata):
+    ''' (phase, conncomp) exporter pairs for each format in formats '''
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f'export formats must be in {FORMATS}, not '
+                         f'{sorted(unknown)}')
+    nr, na = georxa.nr, georxa.na
+    tags = geodat_tags(georxa)
+    root = uwFile[:-len('.uw')] if uwFile.endswith('.uw') else uwFile
+    pairs = []
+    if 'cog' in formats:
+        gcps = radar_gcps(georxa)
+        pairs.append((
+            cogWriter(f'{uwFile}.tif', nr, na, 'float32', nodata, tags,
+                      gcps),
+            cogWriter(f'{root}.conncomp.tif', nr, na, 'uint8', None, tags,
+                      gcps, resampling='nearest')))
+    if 'zarr' in formats:
+        path = f'{root}.zarr'
+        group = open_zarr(path, tags)
+        pairs.append((zarrWriter(path, group, 'phase', nr, na, 'f4', nodata),
+                      zarrWriter(path, group, 'conncomp', nr, na, 'u1', 0)))
+    return pairs
@@ -2,20 +2,31 @@
 import numpy as np
 import math
 import os
+import json
 from datetime import datetime
-import scipy.interpolate as interp
+from functools import cached_property
 import pyproj
+from .orbit import orbitInterpolator
 
 
 class geodatrxa:
 
     """ Geodat object - contains information from a geodat file"""
 
-    def __init__(self, file=None, echo=False):
+    # attributes saved in the optional .cache.json sidecar
+    cacheFields = ['midnight', 'datetime', 'skew', 'squint', 'nr', 'na',
+                   'nlr', 'nla', 'ReMajor', 'ReMinor', 'Rc', 'phic', 'H',
+                   'deltaR', 'corners', 'slpRg', 'slpAz', 'ascdesc',
+                   'lookdir', 't0', 't1', 'prf', 'wavelength', 'nState',
+                   'tState', 'dtState', 'dTState', 'position', 'velocity',
+                   'deltaT', 'stateTime', 'rNearSLP']
+
+    def __init__(self, file=None, echo=False, cache=False):
         """ initialize a geodatrxa object, where:
         file\t is optional file name, can be input later with '
         readFile(file=file) echo\t set to true to echo results as they are'
-        read in, otherwise no output """
+        read in, otherwise no output. cache\t set to true to read/write
+        a <file>.cache.json sidecar so repeated opens skip parsing """
         #
         # set everything to empty values
         self.file = ''
@@ -32,16 +43,27 @@ class geodatrxa:
         self.rNearSLP = None
         self.stateTime = None
         self.nState, self.tState, self.dTState = -1, -1, -1
+        self.dtState = -1
         self.position = self.velocity = []
-        self.ecef = pyproj.Proj(proj='geocent', ellps='WGS84', datum='WGS84')
-        self.llz = pyproj.Proj(proj='latlong', ellps='WGS84', datum='WGS84')
-        self.llzToEcef = pyproj.Transformer.from_proj(self.llz, self.ecef)
         self.minT, self.maxT = -1, -1
-        self.fx, self.fy, self.fz, self.fvx, self.fvy, self.fvz = [None]*6
+        self.orbit = None
         # in most cases all or no args would be passe.
         if file is not None:
             self.file = file
-            self.readFile(echo=echo)
+            self.readFile(echo=echo, cache=cache)
+
+    # projections are only built when geocoding is first needed
+    @cached_property
+    def ecef(self):
+        return pyproj.Proj(proj='geocent', ellps='WGS84', datum='WGS84')
+
+    @cached_property
+    def llz(self):
+        return pyproj.Proj(proj='latlong', ellps='WGS84', datum='WGS84')
+
+    @cached_property
+    def llzToEcef(self):
+        return pyproj.Transformer.from_proj(self.llz, self.ecef)
 
     # return resolution
     def singleLookResolution(self):
@@ -157,138 +179,162 @@ class geodatrxa:
             exit()
         return True if self.ascdesc.lower() == 'asscending' else False
 
-    def readFile(self, file=None, echo=False):
+    def readFile(self, file=None, echo=False, cache=False):
         if file is not None:
             self.file = file
         # check file exists
-        if os.path.exists(self.file):
-            fp = open(self.file, 'r')
-        else:
+        if not os.path.exists(self.file):
             print('Attempted to open geodat file that does not exist')
             exit()
+        if cache and self.readCache():
+            if echo:
+                print(f'read {self.cacheFile()}')
+            return
+        with open(self.file, 'r') as fp:
+            lines = fp.read().splitlines()
         #
-        ncorners = 0
-        timeSet = False
-        nState = 0
-        position = True
-        self.corners = np.zeros((5, 2))
+        # Tokenize once: the image date and skew are the only comment items
+        # to extract, all non-commented data is in a set order
+        data = []
+        for line in lines:
+            if ';' in line:
+                if '; Image date' in line:
+                    tmp = line.split(':')[-1].strip()
+                    self.midnight = datetime.strptime(tmp, "%d %b %Y")
+                elif 'Skew' in line:
+                    self.skew, self.squint = \
+                        [float(x) for x in line.split()[7:9]]
+            elif line.strip():
+                data.append(line.split())
         #
-        # Loop through lines
+        self.nr, self.na, self.nlr, self.nla = [int(x) for x in data[0]]
+        if echo:
+            print('nr,na,nlr,nla ', self.nr, self.na, self.nlr, self.nla)
+        tmp = [float(x) for x in data[1]]
+        self.ReMajor, self.ReMinor, self.Rc, self.phic, self.H = tmp[0:5]
+        if len(tmp) == 6:
+            self.deltaR = tmp[5]
+        if echo:
+            print('ReMajor, ReMinor, Rc, phic, h, deltaR: ', self.ReMajor,
+                  self.ReMinor, self.Rc, self.phic, self.H, self.deltaR)
+        self.corners = np.array(data[2:7], dtype='f8')
+        if echo:
+            print(self.corners)
+        self.slpRg, self.slpAz = [float(x) for x in data[7]]
+        if echo:
+            print('Single Look Pix Size (r, a)', self.slpRg, self.slpAz)
         #
-        for line in fp:
-            # image date is the only comment item to extract
-            if '; Image date' in line:
-                tmp = line.split(':')[-1].strip()
-                self.midnight = datetime.strptime(tmp, "%d %b %Y")
-            # extract all non-commented data,  assuming its in a set order
-            elif 'Skew' in line:
-                self.skew, self.squint = [float(x) for x in line.split()[7:9]]
-            elif ';' not in line:
-                tmp = line.strip().split()
-                if self.nr == -1 and len(tmp) == 4:
-                    self.nr, self.na = int(tmp[0]), int(tmp[1])
-                    self.nlr, self.nla = int(tmp[2]), int(tmp[3])
-                    if echo:
-                        print('nr,na,nlr,nla ', self.nr, self.na,
-                              self.nlr, self.nla)
-                elif self.ReMajor == -1 and (len(tmp) == 5 or len(tmp) == 6):
-                    self.ReMajor = float(tmp[0])
-                    self.ReMinor = float(tmp[1])
-                    self.Rc = float(tmp[2])
-                    self.phic = float(tmp[3])
-                    self.H = float(tmp[4])
-                    if len(tmp) == 6:
-                        self.deltaR = float(tmp[5])
-                    if echo:
-                        print('ReMajor, ReMinor, Rc, phic, h, deltaR: ',
-                              self.ReMajor, self.ReMinor, self.Rc,
-                              self.phic, self.H, self.deltaR)
-                elif ncorners < 5 and len(tmp) == 2:
-                    self.corners[ncorners, :] = float(tmp[0]), float(tmp[1])
-                    ncorners += 1
-                    if ncorners == 5 and echo:
-                        print(self.corners)
-                elif self.slpRg == -1 and len(tmp) == 2:
-                    self.slpRg, self.slpAz = float(tmp[0]), float(tmp[1])
-                    if echo:
-                        print('Single Look Pix Size (r, a)',
-                              self.slpRg, self.slpAz)
-                elif (tmp[0] in ['descending', 'ascending'] and
-                      len(self.ascdesc) == 0):
-                    self.ascdesc = tmp[0]
-                    if echo:
-                        print(self.ascdesc)
-                elif tmp[0] in ['right', 'left'] and len(self.lookdir) == 0:
-                    self.lookdir = tmp[0]
-                    if echo:
-                        print('Look direction ', self.lookdir)
-                elif tmp[0] in ['state']:
-                    if echo:
-                        print(tmp[0])
-                elif len(tmp) == 3 and not timeSet:
-                    hour, minute = int(tmp[0]), int(tmp[1])
-                    second = int(float(tmp[2]))
-                    microsecond = int((float(tmp[2])-second)*1e6)
-                    # this is  a kluge for case where squint time pushes over
-                    # 24 hour boundary - not a problem in most casese
-                    if hour > 23:
-                        hour, minute, second = 23, 59, 59
-                    self.datetime = \
-                        self.midnight.replace(hour=hour, minute=minute,
-                                              second=second,
-                                              microsecond=microsecond)
-                    self.t0 = (self.datetime - self.midnight).total_seconds()
-                    if echo:
-                        print('Date/Time ', self.datetime)
-                    timeSet = True
-                elif len(tmp) == 1 and self.prf == -1:
-                    self.prf = float(tmp[0])
-                    if echo:
-                        print('Prf ', self.prf)
-                elif len(tmp) == 1 and self.wavelength == -1:
-                    self.wavelength = float(tmp[0])
-                    if echo:
-                        print('wavelength ', self.wavelength)
-                elif len(tmp) == 1 and self.nState == -1:
-                    self.nState = int(tmp[0])
-                    if echo:
-                        print('nState ', self.nState)
-                    self.position = np.zeros((self.nState, 3))
-                    self.velocity = np.zeros((self.nState, 3))
-                elif len(tmp) == 1 and self.tState == -1:
-                    self.tState = float(tmp[0])
-                    if echo:
-                        print('tState ', self.tState)
-                elif len(tmp) == 1 and self.dTState == -1:
-                    self.dtState = float(tmp[0])
-                    if echo:
-                        print('dtState ', self.dtState)
-                elif nState < self.nState and len(tmp) == 3:
-                    if position:
-                        self.position[nState, :] = [float(tmp[0]),
-                                                    float(tmp[1]),
-                                                    float(tmp[2])]
-                        position = False
-                    else:
-                        self.velocity[nState, :] = [float(tmp[0]),
-                                                    float(tmp[1]),
-                                                    float(tmp[2])]
-                        position = True
-                        nState += 1
-                elif 'deltaT' in line:
-                    self.deltaT = float(tmp[1])
-                    if echo:
-                        print('deltaT ', self.deltaT)
+        # Remaining items are keyed by their first token
+        rest = iter(data[8:])
+        for tmp in rest:
+            if tmp[0] in ['descending', 'ascending'] and \
+                    len(self.ascdesc) == 0:
+                self.ascdesc = tmp[0]
+                if echo:
+                    print(self.ascdesc)
+            elif tmp[0] in ['right', 'left'] and len(self.lookdir) == 0:
+                self.lookdir = tmp[0]
+                if echo:
+                    print('Look direction ', self.lookdir)
+            elif tmp[0] == 'state':
+                self.readState(next(rest), rest, echo=echo)
+            elif len(tmp) == 3 and self.t0 is None:
+                # state block without the 'state' flag
+                self.readState(tmp, rest, echo=echo)
+            elif 'deltaT' in tmp[0]:
+                self.deltaT = float(tmp[1])
+                if echo:
+                    print('deltaT ', self.deltaT)
         if echo:
             print('Position (x,y,z): \n', self.position)
             print('Velocity (vx,vy,vz): \n', self.velocity)
         #
-        self.stateTime = np.array([self.tState + x*self.dtState
-                                   for x in range(0, self.nState)])
+        self.stateTime = self.tState + \
+            np.arange(max(self.nState, 0)) * self.dtState
         # compute near in slp coordates for geocoding
         self.rNearSLP = self.Rc * 1000.0 - ((self.nr-1)/2) * \
             self.nlr * self.slpRg - (self.nlr-1) * self.slpRg/2.
         self.t1 = self.t0 + (self.na-1) * self.nla/self.prf
+        if cache:
+            self.writeCache()
+
+    def readState(self, tmp, rest, echo=False):
+        ''' parse time, prf, wavelength and state vectors that follow the
+        state flag, where tmp is the time line and rest the remaining lines '''
+        hour, minute = int(tmp[0]), int(tmp[1])
+        second = int(float(tmp[2]))
+        microsecond = int((float(tmp[2])-second)*1e6)
+        # this is  a kluge for case where squint time pushes over
+        # 24 hour boundary - not a problem in most casese
+        if hour > 23:
+            hour, minute, second = 23, 59, 59
+        self.datetime = self.midnight.replace(hour=hour, minute=minute,
+                                              second=second,
+                                              microsecond=microsecond)
+        self.t0 = (self.datetime - self.midnight).total_seconds()
+        if echo:
+            print('Date/Time ', self.datetime)
+        self.prf = float(next(rest)[0])
+        self.wavelength = float(next(rest)[0])
+        self.nState = int(next(rest)[0])
+        self.tState = float(next(rest)[0])
+        self.dtState = self.dTState = float(next(rest)[0])
+        if echo:
+            print('Prf ', self.prf)
+            print('wavelength ', self.wavelength)
+            print('nState ', self.nState)
+            print('tState ', self.tState)
+            print('dtState ', self.dtState)
+        state = np.array([next(rest) for i in range(2*self.nState)],
+                         dtype='f8').reshape(self.nState, 2, 3)
+        self.position = np.ascontiguousarray(state[:, 0])
+        self.velocity = np.ascontiguousarray(state[:, 1])
+
+    def cacheFile(self):
+        return self.file + '.cache.json'
+
+    def writeCache(self):
+        ''' save parsed values keyed by the geodat file mtime and size,
+        silently skipped if the directory is not writable '''
+        stat = os.stat(self.file)
+        out = dict(mtime=stat.st_mtime_ns, size=stat.st_size)
+        for key in self.cacheFields:
+            if not hasattr(self, key):
+                continue
+            value = getattr(self, key)
+            if isinstance(value, np.ndarray):
+                value = value.tolist()
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            out[key] = value
+        try:
+            with open(self.cacheFile(), 'w') as f:
+                json.dump(out, f)
+        except OSError:
+            pass
+
+    def readCache(self):
+        ''' load values from the sidecar, False if missing or stale '''
+        try:
+            with open(self.cacheFile()) as f:
+                cached = json.load(f)
+            stat = os.stat(self.file)
+        except (OSError, ValueError):
+            return False
+        if cached.get('mtime') != stat.st_mtime_ns or \
+                cached.get('size') != stat.st_size:
+            return False
+        for key in self.cacheFields:
+            if key not in cached:
+                continue
+            value = cached[key]
+            if key in ['midnight', 'datetime']:
+                value = datetime.fromisoformat(value)
+            elif key in ['corners', 'position', 'velocity', 'stateTime']:
+                value = np.array(value, dtype='f8')
+            setattr(self, key, value)
+        return True
+
     # geocoding methods
 
     def printState(self):
@@ -297,56 +343,40 @@ class geodatrxa:
             print(f'{t:10.4f} {pos[0]:8.1f} {pos[1]:8.1f} {pos[2]:8.1f} '
                   f'{vel[0]:8.1f} {vel[1]:8.1f} {vel[2]:8.1f}')
 
-    def setupInterpState(self):
-        ''' setup interpolators '''
-        kind = 'cubic'
-        bError = False
-        self.fx = interp.interp1d(self.stateTime, self.position[:, 0],
-                                  kind=kind, fill_value=np.nan,
-                                  bounds_error=bError)
-        self.fy = interp.interp1d(self.stateTime, self.position[:, 1],
-                                  kind=kind, fill_value=np.nan,
-                                  bounds_error=bError)
-        self.fz = interp.interp1d(self.stateTime, self.position[:, 2],
-                                  kind=kind, fill_value=np.nan,
-                                  bounds_error=bError)
-        self.fvx = interp.interp1d(self.stateTime, self.velocity[:, 0],
-                                   kind=kind, fill_value=np.nan,
-                                   bounds_error=bError)
-        self.fvy = interp.interp1d(self.stateTime, self.velocity[:, 1],
-                                   kind=kind, fill_value=np.nan,
-                                   bounds_error=bError)
-        self.fvz = interp.interp1d(self.stateTime, self.velocity[:, 2],
-                                   kind=kind, fill_value=np.nan,
-                                   bounds_error=bError)
+    def setupInterpState(self, kind='hermite'):
+        ''' setup interpolator for position and velocity '''
+        self.orbit = orbitInterpolator(self.stateTime, self.position,
+                                       self.velocity, kind=kind)
 
-    def interpPos(self, t):
-        '''Interp state position vectors; For now only work with scalars '''
-        if self.fx is None:
+    def interpState(self, t):
+        '''Interp state position and velocity vectors together, returns
+        pos, vel each shaped t.shape + (3,) '''
+        if self.orbit is None:
             self.setupInterpState()
-        #
-        x, y, z = self.fx(t), self.fy(t), self.fz(t)
+        return self.orbit(t)
+
+    def interpPos(self, t):
+        '''Interp state position vectors; list for scalars, (3, n) for arrays'''
+        pos = self.interpState(t)[0]
         if np.isscalar(t):
-            return [np.asscalar(x), np.asscalar(y), np.asscalar(z)]
+            return pos.tolist()
         else:
-            return np.array([x, y, z])
+            return np.moveaxis(pos, -1, 0)
 
     def interpVel(self, t):
-        '''Interp state velocity vectors; For now only work with scalars '''
-        if self.fvx is None:
-            self.setupInterpState()
-        #
-        vx, vy, vz = self.fvx(t), self.fvy(t), self.fvz(t)
+        '''Interp state velocity vectors; list for scalars, (3, n) for arrays'''
+        vel = self.interpState(t)[1]
         if np.isscalar(t):
-            return [np.asscalar(vx), np.asscalar(vy), np.asscalar(vz)]
+            return vel.tolist()
         else:
-            return np.array([vx, vy, vz])
+            return np.moveaxis(vel, -1, 0)
 
     def lltoecef(self, lat, lon, zelev):
         ''' convert llz to ecef'''
     #    return pyproj.transform(self.llz, self.ecef, lon, lat, zelev,
     #                            radians=False)
-        return self.llzToEcef.transform(lat, lon, zelev, radians=False)
+        # latlong proj is lon/lat axis order
+        return self.llzToEcef.transform(lon, lat, zelev, radians=False)
 
     def ReH(self, myTime):
         sPt = np.array(self.interpPos(myTime))
@@ -357,11 +387,9 @@ class geodatrxa:
         tPt = self.lltoecef(lat, lon, z)
         if initT is None:
             initT = self.t0 + 0.5 * self.na * self.nla / self.prf
-        print(initT)
         myTime = initT
         for i in range(0, 50):
-            sPt = np.array(self.interpPos(myTime))
-            vPt = np.array(self.interpVel(myTime))
+            sPt, vPt = self.interpState(myTime)
             #
             dr = tPt - sPt
             df = np.dot(dr, vPt)
@@ -375,5 +403,55 @@ class geodatrxa:
         # correct to near range for multi-look,  the sub
         r = (np.sqrt(np.dot(dr, dr)) - self.rNearSLP)/self.slpRg
         az = (myTime - self.t0) * self.prf
-        print(i)  # print(r,az,i)
         return r, az, myTime
+
+    def llzToRA(self, lat, lon, z, initT=None, maxIter=50, tol=1e-5):
+        ''' geocode arrays of lat/lon/z to range/azimuth coordinates.
+        Same zero Doppler Newton iteration as llzPtToRA, but solved for all
+        points at once, with each point dropped from the iteration once it
+        has converged. Returns r, az, time arrays shaped like the inputs
+        (single look pixels, as for llzPtToRA) '''
+        lat, lon, z = np.broadcast_arrays(np.asarray(lat, dtype='f8'),
+                                          np.asarray(lon, dtype='f8'),
+                                          np.asarray(z, dtype='f8'))
+        shape = lat.shape
+        tPt = np.column_stack(self.lltoecef(lat.ravel(), lon.ravel(),
+                                            z.ravel()))
+        if initT is None:
+            initT = self.t0 + 0.5 * self.na * self.nla / self.prf
+        myTime = np.full(tPt.shape[0], initT, dtype='f8')
+        R = np.full(tPt.shape[0], np.nan)
+        active = np.arange(tPt.shape[0])
+        for i in range(0, maxIter):
+            sPt, vPt = self.interpState(myTime[active])
+            #
+            dr = tPt[active] - sPt
+            df = np.einsum('ij,ij->i', dr, vPt)
+            # assume zero dop geom for now
+            dt = df / -np.einsum('ij,ij->i', vPt, vPt)
+            myTime[active] -= dt
+            R[active] = np.sqrt(np.einsum('ij,ij->i', dr, dr))
+            # nan (off the orbit) never converges, so drop it too
+            active = active[np.abs(dt) >= tol]
+            if active.size == 0:
+                break
+        r = (R - self.rNearSLP)/self.slpRg
+        az = (myTime - self.t0) * self.prf
+        return r.reshape(shape), az.reshape(shape), myTime.reshape(shape)
+
+    def demToRA(self, demFile, band=1):
+        ''' geocode every pixel of a lat/lon (EPSG:4326) DEM raster to
+        range/azimuth coordinates, returns r, az, time arrays shaped
+        like the DEM '''
+        import rasterio  # only needed here, keep geodatrxa import light
+        with rasterio.open(demFile) as src:
+            z = src.read(band).astype('f8')
+            rows, cols = np.indices(z.shape)
+            # pixel centers
+            a, b, c, d, e, f = src.transform[:6]
+            lon = c + a*(cols + 0.5) + b*(rows + 0.5)
+            lat = f + d*(cols + 0.5) + e*(rows + 0.5)
+            nodata = src.nodata
+        if nodata is not None:
+            z[z == nodata] = np.nan
+        return self.llzToRA(lat, lon, z)
@@ -0,0 +1,232 @@
+"""
+Vectorized zero-Doppler range/azimuth to geodetic coordinates
+
+rdr2geo solves for every (time, range) point at once. For each point the
+target lies in the zero-Doppler plane (perpendicular to the satellite
+velocity) at the slant range from the satellite, so it is parametrised
+by one look angle; Newton iterations find the angle that puts the target
+on the WGS84 ellipsoid raised by the requested height, and a few outer
+passes correct the raised ellipsoid to the true geodetic height. Points
+are dropped from the iteration once they have converged.
+
+This replaces ISCE's per-point Orbit.rdr2geo ("never to be used for heavy
+duty computing") for corners, centroid, incidence and footprints.
+"""
+import datetime
+
+import numpy as np
+
+from .orbit import orbitInterpolator
+
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+
+def llh_to_ecef(lat, lon, h):
+    ''' geodetic lat, lon (degrees), height (m) to ECEF, shape + (3,) '''
+    lat, lon = np.radians(lat), np.radians(lon)
+    N = WGS84_A / np.sqrt(1 - WGS84_E2 * np.sin(lat)**2)
+    return np.stack([(N + h) * np.cos(lat) * np.cos(lon),
+                     (N + h) * np.cos(lat) * np.sin(lon),
+                     (N * (1 - WGS84_E2) + h) * np.sin(lat)], axis=-1)
+
+
+def ecef_to_llh(xyz):
+    ''' ECEF (..., 3) to geodetic lat, lon (degrees), height (m).
+    Bowring's formula with one refinement, sub-mm near the surface '''
+    x, y, z = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+    p = np.hypot(x, y)
+    ep2 = WGS84_E2 / (1 - WGS84_E2)
+    lat = np.arctan2(z, p * (1 - WGS84_E2))
+    for _ in range(2):
+        beta = np.arctan2((1 - WGS84_F) * np.sin(lat), np.cos(lat))
+        lat = np.arctan2(z + ep2 * WGS84_B * np.sin(beta)**3,
+                         p - WGS84_E2 * WGS84_A * np.cos(beta)**3)
+    N = WGS84_A / np.sqrt(1 - WGS84_E2 * np.sin(lat)**2)
+    # avoid the cos(lat) division near the poles
+    h = p * np.cos(lat) + z * np.sin(lat) - WGS84_A**2 / N
+    return np.degrees(lat), np.degrees(np.arctan2(y, x)), h
+
+
+def ellipsoid_normal(lat, lon):
+    ''' outward unit normal (..., 3) at geodetic lat, lon (degrees) '''
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon),
+                     np.sin(lat)], axis=-1)
+
+
+def _unit(v):
+    return v / np.linalg.norm(v, axis=-1, keepdims=True)
+
+
+def _dot(a, b):
+    return np.einsum('...i,...i->...', a, b)
+
+
+def rdr2geo(orbit, t, rng, height=0.0, lookSide='right', tol=1e-6,
+            maxIter=20, heightPasses=3, full=False):
+    ''' geodetic lat, lon, height of targets at zero-Doppler time t (orbit
+    seconds) and slant range rng (m) above the ellipsoid by height (m,
+    scalar or array, e.g. DEM values). Arguments broadcast together.
+    With full=True also return the target and satellite ECEF positions
+    and the satellite velocity. Points outside the orbit are nan '''
+    t, rng, height = np.broadcast_arrays(np.asarray(t, dtype='f8'),
+                                         np.asarray(rng, dtype='f8'),
+                                         np.asarray(height, dtype='f8'))
+    shape = t.shape
+    t, rng, height = t.ravel(), rng.ravel(), height.ravel()
+    # an image has one time per line, evaluate the orbit once per time
+    times, line = np.unique(t, return_inverse=True)
+    sat, vel = orbit(times)
+    # zero-Doppler plane basis: down (towards the geocentre, perpendicular
+    # to the velocity) and across track to the look side
+    vhat = _unit(vel)
+    down = -sat + _dot(sat, vhat)[:, None] * vhat
+    down = _unit(down)
+    across = np.cross(down, vhat)
+    if lookSide == 'left':
+        across = -across
+    elif lookSide != 'right':
+        raise ValueError(f"rdr2geo: lookSide must be 'right' or 'left', "
+                         f"not {lookSide}")
+
+    # spherical first guess of the look angle from the down direction
+    satRadius = np.linalg.norm(sat, axis=1)
+    earthRadius = np.linalg.norm(llh_to_ecef(*ecef_to_llh(sat)[:2], 0.0),
+                                 axis=-1)
+    sat, vel, down, across = sat[line], vel[line], down[line], across[line]
+    satRadius, earthRadius = satRadius[line], earthRadius[line] + height
+    cosLook = (satRadius**2 + rng**2 - earthRadius**2) / (2 * satRadius * rng)
+    look = np.arccos(np.clip(cosLook, -1, 1))
+
+    hEffective = height.copy()
+    for _ in range(heightPasses):
+        # ellipsoid raised by hEffective, x'Dx = 1
+        A2, B2 = (WGS84_A + hEffective)**2, (WGS84_B + hEffective)**2
+        active = np.flatnonzero(np.isfinite(look))
+        for _ in range(maxIter):
+            c, s = np.cos(look[active]), np.sin(look[active])
+            r = rng[active, None]
+            los = c[:, None] * down[active] + s[:, None] * across[active]
+            dlos = -s[:, None] * down[active] + c[:, None] * across[active]
+            T = sat[active] + r * los
+            DT = T / np.column_stack([A2[active], A2[active], B2[active]])
+            g = _dot(T, DT) - 1
+            dg = 2 * _dot(DT, r * dlos)
+            step = g / dg
+            look[active] -= step
+            active = active[np.abs(step) >= tol]
+            if active.size == 0:
+                break
+        los = (np.cos(look)[:, None] * down + np.sin(look)[:, None] * across)
+        target = sat + rng[:, None] * los
+        lat, lon, h = ecef_to_llh(target)
+        dh = height - h
+        # the raised ellipsoid is already exact at zero height
+        if not np.nanmax(np.abs(dh), initial=0) > 1e-3:
+            break
+        hEffective += dh
+
+    out = lat.reshape(shape), lon.reshape(shape), h.reshape(shape)
+    if full:
+        out += (target.reshape(shape + (3,)), sat.reshape(shape + (3,)),
+                vel.reshape(shape + (3,)))
+    return out
+
+
+def enu_basis(lat, lon):
+    ''' local east, north, up unit vectors (..., 3) at lat, lon '''
+    lat, lon = np.radians(lat), np.radians(lon)
+    east = np.stack([-np.sin(lon), np.cos(lon), np.zeros_like(lon)], axis=-1)
+    north = np.stack([-np.sin(lat) * np.cos(lon), -np.sin(lat) * np.sin(lon),
+                      np.cos(lat)], axis=-1)
+    up = np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon),
+                   np.sin(lat)], axis=-1)
+    return east, north, up
+
+
+def incidence_angle(target, sat, lat, lon):
+    ''' angle (degrees) between the ellipsoid normal at the target and
+    the line of sight to the satellite '''
+    los = _unit(sat - target)
+    return np.degrees(np.arccos(np.clip(
+        _dot(los, ellipsoid_normal(lat, lon)), -1, 1)))
+
+
+def metadata_orbit(meta, kind='hermite'):
+    ''' orbitInterpolator from cached metadata (util.metadata), times in
+    seconds since midnight of the first state vector, and that midnight '''
+    times = [datetime.datetime.fromisoformat(x) for x in meta['orbit']['time']]
+    midnight = times[0].replace(hour=0, minute=0, second=0, microsecond=0)
+    seconds = [(x - midnight).total_seconds() for x in times]
+    return orbitInterpolator(seconds, meta['orbit']['position'],
+                             meta['orbit']['velocity'], kind=kind), midnight
+
+
+def scene_geometry(meta):
+    ''' altitude, mid-scene incidence, corners and centroid from cached
+    metadata, as stored in its geometry entry. Corners are [lat, lon]
+    at zero height with ll, lr, ul, ur depending on the pass direction '''
+    orbit, midnight = metadata_orbit(meta)
+    t0, tm, t1 = [(datetime.datetime.fromisoformat(x) - midnight)
+                  .total_seconds() for x in meta['sensing']]
+    r0, rm, r1 = meta['ranges']
+    # early near, early far, late far, late near, centroid
+    t = np.array([t0, t0, t1, t1, tm])
+    r = np.array([r0, r1, r1, r0, rm])
+    lat, lon, h, target, sat, vel = rdr2geo(orbit, t, r, full=True)
+    points = [[float(a), float(b)] for a, b in zip(lat, lon)]
+    if meta['passDirection'].upper() == 'ASCENDING':
+        ll, lr, ur, ul = points[:4]
+    else:
+        ur, ul, ll, lr = points[:4]
+    altitude = float(ecef_to_llh(sat[4])[2])
+    incidence = float(incidence_angle(target[4], sat[4], lat[4], lon[4]))
+    return dict(altitude=altitude, incidenceMid=incidence, ll=ll, lr=lr,
+                ul=ul, ur=ur, center=points[4])
+
+
+def _edge(orbit, t, r, spacing):
+    ''' points from (t[0], r[0]) towards (t[1], r[1]), end excluded,
+    no more than spacing metres apart on the ground. Ground spacing is
+    not linear in slant range, so the count is refined until it fits '''
+    xyz = rdr2geo(orbit, t, r, full=True)[3]
+    n = max(int(np.ceil(np.linalg.norm(xyz[1] - xyz[0]) / spacing)), 1)
+    while True:
+        f = np.linspace(0, 1, n + 1)
+        te, re = t[0] + f * (t[1] - t[0]), r[0] + f * (r[1] - r[0])
+        lat, lon, _, xyz, _, _ = rdr2geo(orbit, te, re, full=True)
+        step = np.linalg.norm(np.diff(xyz, axis=0), axis=1).max()
+        if step <= spacing:
+            return lat[:-1], lon[:-1]
+        n = int(np.ceil(n * step / spacing)) + 1
+
+
+def footprint(meta, spacing=2000.0):
+    ''' GeoJSON Feature of the scene outline at zero height with points
+    at most spacing metres apart along each edge '''
+    orbit, midnight = metadata_orbit(meta)
+    t0, _, t1 = [(datetime.datetime.fromisoformat(x) - midnight)
+                 .total_seconds() for x in meta['sensing']]
+    r0, _, r1 = meta['ranges']
+    # early edge near to far, far edge early to late, and back
+    edges = [_edge(orbit, ta, ra, spacing) for ta, ra in
+             [((t0, t0), (r0, r1)), ((t0, t1), (r1, r1)),
+              ((t1, t1), (r1, r0)), ((t1, t0), (r0, r0))]]
+    lat = np.concatenate([e[0] for e in edges] + [edges[0][0][:1]])
+    lon = np.concatenate([e[1] for e in edges] + [edges[0][1][:1]])
+    ring = np.column_stack([lon, lat])
+    # counter-clockwise exterior ring (RFC 7946)
+    x, y = ring[:, 0], ring[:, 1]
+    if np.sum(x[:-1] * y[1:] - x[1:] * y[:-1]) < 0:
+        ring = ring[::-1]
+    return dict(type='Feature',
+                geometry=dict(type='Polygon',
+                              coordinates=[np.round(ring, 6).tolist()]),
+                properties=dict(name=meta['name'],
+                                passDirection=meta['passDirection'],
+                                sensingStart=meta['sensing'][0],
+                                sensingStop=meta['sensing'][2],
+                                spacing=spacing))
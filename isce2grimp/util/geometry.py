@@ -0,0 +1,145 @@
+"""
+Per-pixel radar geometry layers in the GrIMP .uw geometry
+
+For every pixel of the multilooked image described by a geodat file the
+target is found with geolocate.rdr2geo on the geodat orbit, on the WGS84
+ellipsoid or, with a DEM, at the DEM height (a few passes of sampling the
+DEM at the current position and solving again). From the target and the
+satellite state the layers are
+
+lat, lon            geodetic position of the target (degrees)
+inc                 incidence angle from the ellipsoid normal (degrees)
+heading             satellite heading at the target, clockwise from north
+losE, losN, losU    unit vector from the target to the satellite (ENU)
+
+Each layer is written to PREFIX.<layer> as big-endian float32 (na, nr),
+like the .uw. Azimuth blocks of nlines lines are computed by a process
+pool, each worker writing its lines straight into the memory mapped
+outputs, so memory is bounded by the block size and full resolution
+frames do not need ISCE's topo/geo2rdr stages.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+from .geodatrxa import geodatrxa
+from .geolocate import _dot, _unit, enu_basis, rdr2geo
+
+LAYERS = ('lat', 'lon', 'inc', 'heading', 'losE', 'losN', 'losU')
+DTYPE = '>f4'
+
+
+@lru_cache(maxsize=4)
+def _open_geodat(geodat):
+    ''' one parsed geodat and orbit interpolator per worker process '''
+    georxa = geodatrxa(file=geodat)
+    georxa.setupInterpState()
+    return georxa
+
+
+@lru_cache(maxsize=4)
+def _open_dem(dem):
+    import rasterio  # only needed with a DEM
+    return rasterio.open(dem)
+
+
+def pixel_times_ranges(georxa, row0=0, row1=None):
+    ''' zero-Doppler times (s since midnight) of lines row0:row1 and slant
+    ranges (m) of the columns of the multilooked image '''
+    row1 = georxa.na if row1 is None else row1
+    t = georxa.t0 + np.arange(row0, row1) * georxa.nla / georxa.prf
+    r = georxa.nearRangem() + np.arange(georxa.nr) * georxa.nlr * georxa.slpRg
+    return t, r
+
+
+def sample_dem(src, lat, lon):
+    ''' bilinear heights of an EPSG:4326 rasterio dataset at lat, lon,
+    0 where the DEM has no data '''
+    from rasterio.windows import Window
+    from scipy.ndimage import map_coordinates
+    z = np.zeros(lat.shape)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    if not valid.any():
+        return z
+    col, row = ~src.transform * (lon[valid], lat[valid])
+    # pixel centres
+    col, row = col - 0.5, row - 0.5
+    c0, r0 = int(np.floor(col.min())) - 1, int(np.floor(row.min())) - 1
+    c1, r1 = int(np.floor(col.max())) + 3, int(np.floor(row.max())) + 3
+    block = src.read(1, window=Window(c0, r0, c1 - c0, r1 - r0),
+                     boundless=True, masked=True)
+    block = block.astype('f8').filled(np.nan)
+    height = map_coordinates(block, [row - r0, col - c0], order=1,
+                             mode='constant', cval=np.nan)
+    z[valid] = np.where(np.isfinite(height), height, 0.0)
+    return z
+
+
+def pixel_geometry(georxa, row0, row1, dem=None, demPasses=3):
+    ''' layers (dict of (row1 - row0, nr) arrays) for lines row0:row1 '''
+    t, r = pixel_times_ranges(georxa, row0, row1)
+    t, r = np.meshgrid(t, r, indexing='ij')
+    lookSide = georxa.lookdir or 'right'
+    lat, lon, _, target, sat, vel = rdr2geo(georxa.orbit, t, r,
+                                            lookSide=lookSide, full=True)
+    if dem is not None:
+        src = _open_dem(dem)
+        for _ in range(demPasses):
+            z = sample_dem(src, lat, lon)
+            lat, lon, _, target, sat, vel = rdr2geo(
+                georxa.orbit, t, r, height=z, lookSide=lookSide, full=True)
+    east, north, up = enu_basis(lat, lon)
+    los = _unit(sat - target)
+    layers = dict(lat=lat, lon=lon)
+    layers['losE'], layers['losN'] = _dot(los, east), _dot(los, north)
+    layers['losU'] = _dot(los, up)
+    layers['inc'] = np.degrees(np.arccos(np.clip(layers['losU'], -1, 1)))
+    layers['heading'] = np.degrees(np.arctan2(_dot(vel, east),
+                                              _dot(vel, north))) % 360
+    return layers
+
+
+def _geometry_block(args):
+    ''' worker: compute lines row0:row1 and write them into the outputs '''
+    geodat, files, row0, row1, dem, demPasses = args
+    georxa = _open_geodat(geodat)
+    layers = pixel_geometry(georxa, row0, row1, dem, demPasses)
+    for name, path in files.items():
+        out = np.memmap(path, dtype=DTYPE, mode='r+',
+                        shape=(georxa.na, georxa.nr))
+        out[row0:row1] = layers[name]
+        out.flush()
+        del out
+    return row0, row1
+
+
+def geometry_layers(geodat, prefix, dem=None, layers=LAYERS, nlines=256,
+                    workers=None, demPasses=3):
+    ''' write PREFIX.<layer> for each layer in the geometry of geodat,
+    heights from dem (any EPSG:4326 raster rasterio reads, e.g. the
+    glo30_to_isce .dem.wgs84.vrt) or the ellipsoid. Returns {layer: file} '''
+    unknown = set(layers) - set(LAYERS)
+    if unknown:
+        raise ValueError(f'geometry_layers: unknown layers {sorted(unknown)}, '
+                         f'choose from {LAYERS}')
+    geodat = os.path.abspath(geodat)
+    dem = os.path.abspath(dem) if dem else None
+    georxa = _open_geodat(geodat)
+    nr, na = georxa.nr, georxa.na
+    files = {name: f'{prefix}.{name}' for name in layers}
+    for path in files.values():
+        with open(path, 'wb') as f:
+            f.truncate(nr * na * np.dtype(DTYPE).itemsize)
+
+    tasks = [(geodat, files, row0, min(row0 + nlines, na), dem, demPasses)
+             for row0 in range(0, na, nlines)]
+    if workers == 1:
+        for task in tasks:
+            _geometry_block(task)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(_geometry_block, tasks):
+                pass
+    return files
@@ -0,0 +1,152 @@
+"""
+Shared reader/writer for the local Sentinel-1 inventory
+
+The inventory is either the GeoPackage written by update_inventory (one
+layer per relative orbit) or, if it exists, a GeoParquet store of the same
+rows partitioned by pathNumber and year:
+
+asf_inventory.parquet/pathNumber=83/year=2019/part-0.parquet
+
+The parquet store is read with column projection and predicate pushdown,
+so a single-path query only touches the files it needs.
+"""
+import os
+import shutil
+import fiona
+import geopandas as gpd
+import pandas as pd
+from pathlib import Path
+
+ROOTDIR = Path(__file__).parent.parent
+INVENTORY = Path(ROOTDIR, 'data', 'asf_inventory.gpkg')
+PARQUET = Path(ROOTDIR, 'data', 'asf_inventory.parquet')
+
+
+def read_inventory(path=None, start=None, end=None, frame=None, orbit=None,
+                   columns=None, gpkg=INVENTORY, store=PARQUET):
+    ''' read scenes for one relative orbit (all if path is None)
+
+    start/end bound startTime (inclusive), frame and orbit may be a number
+    or a list of numbers. Uses the parquet store if present, else the GPKG.
+    '''
+    if Path(store).is_dir():
+        gf = read_parquet(store, path, start, end, frame, orbit, columns)
+    else:
+        if path is None:
+            gf = read_all_layers(gpkg)
+        else:
+            # Layer as integer seems to correctly parse datetimes?...
+            gf = gpd.read_file(gpkg, layer=str(path))
+        gf = filter_inventory(gf, start, end, frame, orbit)
+        if columns is not None:
+            gf = gf[columns]
+
+    return gf
+
+
+def filter_inventory(gf, start=None, end=None, frame=None, orbit=None):
+    ''' same selection as the parquet filters for an in-memory dataframe '''
+    if start is not None:
+        gf = gf[gf.startTime >= pd.Timestamp(start)]
+    if end is not None:
+        gf = gf[gf.startTime <= pd.Timestamp(end)]
+    if frame is not None:
+        gf = gf[gf.frameNumber.isin(_as_list(frame))]
+    if orbit is not None:
+        gf = gf[gf.orbit.isin(_as_list(orbit))]
+
+    return gf
+
+
+def read_parquet(store, path=None, start=None, end=None, frame=None,
+                 orbit=None, columns=None):
+    ''' read GeoParquet store with partition pruning and row filters '''
+    filters = []
+    source = Path(store)
+    if path is not None:
+        source = Path(store, f'pathNumber={path}')
+        if not source.is_dir():
+            raise ValueError(f'relative orbit {path} not in {store}')
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters += [('year', '>=', start.year),
+                    ('startTime', '>=', start.to_pydatetime())]
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters += [('year', '<=', end.year),
+                    ('startTime', '<=', end.to_pydatetime())]
+    if frame is not None:
+        filters.append(('frameNumber', 'in', _as_list(frame)))
+    if orbit is not None:
+        filters.append(('orbit', 'in', _as_list(orbit)))
+
+    kwargs = dict(filters=filters or None)
+    if columns is not None:
+        # partition keys are not columns in the files
+        kwargs['columns'] = [c for c in columns
+                             if c not in ('pathNumber', 'year')]
+    if columns is None or 'geometry' in columns:
+        gf = gpd.read_parquet(source, **kwargs)
+    else:
+        gf = pd.read_parquet(source, **kwargs)
+
+    if 'pathNumber' in gf.columns:
+        gf['pathNumber'] = gf.pathNumber.astype('int')
+    elif path is not None and (columns is None or 'pathNumber' in columns):
+        gf['pathNumber'] = int(path)
+    gf = gf.drop(columns='year', errors='ignore')
+    if 'startTime' in gf.columns:
+        gf = gf.sort_values('startTime')
+    gf = gf.reset_index(drop=True)
+    if columns is not None:
+        gf = gf[columns]
+
+    return gf
+
+
+def read_all_layers(path):
+    ''' read geopackage file with multiple layers into single dataframe'''
+    layers = fiona.listlayers(path)
+    gfs = [gpd.read_file(path, layer=layer) for layer in layers]
+    gf = pd.concat(gfs, ignore_index=True)
+
+    return gf
+
+
+def write_parquet(gf, store=PARQUET):
+    ''' add scenes to the parquet store, rewriting only the partitions
+    (pathNumber, year) they fall in. Existing rows are kept, duplicates
+    (same sceneName) replaced, and each partition sorted by startTime '''
+    years = gf.startTime.dt.year
+    for (relOrb, year), subset in gf.groupby([gf.pathNumber, years]):
+        partition = Path(store, f'pathNumber={relOrb}', f'year={year}')
+        outfile = Path(partition, 'part-0.parquet')
+        subset = subset.drop(columns='pathNumber')
+        if outfile.exists():
+            old = gpd.read_parquet(outfile)
+            subset = pd.concat([old, subset], ignore_index=True)
+            subset = subset.drop_duplicates('sceneName', keep='last')
+        subset = subset.sort_values('startTime').reset_index(drop=True)
+        os.makedirs(partition, exist_ok=True)
+        # dot files are skipped by readers until the rename
+        tmpfile = Path(partition, '.part-0.parquet.tmp')
+        subset.to_parquet(tmpfile)
+        os.replace(tmpfile, outfile)
+
+
+def gpkg_to_parquet(gpkg=INVENTORY, store=PARQUET, overwrite=False):
+    ''' convert layered GPKG inventory into a partitioned parquet store '''
+    if Path(store).exists():
+        if not overwrite:
+            raise FileExistsError(f'{store} exists, use overwrite=True')
+        shutil.rmtree(store)
+    for layer in fiona.listlayers(gpkg):
+        gf = gpd.read_file(gpkg, layer=layer)
+        print(f'converting relative orbit {layer}: {len(gf)} scenes')
+        write_parquet(gf, store)
+
+
+def _as_list(value):
+    if isinstance(value, (list, tuple, set)) or hasattr(value, 'tolist'):
+        return [int(x) for x in value]
+    return [int(value)]
@@ -0,0 +1,119 @@
+"""
+Read sensor metadata from isce.log without a grep subprocess
+
+topsApp.py writes the reference and secondary sensor catalogs to
+isce.log as lines such as
+
+2019-05-02 20:31:58,468 - isce.insar - INFO - reference.sensor.ascendingnodetime = 2019-04-14 08:01:23.123456
+
+(restarted runs repeat them). The log is memory mapped, candidate lines
+are found with a substring search and parsed with a regular expression,
+keeping the first value of every reference/secondary sensor field. The
+scan stops at the end of the catalog block in which the last required
+field appears, so the rest of a long ionosphere run's log is never read. Required fields the log does
+not have are looked up in the product XMLs (referencedir/IW*.xml etc.).
+"""
+import datetime
+import glob
+import mmap
+import os
+import re
+import xml.etree.ElementTree as ET
+
+SENSOR_LINE = re.compile(
+    rb'\b(reference|secondary)\.sensor\.([\w.]+)[ \t]*=[ \t]*([^\r\n]*)')
+REQUIRED = ('reference.sensor.ascendingnodetime',)
+# product XMLs with the same fields, per role, relative to the intdir
+PRODUCTS = {'reference': ['referencedir/IW*.xml', 'fine_coreg/IW*.xml'],
+            'secondary': ['secondarydir/IW*.xml']}
+TIME_FORMATS = ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S',
+                '%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S')
+
+
+def scan_log(logFile, required=REQUIRED):
+    ''' {role.sensor.field: value} of the first occurrence of each sensor
+    field, stopping after the catalog block that completes required '''
+    fields = {}
+    if not os.path.isfile(logFile) or os.path.getsize(logFile) == 0:
+        return fields
+    todo = set(required)
+    with open(logFile, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = 0
+        while pos < len(mm):
+            if todo:
+                # substring search is much faster than the regex
+                found = mm.find(b'.sensor.', pos)
+                if found == -1:
+                    break
+                start = mm.rfind(b'\n', 0, found) + 1
+            else:
+                # only the lines right after the block that completed
+                # required, the first other line ends the scan
+                start = pos
+            stop = mm.find(b'\n', start)
+            stop = len(mm) if stop == -1 else stop
+            match = SENSOR_LINE.search(mm, start, stop)
+            if match:
+                key = f'{match[1].decode()}.sensor.{match[2].decode().lower()}'
+                if key not in fields:
+                    fields[key] = match[3].decode(errors='replace').strip()
+                    todo.discard(key)
+            elif not todo:
+                break
+            pos = stop + 1
+    return fields
+
+
+def scan_products(intdir, keys):
+    ''' values of role.sensor.field keys from the first product XML of
+    each role that has the field '''
+    fields = {}
+    for key in keys:
+        role, _, name = key.split('.', 2)
+        for pattern in PRODUCTS.get(role, []):
+            for xmlFile in sorted(glob.glob(os.path.join(intdir, pattern))):
+                value = product_property(xmlFile, name)
+                if value is not None:
+                    fields[key] = value
+                    break
+            if key in fields:
+                break
+    return fields
+
+
+def product_property(xmlFile, name):
+    ''' first <property name="name"><value> in an ISCE product XML '''
+    for _, element in ET.iterparse(xmlFile):
+        if element.tag == 'property' and \
+                element.get('name', '').lower() == name:
+            value = element.find('value')
+            if value is not None and value.text:
+                return value.text.strip()
+    return None
+
+
+def read_sensor_metadata(intdir, required=REQUIRED, logName='isce.log'):
+    ''' sensor fields from intdir/isce.log, with required fields missing
+    from the log read from the product XMLs. Raises ValueError naming
+    the fields found in neither '''
+    logFile = os.path.join(intdir, logName)
+    fields = scan_log(logFile, required)
+    missing = [key for key in required if key not in fields]
+    if missing:
+        fields.update(scan_products(intdir, missing))
+    missing = [key for key in required if key not in fields]
+    if missing:
+        raise ValueError(f'{", ".join(missing)} not in {logFile} or the '
+                         f'product XMLs in {intdir}')
+    return fields
+
+
+def parse_time(value):
+    ''' ISCE catalog time string as a datetime '''
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f'unrecognized time {value!r}')
@@ -0,0 +1,253 @@
+"""
+Conversion metadata cached in the interferogram directory
+
+Configuring topsApp, loading the fine_coreg IW*.xml products and merging
+their orbits is the slow part of convert_isce. The first conversion saves what it extracted to INTDIR/isce2grimp.metadata.json:
+
+- looks, reference SAFE name and the merged image size
+- per swath: sensing start/stop, starting/far range, pixel sizes, pass
+  direction and the burst start/stop times
+- the merged orbit state vectors (time, position, velocity)
+- the derived sensing times, ranges, ascending node time, frame numbers,
+  altitude, mid incidence and corner coordinates
+
+Later conversions (and anything that needs the geodat file or the
+acquisition geometry) read the cache and never import ISCE. The cache is
+ignored when it has another version or when topsApp.xml, a fine_coreg
+product or the merged .unw header is newer than it.
+"""
+import datetime
+import glob
+import json
+import os
+
+from .geolocate import scene_geometry
+
+METADATA = 'isce2grimp.metadata.json'
+VERSION = 2
+# products the cache is extracted from, relative to the intdir
+SOURCES = ['topsApp.xml', 'fine_coreg/IW*.xml', 'merged/filt_topophase.unw.xml']
+
+# Hard coded values for Sentinel-1 IW Mode
+# -----------------
+SENTINEL1 = {}
+SENTINEL1['look_direction'] = 'right'
+SENTINEL1['wavelength'] = 0.05546576
+SENTINEL1['range_posting'] = 2.329562
+SENTINEL1['az_posting'] = 13.894780
+SENTINEL1['sv_dt'] = 10.0
+SENTINEL1['ReMajor'] = 6378.1370
+SENTINEL1['ReMinor'] = 6356.7520
+# ----------------
+
+
+def isoformat(time):
+    return time.isoformat(timespec='microseconds')
+
+
+def parse_iso(value):
+    return datetime.datetime.fromisoformat(value)
+
+
+def swath_metadata(frame):
+    ''' what conversion needs from an ISCE TOPSSwathSLCProduct '''
+    burst = frame.bursts[0]
+    return dict(
+        sensingStart=isoformat(frame.sensingStart),
+        sensingStop=isoformat(frame.sensingStop),
+        startingRange=frame.startingRange, farRange=frame.farRange,
+        rangePixelSize=burst.rangePixelSize,
+        azimuthTimeInterval=burst.azimuthTimeInterval,
+        passDirection=burst.passDirection,
+        bursts=[[isoformat(b.sensingStart), isoformat(b.sensingStop)]
+                for b in frame.bursts])
+
+
+def orbit_metadata(orbit):
+    ''' state vectors of an ISCE Orbit '''
+    vectors = orbit._stateVectors
+    return dict(time=[isoformat(sv.getTime()) for sv in vectors],
+                position=[list(sv.getPosition()) for sv in vectors],
+                velocity=[list(sv.getVelocity()) for sv in vectors])
+
+
+def metadata_file(intdir):
+    return os.path.join(intdir, METADATA)
+
+
+def save_metadata(meta, intdir):
+    ''' write the cache atomically '''
+    meta = dict(meta, version=VERSION)
+    path = metadata_file(intdir)
+    tmpfile = f'{path}.tmp'
+    with open(tmpfile, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmpfile, path)
+    return path
+
+
+def load_metadata(intdir):
+    ''' cached metadata, None if missing or out of date '''
+    path = metadata_file(intdir)
+    if not os.path.isfile(path):
+        return None
+    mtime = os.path.getmtime(path)
+    for pattern in SOURCES:
+        for source in glob.glob(os.path.join(intdir, pattern)):
+            if os.path.getmtime(source) > mtime:
+                return None
+    with open(path) as f:
+        meta = json.load(f)
+    if meta.get('version') != VERSION:
+        return None
+    return meta
+
+
+def seconds_since_midnight(time):
+    return (time.hour * 3600 + time.minute * 60 + time.second
+            + time.microsecond / 1e6)
+
+
+def statevecs(meta):
+    ''' number of vectors, first vector time (s since midnight) and the
+    geodat state vector lines of the merged orbit '''
+    orbit = meta['orbit']
+    lines = []
+    for position, velocity in zip(orbit['position'], orbit['velocity']):
+        lines.append('{0:.6E} {1:.6E} {2:.6E}'.format(*position))
+        lines.append('{0:.6E} {1:.6E} {2:.6E}'.format(*velocity))
+    svt0 = seconds_since_midnight(parse_iso(orbit['time'][0]))
+    return len(orbit['time']), svt0, '\n'.join(lines)
+
+
+def geodat_params(meta):
+    ''' write_geodat_config parameters from cached metadata '''
+    rlooks, alooks = meta['rlooks'], meta['alooks']
+    sensingStart = parse_iso(meta['sensing'][0])
+    rangeFirstSample, rangeMid, rangeFar = meta['ranges']
+    geometry = meta['geometry']
+    nvecs, svt0, stateVecs = statevecs(meta)
+    # a copy, one process may convert many directories
+    params = dict(SENTINEL1)
+    params['prf'] = meta['prf']
+    params['name'] = meta['name']
+    params['date'] = sensingStart.strftime('%-d %b %Y').upper()
+    params['time'] = sensingStart.strftime('%-H %-M %-S.%f')
+    params['ranges'] = f'{rangeFirstSample:.6f} {rangeMid:.6f} {rangeFar:.6f}'
+    params['rangeMid_km'] = f'{rangeMid/1e3:.6f}'
+    params['rlooks'] = rlooks
+    params['alooks'] = alooks
+    params['width'] = meta['width']
+    params['length'] = meta['length']
+    params['shape'] = f'{meta["width"]} {meta["length"]}'
+    params['rangePixelSpacing'] = params['range_posting'] * rlooks
+    params['azimuthPixelSpacing'] = params['az_posting'] * alooks
+    params['altitude'] = geometry['altitude']
+    params['altitude_km'] = f'{geometry["altitude"]/1e3:.6f}'
+    params['incidenceMid'] = f'{geometry["incidenceMid"]:.6f}'
+    params['passDir'] = meta['passDirection'].lower()
+    params['svt0'] = svt0
+    params['nvecs'] = nvecs
+    params['stateVecs'] = stateVecs
+    for corner in ['ll', 'lr', 'ul', 'ur', 'center']:
+        params[corner] = '{0:.6f} {1:.6f}'.format(*geometry[corner])
+
+    return params
+
+
+def multilook_metadata(meta, rfactor, afactor):
+    ''' metadata of the image averaged over rfactor x afactor pixels with
+    partial looks dropped, as convertuw writes it. The first look is centred
+    on its first (afactor-1)/2 line and (rfactor-1)/2 pixel '''
+    rlooks, alooks = meta['rlooks'], meta['alooks']
+    width, length = meta['width'] // rfactor, meta['length'] // afactor
+    dt = alooks / meta['prf']
+    start = parse_iso(meta['sensing'][0]) + datetime.timedelta(
+        seconds=(afactor - 1) / 2 * dt)
+    stop = start + datetime.timedelta(seconds=(length - 1) * afactor * dt)
+    dr = SENTINEL1['range_posting'] * rlooks
+    # first pixel as geodatrxa places it, from the centre range and width
+    near = meta['ranges'][1] - (meta['width'] - 1) / 2 * dr \
+        + (rfactor - 1) / 2 * dr
+    far = near + (width - 1) * rfactor * dr
+    meta = dict(meta, rlooks=rlooks * rfactor, alooks=alooks * afactor,
+                width=width, length=length,
+                sensing=[isoformat(x) for x in
+                         (start, start + (stop - start) / 2, stop)],
+                ranges=[near, (near + far) / 2, far])
+    meta['geometry'] = scene_geometry(meta)
+    return meta
+
+
+def write_geodat_config(params, outdir):
+    ''' write output geodat.in file for GrIMP processing '''
+    output = '''; Image name: {name}
+; Image date: {date}
+; Image time: {time}
+; Nominal center lat,lon: 0.000000 0.000000
+; track direction: 0.000000
+; S/C altitude: {altitude}
+; Average height above terrain: 0.000000
+; Vel along track: 0.000000
+; PRF :   {prf}
+; near/cen/far range : {ranges}
+; Range pixel spacing :   {rangePixelSpacing}
+; Number of looks (rg,az) :   {rlooks} {alooks}
+; Azimuth pixel spacing :   {azimuthPixelSpacing}
+; Number of pixels (rg,az) :  {shape}
+; Number of state vectors :   {nvecs}
+; Start time of state vectors :   {svt0}
+; Interval between 2 state vectors :   {sv_dt}
+; Look direction  :   1.000000
+; Offset of first recordin complex image (s) : 0.000000
+; Skew offset (s), squint (deg) : 0.000000  0.000000
+;
+; {passDir} Pass
+;
+; rangesize,azimuthsize,nrangelooks,nazimuthlooks
+;
+{width}  {length}  {rlooks}  {alooks}
+;
+; ReMajor, ReMinor, Rc, phic, h
+;
+{ReMajor}    {ReMinor}   {rangeMid_km}  {incidenceMid}   {altitude_km}
+;
+; ll,lr,ul,ur,center
+;
+{ll}
+{lr}
+{ul}
+{ur}
+{center}
+;
+; Range/azimuth single look pixel sizes
+;
+{range_posting}  {az_posting}
+;
+{passDir}
+;
+; Look direction
+;
+right
+;
+; Flag to indicate state vectors and associated data
+;
+state
+; time after squint and skew corrections
+{time}
+; prf
+{prf}
+; wavelength
+{wavelength}
+; number of state vectors
+{nvecs}
+; time of first vector
+{svt0}
+; state vector interval
+{sv_dt}
+; state vectors
+{stateVecs}
+'''.format(**params)
+    outpath = f"{outdir}/geodat{params['rlooks']}x{params['alooks']}.in"
+    with open(outpath, 'w') as f:
+        f.write(output)
@@ -0,0 +1,90 @@
+"""
+Coarser look levels of the unwrapped phase, made while it is streamed
+
+convertuw passes every block of the .uw to one lookAverager per level,
+which keeps the lines that do not yet fill a look for the next block and
+writes weighted means of rfactor x afactor pixels into a memory mapped
+big-endian output. Weights are zero for connected component 0 and the
+coherence elsewhere (one without a coherence file), looks without any
+weight are NODATA, and partial looks at the far range and at the end of
+the image are dropped, as ISCE's looks.py does.
+"""
+import re
+
+import numpy as np
+
+from .readImage import mmapImage, releasePages
+
+
+def parse_looks(value):
+    ''' (rfactor, afactor) from 'RxA', or 'N' for N x N '''
+    match = re.fullmatch(r'(\d+)(?:x(\d+))?', value.strip())
+    if not match:
+        raise ValueError(f'looks must be RxA or N, not {value!r}')
+    rfactor = int(match[1])
+    afactor = int(match[2]) if match[2] else rfactor
+    if rfactor < 1 or afactor < 1:
+        raise ValueError(f'looks must be at least 1, not {value!r}')
+    return rfactor, afactor
+
+
+class lookAverager:
+
+    """ Weighted rfactor x afactor averages of a stream of row blocks
+    written to a nr // rfactor by na // afactor memory mapped image.
+    """
+
+    def __init__(self, fileName, nr, na, rfactor, afactor, nodata,
+                 dataType='>f4'):
+        self.fileName = fileName
+        self.rfactor, self.afactor = rfactor, afactor
+        self.nr, self.na = nr // rfactor, na // afactor
+        self.nodata = nodata
+        self.out = mmapImage(fileName, self.nr, self.na, dataType, mode='w+')
+        self.line = 0
+        # lines of the last block that do not fill a look yet
+        self.pending = None
+
+    def add(self, data, weight):
+        ''' data and weight blocks (lines, nr), in image order '''
+        if self.pending is not None and len(self.pending[0]):
+            data = np.vstack([self.pending[0], data])
+            weight = np.vstack([self.pending[1], weight])
+        lines = min(data.shape[0] // self.afactor, self.na - self.line)
+        n, cols = lines * self.afactor, self.nr * self.rfactor
+        # copies, the caller may reuse its block
+        self.pending = (data[n:].copy(), weight[n:].copy())
+        if lines == 0:
+            return
+        w = weight[:n, :cols]
+        wdata = w * data[:n, :cols]
+        wdata[w == 0] = 0
+        wsum, dsum = self._sum(w), self._sum(wdata)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.out[self.line:self.line + lines] = np.where(
+                wsum > 0, dsum / wsum, self.nodata)
+        # written lines are not needed again, as in writeImageBlocks
+        self.out.flush()
+        lineBytes = self.nr * self.out.itemsize
+        releasePages(self.out._mmap, self.line * lineBytes,
+                     (self.line + lines) * lineBytes)
+        self.line += lines
+
+    def _sum(self, x):
+        ''' sums over looks. Adding whole lines then strided columns is
+        much faster than sum() over the short look axes '''
+        x = x.reshape(-1, self.afactor, x.shape[1])
+        lines = x[:, 0].astype('f8')
+        for i in range(1, self.afactor):
+            lines += x[:, i]
+        total = lines[:, 0::self.rfactor].copy()
+        for i in range(1, self.rfactor):
+            total += lines[:, i::self.rfactor]
+        return total
+
+    def close(self):
+        self.out.flush()
+        del self.out
+        if self.line != self.na:
+            raise ValueError(f'{self.fileName}: got {self.line} of '
+                             f'{self.na} lines')
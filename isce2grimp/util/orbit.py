@@ -0,0 +1,48 @@
+"""
+Orbit state vector interpolation
+"""
+import numpy as np
+from scipy.interpolate import CubicHermiteSpline, CubicSpline
+
+
+class orbitInterpolator:
+
+    """ Interpolate orbit position and velocity together.
+
+    State vectors are held as one contiguous (n, 6) array of x, y, z,
+    vx, vy, vz and fit with a single vector-valued spline, so position and
+    velocity come from one evaluation. kind='hermite' (default, as ISCE
+    does) uses the velocities as the position derivatives, with
+    accelerations estimated from the velocities; kind='cubic' is a
+    not-a-knot cubic spline through all six components. Times outside the
+    state vectors return nan. """
+
+    def __init__(self, times, position, velocity, kind='hermite'):
+        self.times = np.ascontiguousarray(times, dtype='f8')
+        self.state = np.ascontiguousarray(
+            np.hstack([np.asarray(position, dtype='f8'),
+                       np.asarray(velocity, dtype='f8')]))
+        self.kind = kind
+        if kind == 'hermite':
+            acceleration = np.gradient(self.state[:, 3:], self.times,
+                                       axis=0, edge_order=2)
+            derivative = np.hstack([self.state[:, 3:], acceleration])
+            self.spline = CubicHermiteSpline(self.times, self.state,
+                                             derivative, extrapolate=False)
+        elif kind == 'cubic':
+            self.spline = CubicSpline(self.times, self.state,
+                                      extrapolate=False)
+        else:
+            raise ValueError(f"orbitInterpolator: kind must be 'hermite' or "
+                             f"'cubic', not {kind}")
+
+    def __call__(self, t):
+        ''' return position, velocity, each shaped t.shape + (3,) '''
+        state = self.spline(t)
+        return state[..., :3], state[..., 3:]
+
+    def position(self, t):
+        return self(t)[0]
+
+    def velocity(self, t):
+        return self(t)[1]
@@ -0,0 +1,56 @@
+"""
+Frame overlap search over a whole relative orbit
+
+Consecutive acquisitions of the same ASF frame number are not framed
+identically, so pairs are built from any scene that covers enough of the
+reference footprint. overlapIndex builds one STRtree over every footprint
+in a path layer; each query only intersects the candidates whose bounding
+boxes hit the reference, with shapely 2 vectorized intersection/area.
+"""
+import numpy as np
+import pandas as pd
+import shapely
+
+
+class overlapIndex:
+
+    """ Spatial (STRtree) and temporal (startTime) index of scene footprints.
+
+    Build once per path layer and reuse for every reference footprint. """
+
+    def __init__(self, gf):
+        self.gf = gf
+        self.geometry = np.asarray(gf.geometry.values, dtype=object)
+        self.tree = shapely.STRtree(self.geometry)
+        self.times = np.asarray(gf.startTime.values, dtype='datetime64[ns]')
+
+    def __len__(self):
+        return len(self.geometry)
+
+    def candidates(self, ref, start=None, end=None):
+        ''' positions of scenes intersecting ref with start <= startTime
+        <= end '''
+        idx = self.tree.query(ref, predicate='intersects')
+        if start is not None:
+            idx = idx[self.times[idx] >= np.datetime64(pd.Timestamp(start))]
+        if end is not None:
+            idx = idx[self.times[idx] <= np.datetime64(pd.Timestamp(end))]
+        return np.sort(idx)
+
+    def fractions(self, ref, start=None, end=None):
+        ''' fraction of ref covered by each scene (0 outside the time range
+        or footprint), as a Series aligned with the indexed dataframe '''
+        fraction = np.zeros(len(self))
+        idx = self.candidates(ref, start, end)
+        if len(idx) > 0:
+            area = shapely.area(shapely.intersection(self.geometry[idx], ref))
+            fraction[idx] = area / ref.area
+        return pd.Series(fraction, index=self.gf.index, name='overlap')
+
+    def select(self, ref, minOverlap=0.1, start=None, end=None):
+        ''' scenes covering at least minOverlap of ref, with an overlap
+        column '''
+        overlap = self.fractions(ref, start, end)
+        gf = self.gf.loc[overlap >= minOverlap].copy()
+        gf['overlap'] = overlap[overlap >= minOverlap]
+        return gf
@@ -0,0 +1,208 @@
+"""
+Pipelined SLC download and topsApp processing
+
+Instead of downloading every SLC before running topsApp.py, downloads run
+in their own thread pool and prefetch the scenes of the next K queued
+interferograms while earlier ones process. Scenes shared between pairs
+(e.g. ../tmp-data-PATH/*.zip from prep_stack) are fetched once. A failed
+download is retried with backoff and only holds back the pairs that need
+it; processing runs on the jobQueue scheduler.
+"""
+import ast
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .download import downloader
+from .scheduler import jobQueue
+
+
+def read_links(linkFile):
+    ''' {basename: url} from a download-links.txt '''
+    if not Path(linkFile).is_file():
+        return {}
+    with open(linkFile) as f:
+        urls = [line.strip() for line in f if line.strip()]
+    return {os.path.basename(url): url for url in urls}
+
+
+def required_scenes(intdir):
+    ''' [(url, local path)] for the reference and secondary SAFE zips in
+    intdir/topsApp.xml, urls from download-links.txt next to the zips or
+    in intdir '''
+    root = ET.parse(Path(intdir, 'topsApp.xml')).getroot()
+    paths = []
+    for prop in root.iter('property'):
+        if prop.get('name') != 'safe':
+            continue
+        value = prop.text.strip()
+        safe = ast.literal_eval(value) if value.startswith('[') else [value]
+        paths += [Path(os.path.normpath(Path(intdir, x))) for x in safe]
+
+    links = {}
+    scenes = []
+    for path in paths:
+        for linkFile in [Path(path.parent, 'download-links.txt'),
+                         Path(intdir, 'download-links.txt')]:
+            if linkFile not in links:
+                links[linkFile] = read_links(linkFile)
+            if path.name in links[linkFile]:
+                # downloads go to the target of SLC cache links
+                scenes.append((links[linkFile][path.name],
+                               str(path.resolve())))
+                break
+        else:
+            raise ValueError(f'{intdir}: no download link for {path.name}')
+    return scenes
+
+
+class downloadStage:
+
+    """ Thread pool of downloads, one per local file however many pairs
+    need it. fetch(url, dest, size, md5) returns the bytes it transferred,
+    by default a native downloader with workers files in flight. """
+
+    def __init__(self, fetch=None, workers=4, retries=3, backoff=5.0):
+        self.fetch = fetch or downloader(workers=workers).fetch
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.retries = retries
+        self.backoff = backoff
+        self.futures = {}
+        self.bytes = 0
+        self.seconds = 0.0
+        self.counted = set()
+
+    def submit(self, url, dest, size=None, md5=None):
+        if dest not in self.futures:
+            self.futures[dest] = self.pool.submit(self._fetch, url, dest,
+                                                  size, md5)
+        return self.futures[dest]
+
+    def _fetch(self, url, dest, size, md5):
+        for attempt in range(self.retries + 1):
+            t0 = time.perf_counter()
+            try:
+                nbytes = self.fetch(url, dest, size, md5)
+                return nbytes, time.perf_counter() - t0
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                wait = self.backoff * 2**attempt
+                print(f'download {url} failed ({e}), retry in {wait:.0f} s')
+                time.sleep(wait)
+
+    def pending(self):
+        return sum(not f.done() for f in self.futures.values())
+
+    def collect(self):
+        ''' add finished downloads to the byte and time totals '''
+        for dest, future in self.futures.items():
+            if dest in self.counted or not future.done():
+                continue
+            self.counted.add(dest)
+            if future.exception() is None:
+                nbytes, seconds = future.result()
+                self.bytes += nbytes
+                self.seconds += seconds
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+class pipelineQueue(jobQueue):
+
+    """ jobQueue whose jobs start once their SLCs are downloaded.
+
+    Downloads are submitted for at most prefetch queued interferograms
+    beyond the ones running; a pair whose download fails after retries is
+    marked failed without holding up the rest. Downloads are checked
+    against expected(dest) -> (bytes, md5sum). Throughput (bytes/s),
+    queue depths and idle CPU-seconds are kept in stats. """
+
+    def __init__(self, directories, command, prefetch=2, fetch=None,
+                 downloadWorkers=4, downloadRetries=3, backoff=5.0,
+                 statsFile=None, expected=None, **kwargs):
+        super().__init__(directories, command, **kwargs)
+        self.prefetch = prefetch
+        self.downloads = downloadStage(fetch, workers=downloadWorkers,
+                                       retries=downloadRetries,
+                                       backoff=backoff)
+        self.scenes = {}
+        self.statsFile = statsFile
+        # dest -> (bytes, md5sum) to verify downloads against
+        self.expected = expected or (lambda dest: (None, None))
+        self.stats.update(downloadBytes=0, downloadSeconds=0.0,
+                          samples=[])
+
+    def schedule(self, queue):
+        self.downloads.collect()
+        # downloads in flight or waiting for a processing slot
+        prefetched = [x for x in queue if x in self.scenes]
+        for intdir in list(queue):
+            if len(prefetched) >= self.prefetch:
+                break
+            if intdir in self.scenes:
+                continue
+            try:
+                scenes = required_scenes(intdir)
+            except (OSError, ValueError, SyntaxError) as e:
+                self.fail(queue, intdir, e)
+                continue
+            self.scenes[intdir] = [
+                self.downloads.submit(url, dest, *self.expected(dest))
+                for url, dest in scenes]
+            prefetched.append(intdir)
+        for intdir in prefetched:
+            failed = [f for f in self.scenes[intdir]
+                      if f.done() and f.exception() is not None]
+            if failed:
+                self.fail(queue, intdir, failed[0].exception())
+
+    def fail(self, queue, intdir, error):
+        print(f'{intdir} failed before processing: {error}')
+        queue.remove(intdir)
+        self.scenes.pop(intdir, None)
+        self.state[intdir] = dict(status='failed', error=str(error))
+        self.save()
+
+    def ready(self, intdir):
+        return intdir in self.scenes and all(
+            f.done() and f.exception() is None for f in self.scenes[intdir])
+
+    def sample(self, dt):
+        super().sample(dt)
+        waiting = [x for x in self.scenes if self.state[x]['status'] == 'queued']
+        self.stats['samples'].append(dict(
+            time=time.time(), downloads=self.downloads.pending(),
+            ready=sum(self.ready(x) for x in waiting),
+            running=len(self.running)))
+
+    def run(self):
+        t0 = time.perf_counter()
+        try:
+            state = super().run()
+        finally:
+            self.downloads.shutdown()
+        self.downloads.collect()
+        self.stats.update(downloadBytes=self.downloads.bytes,
+                          downloadSeconds=self.downloads.seconds,
+                          wallSeconds=time.perf_counter() - t0)
+        self.report()
+        return state
+
+    def report(self):
+        stats = self.stats
+        rate = stats['downloadBytes'] / max(stats['wallSeconds'], 1e-9)
+        samples = stats['samples']
+        depth = max((x['downloads'] for x in samples), default=0)
+        total = stats['unallocatedCpuSeconds'] + stats['allocatedCpuSeconds']
+        print(f'downloaded {stats["downloadBytes"]/1e9:.2f} GB at '
+              f'{rate/1e6:.1f} MB/s, max download queue {depth}, '
+              f'no job on CPUs for {stats["unallocatedCpuSeconds"]:.0f} of '
+              f'{total:.0f} CPU-seconds')
+        if self.statsFile is not None:
+            with open(self.statsFile, 'w') as f:
+                json.dump(stats, f, indent=1)
@@ -0,0 +1,201 @@
+"""
+Plan many prep_stack style stacks from a single inventory load
+
+A job is a dictionary with the prep_stack options:
+
+path: relative orbit (required)
+frame: ASF frame (required)
+reference: reference absolute orbit, or
+start: reference start date (nearest acquisition is used)
+end: reference end date (optional)
+npairs: number of sequential pairs (default 10)
+jump: acquisitions to skip between pairs (default 0)
+match_frame: use exact frame number match (default False)
+template: YAML template (default data/template.yml)
+
+plan_jobs returns one row per pair with the reference and secondary scene
+urls, write_plan writes every topsApp.xml and one deduplicated
+download-links.txt per relative orbit.
+"""
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from . import dinosar
+from .inventory import INVENTORY, PARQUET, read_inventory
+from .overlap import overlapIndex
+
+ROOTDIR = Path(__file__).parent.parent
+TEMPLATE = os.path.join(ROOTDIR, 'data', 'template.yml')
+JOB_DEFAULTS = dict(reference=None, start=None, end=None, npairs=10, jump=0,
+                    match_frame=False, template=TEMPLATE)
+MIN_OVERLAP = 0.1
+
+
+def read_jobs(config):
+    ''' jobs from a YAML config, top level keys other than 'jobs' are
+    defaults for every job '''
+    config = dinosar.read_yaml_template(config)
+    defaults = {k: v for k, v in config.items() if k != 'jobs'}
+    return [{**defaults, **job} for job in config['jobs']]
+
+
+def load_inventory(jobs, gpkg=INVENTORY, store=PARQUET):
+    ''' read every scene the jobs can use at once, split by relative orbit '''
+    jobs = [{**JOB_DEFAULTS, **job} for job in jobs]
+    starts = [job['start'] for job in jobs]
+    ends = [job['end'] for job in jobs]
+    # a job given by reference orbit can start anywhere
+    start = None if None in starts else min(pd.Timestamp(x) for x in starts)
+    end = None if None in ends else max(pd.Timestamp(x) for x in ends)
+    # one read per relative orbit, so other paths' layers and partitions
+    # are never loaded
+    layers = {}
+    for path in sorted({int(job['path']) for job in jobs}):
+        gf = read_inventory(path, start=start, end=end, gpkg=gpkg,
+                            store=store)
+        if len(gf) > 0:
+            layers[path] = gf.sort_values('startTime').reset_index(drop=True)
+    return layers
+
+
+def plan_jobs(jobs, layers):
+    ''' pairs for every job as a dataframe, duplicate pairs dropped '''
+    indexes = {}
+    plans = []
+    for job in jobs:
+        job = {**JOB_DEFAULTS, **job}
+        path = int(job['path'])
+        if path not in layers:
+            raise ValueError(f'relative orbit {path} not in inventory')
+        if path not in indexes:
+            # one spatial index per path layer, shared by its jobs
+            indexes[path] = overlapIndex(layers[path])
+        plans.append(plan_job(job, layers[path], indexes[path]))
+    plan = pd.concat(plans, ignore_index=True)
+
+    return plan.drop_duplicates('intdir').reset_index(drop=True)
+
+
+def plan_job(job, gf, index):
+    ''' prep_stack selection of sequential pairs for one job '''
+    path, frame = int(job['path']), int(job['frame'])
+    start, end = job['start'], job['end']
+    crop = np.ones(len(gf), dtype=bool)
+    if start is not None:
+        crop &= (gf.startTime >= pd.Timestamp(start)).values
+    elif job['reference'] is not None:
+        refStart = gf.startTime[gf.orbit == job['reference']].min()
+        crop &= (gf.startTime >= refStart).values
+    if end is not None:
+        crop &= (gf.stopTime <= pd.Timestamp(end)).values
+
+    gfREF = gf[crop & (gf.frameNumber == frame).values]
+    if len(gfREF) == 0:
+        raise ValueError(f'reference frame {frame} not in inventory for '
+                         f'relative orbit {path}')
+    if job['reference'] is not None:
+        if job['reference'] not in gfREF.orbit.values:
+            raise ValueError(f'reference orbit {job["reference"]} not in '
+                             f'inventory: {gfREF.orbit.unique()}')
+        refInd = gfREF.index[gfREF.orbit == job['reference']][0]
+    elif start is not None:
+        times = pd.DatetimeIndex(gfREF.startTime)
+        nearest = times.get_indexer([pd.Timestamp(start)], method='nearest')
+        refInd = gfREF.index[nearest[0]]
+    else:
+        raise ValueError('job needs either reference or start')
+
+    if job['match_frame']:
+        scenes = gfREF.loc[refInd:]
+    else:
+        refStart = gf.startTime[gf.orbit == gf.orbit[refInd]].min()
+        overlap = index.fractions(gf.geometry[refInd], start=refStart)
+        scenes = gf[crop & (overlap >= MIN_OVERLAP).values]
+
+    # absolute orbits increase with time, so pairs are array offsets
+    orbits = scenes.orbit.unique()
+    offset = int(job['jump']) + 1
+    npairs = max(min(int(job['npairs']), len(orbits) - offset), 0)
+    urls = scenes.groupby('orbit').url.agg(list)
+    # what the SLC cache needs to know about each scene
+    cacheColumns = [x for x in ['md5sum', 'fileName', 'url', 'bytes']
+                    if x in scenes.columns]
+    records = scenes.groupby('orbit')[cacheColumns].apply(
+        lambda x: x.to_dict('records'))
+    dates = scenes.groupby('orbit').startTime.min()
+    reference = orbits[:npairs]
+    secondary = orbits[offset:offset + npairs]
+
+    return pd.DataFrame(dict(
+        path=path, frame=frame, reference=reference, secondary=secondary,
+        refDate=dates[reference].values, secDate=dates[secondary].values,
+        intdir=[f'{path}-{frame}-{r}-{s}' for r, s in zip(reference,
+                                                           secondary)],
+        reference_urls=urls[reference].values,
+        secondary_urls=urls[secondary].values,
+        scenes=[records[r] + records[s] for r, s in zip(reference,
+                                                         secondary)],
+        template=job['template']))
+
+
+def format_plan(plan):
+    ''' plan as a table for --dry-run '''
+    table = plan[['intdir', 'refDate', 'secDate']].copy()
+    table['days'] = (plan.secDate - plan.refDate).dt.round('D').dt.days
+    table['nref'] = plan.reference_urls.map(len)
+    table['nsec'] = plan.secondary_urls.map(len)
+    downloads = plan_downloads(plan)
+    nurls = sum(len(urls) for urls in downloads.values())
+    return (f'{table.to_string(index=False)}\n'
+            f'{len(plan)} pairs, {nurls} unique downloads')
+
+
+def plan_downloads(plan):
+    ''' unique scene urls per relative orbit '''
+    downloads = {}
+    for path, subset in plan.groupby('path'):
+        urls = set()
+        for column in ['reference_urls', 'secondary_urls']:
+            urls.update(url for x in subset[column] for url in x)
+        downloads[path] = sorted(urls)
+    return downloads
+
+
+def write_plan(plan, outdir='.', cache=None):
+    ''' topsApp.xml per pair and download-links.txt per relative orbit;
+    existing interferogram directories are left alone. With an slcCache
+    the tmp-data zips are links into it, referenced by each pair '''
+    templates = {}
+    for row in plan.itertuples():
+        intdir = Path(outdir, row.intdir)
+        if intdir.is_dir():
+            print(f'{intdir} already exists, remove it and rerun if you really want to')
+            continue
+        if row.template not in templates:
+            templates[row.template] = dinosar.read_yaml_template(row.template)
+        inputDict = templates[row.template]
+        tmpData = f'tmp-data-{row.path}'
+        inputDict["topsinsar"]["reference"]["safe"] = [
+            f'../{tmpData}/{os.path.basename(x)}' for x in row.reference_urls]
+        inputDict["topsinsar"]["reference"]["output directory"] = "referencedir"
+        inputDict["topsinsar"]["secondary"]["safe"] = [
+            f'../{tmpData}/{os.path.basename(x)}' for x in row.secondary_urls]
+        inputDict["topsinsar"]["secondary"]["output directory"] = "secondarydir"
+        os.mkdir(intdir)
+        dinosar.write_xml(dinosar.dict2xml(inputDict),
+                          outname=Path(intdir, 'topsApp.xml'))
+        if cache is not None:
+            os.makedirs(Path(outdir, tmpData), exist_ok=True)
+            cache.add(row.scenes, intdir, links=Path(outdir, tmpData))
+
+    for path, urls in plan_downloads(plan).items():
+        tmpData = Path(outdir, f'tmp-data-{path}')
+        linkFile = Path(tmpData, 'download-links.txt')
+        os.makedirs(tmpData, exist_ok=True)
+        if linkFile.exists():
+            with open(linkFile) as f:
+                urls = sorted(set(urls).union(line.rstrip() for line in f))
+        with open(linkFile, 'w') as f:
+            f.write('\n'.join(urls))
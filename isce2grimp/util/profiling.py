@@ -0,0 +1,103 @@
+"""
+Lightweight resource reporting helpers
+"""
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+
+def peak_rss():
+    ''' peak resident set size of this process in MB '''
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    scale = 1024**2 if sys.platform == 'darwin' else 1024
+
+    return maxrss / scale
+
+
+def cpu_time():
+    ''' user + system seconds of this process and its finished children '''
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+class stageTimer:
+
+    """ Wall time, CPU time and peak RSS of named stages
+
+    timer = stageTimer()
+    with timer.stage('configure'):
+        ...
+    timer.save('stages.json')
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.start = time.perf_counter()
+        self.cpu0 = cpu_time()
+
+    @contextmanager
+    def stage(self, name):
+        ''' record one stage, also when it raises '''
+        wall, cpu = time.perf_counter(), cpu_time()
+        record = dict(name=name)
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            # peak RSS can only grow, so this is the peak up to the end of
+            # the stage and the increase shows what the stage added
+            rss = peak_rss()
+            previous = self.stages[-1]['peakRSS'] if self.stages else rss
+            record.update(wall=round(time.perf_counter() - wall, 6),
+                          cpu=round(cpu_time() - cpu, 6),
+                          peakRSS=round(rss, 1),
+                          peakRSSIncrease=round(max(rss - previous, 0), 1))
+            self.stages.append(record)
+
+    def report(self):
+        ''' stages and totals as a dictionary '''
+        return dict(stages=self.stages,
+                    wall=round(time.perf_counter() - self.start, 6),
+                    cpu=round(cpu_time() - self.cpu0, 6),
+                    peakRSS=round(peak_rss(), 1))
+
+    def save(self, path):
+        ''' write the report as JSON '''
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+    def summary(self):
+        ''' one line per stage '''
+        lines = [f'{"stage":<20} {"wall (s)":>10} {"cpu (s)":>10} '
+                 f'{"peak RSS (MB)":>14}']
+        for s in self.stages:
+            lines.append(f'{s["name"]:<20} {s["wall"]:10.2f} {s["cpu"]:10.2f} '
+                         f'{s["peakRSS"]:14.1f}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def profiled(path=None):
+    ''' cProfile the block and dump the stats to path (no-op if None) '''
+    if path is None:
+        yield None
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        profile.dump_stats(path)
@@ -1,5 +1,18 @@
+
+import mmap
 import numpy as np
 
+types = ['f8', '>f8', 'f4', '>f4', '>u2', 'u2', '>i2', 'i2', '>u4',
+         'u4', '>i4', 'i4', 'u1']
+
+
+def checkType(dataType, caller='readImage'):
+    """ exit if dataType is not one of the accepted binary types """
+    if dataType not in types:
+        print(f'\nError {caller}: Specified data type,\033[1m'
+              f'{dataType}\033[0m not in accepted types :\n\n\t{types}\n')
+        exit()
+
 
 def readImage(fileName, nx, ny, dataType):
     """ read a binary image of size nx by ny with dataType = to one
@@ -8,19 +21,54 @@ def readImage(fileName, nx, ny, dataType):
 #
 # reads several types of binary images and creates a numpy matrix
 #
-    types = ['f8', '>f8', 'f4', '>f4', '>u2', 'u2', '>i2', 'i2', '>u4',
-             'u4', '>i4', 'i4', 'u1']
-    if dataType not in types:
-        print(f'\nError readImage: Specified data type,\033[1m'
-              f'{dataType}\033[0m not in accepted types :\n\n\t{types}\n')
-        exit()
-
+    checkType(dataType)
     dt = np.dtype(dataType)
     x = np.fromfile(fileName, dtype=dt)
     x = np.reshape(x, [ny, nx])
     # print('Data Type ',dataType)
-    # swap data so its in native format
-    if '>' in dataType:
-        x = x.astype(np.dtype(dataType.replace('>', '')))
+    # swap data in place so its in native format without a second copy
+    if not dt.isnative:
+        x.byteswap(inplace=True)
+        x = x.view(dt.newbyteorder('='))
     # print(x.dtype)
     return x
+
+
+def mmapImage(fileName, nx, ny, dataType, mode='r'):
+    """ memory map a binary image of size nx by ny with dataType as for
+    readImage. Nothing is read or byte swapped until the array is accessed,
+    so '>f4' files give a lazy big-endian view (numpy converts on use) """
+    checkType(dataType, caller='mmapImage')
+    return np.memmap(fileName, dtype=np.dtype(dataType), mode=mode,
+                     shape=(ny, nx))
+
+
+def readImageBlocks(fileName, nx, ny, dataType, nlines=1024):
+    """ generator over a binary image of size nx by ny, yielding
+    (firstLine, block) with each block a native-order copy of up to nlines
+    lines. Pages already consumed are released so memory stays bounded """
+    checkType(dataType, caller='readImageBlocks')
+    dt = np.dtype(dataType)
+    lineBytes = nx * dt.itemsize
+    with open(fileName, 'rb') as fp, \
+            mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if len(mm) < ny * lineBytes:
+            raise ValueError(f'{fileName} smaller than {nx} x {ny} {dataType}')
+        for line0 in range(0, ny, nlines):
+            n = min(nlines, ny - line0)
+            x = np.frombuffer(mm, dtype=dt, count=n*nx,
+                              offset=line0*lineBytes).reshape(n, nx)
+            block = x.astype(dt.newbyteorder('='))
+            del x
+            releasePages(mm, line0*lineBytes, (line0+n)*lineBytes)
+            yield line0, block
+
+
+def releasePages(mm, start, stop):
+    """ drop whole pages of mm in [start, stop) from this process """
+    if not hasattr(mmap, 'MADV_DONTNEED'):
+        return
+    start = start // mmap.PAGESIZE * mmap.PAGESIZE
+    stop = stop // mmap.PAGESIZE * mmap.PAGESIZE
+    if stop > start:
+        mm.madvise(mmap.MADV_DONTNEED, start, stop - start)
@@ -0,0 +1,252 @@
+"""
+Local job scheduler for running many interferograms on one node
+
+Each job gets a fixed set of CPUs, packed onto a single socket when it
+fits, with OMP_NUM_THREADS and CPU affinity set to match. New jobs only
+start while there is enough free memory, and every job's status, CPUs
+and exit code are kept in a JSON state file so an interrupted queue can
+be restarted without rerunning finished directories.
+"""
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+
+GB = 1024**3
+
+
+def topology():
+    ''' usable CPU ids grouped by socket (physical package) '''
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count()))
+    sockets = {}
+    for cpu in cpus:
+        packageFile = f'/sys/devices/system/cpu/cpu{cpu}/topology/physical_package_id'
+        try:
+            with open(packageFile) as f:
+                package = int(f.read())
+        except (OSError, ValueError):
+            package = 0
+        sockets.setdefault(package, []).append(cpu)
+
+    return [sockets[k] for k in sorted(sockets)]
+
+
+def process_rss(pid):
+    ''' resident bytes of pid and all its descendants (the shell running
+    a job and topsApp under it), 0 without /proc '''
+    children = {}
+    rss = {}
+    pageSize = os.sysconf('SC_PAGE_SIZE')
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # the command name may contain spaces, ppid follows it
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            with open(f'/proc/{entry}/statm') as f:
+                rss[int(entry)] = int(f.read().split()[1]) * pageSize
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total, todo = 0, [pid]
+    while todo:
+        x = todo.pop()
+        total += rss.get(x, 0)
+        todo += children.get(x, [])
+    return total
+
+
+def available_memory():
+    ''' bytes of memory available for new processes '''
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+
+class jobQueue:
+
+    """ Run command in each directory, packing jobs onto sockets.
+
+    cpus per job are taken from the socket with the most free CPUs (or
+    spread over several if one socket is too small), at most maxJobs run
+    at once, and a job only starts if memory (bytes) is available on top
+    of what running jobs have not used yet (memory less their resident
+    size), since they may not have grown to their full size. The first
+    job always starts so the queue cannot stall. Failed jobs are
+    requeued up to retries times. onFinish(intdir, returncode) is called
+    for every job that is not going to be retried.
+
+    Subclasses can hold jobs back with ready() and do other work between
+    polls in schedule(). """
+
+    def __init__(self, directories, command, cpus=8, memory=16*GB,
+                 maxJobs=None, stateFile='run_isce_state.json', sockets=None,
+                 env=None, logName='run_isce.log', poll=1.0, retries=0,
+                 onFinish=None):
+        self.directories = [str(Path(x).resolve()) for x in directories]
+        self.command = command
+        self.sockets = topology() if sockets is None else sockets
+        ncpus = sum(len(x) for x in self.sockets)
+        self.cpus = min(cpus, ncpus)
+        self.memory = memory
+        self.maxJobs = maxJobs or max(ncpus // self.cpus, 1)
+        self.stateFile = stateFile
+        self.env = env or {}
+        self.logName = logName
+        self.poll = poll
+        self.retries = retries
+        self.onFinish = onFinish
+        self.attempts = {}
+        self.stats = dict(unallocatedCpuSeconds=0.0,
+                          allocatedCpuSeconds=0.0,
+                          maxRunning=0)
+        self.free = [list(x) for x in self.sockets]
+        self.running = {}
+        self.state = {}
+        if Path(stateFile).is_file():
+            with open(stateFile) as f:
+                self.state = json.load(f)
+        for intdir in self.directories:
+            job = self.state.get(intdir)
+            # anything not finished (e.g. killed while running) is rerun
+            if job is None or job['status'] != 'done':
+                self.state[intdir] = dict(status='queued')
+        self.save()
+
+    def save(self):
+        tmpfile = f'{self.stateFile}.tmp'
+        with open(tmpfile, 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmpfile, self.stateFile)
+
+    def queued(self):
+        return [x for x in self.directories
+                if self.state[x]['status'] == 'queued']
+
+    def allocate(self):
+        ''' CPU ids for one job, or None if not enough are free '''
+        if sum(len(x) for x in self.free) < self.cpus:
+            return None
+        order = sorted(range(len(self.free)), key=lambda i: -len(self.free[i]))
+        if len(self.free[order[0]]) >= self.cpus:
+            # prefer a single socket, the fullest one that fits
+            fits = [i for i in order if len(self.free[i]) >= self.cpus]
+            socket = min(fits, key=lambda i: len(self.free[i]))
+            cpus = self.free[socket][:self.cpus]
+        else:
+            cpus = []
+            for socket in order:
+                cpus += self.free[socket][:self.cpus - len(cpus)]
+        for socket in self.free:
+            socket[:] = [x for x in socket if x not in cpus]
+        return cpus
+
+    def release(self, cpus):
+        for socket, free in zip(self.sockets, self.free):
+            free[:] = [x for x in socket if x in cpus or x in free]
+
+    def can_start(self):
+        if len(self.running) >= self.maxJobs:
+            return False
+        # MemAvailable already excludes what running jobs use
+        reserved = sum(max(self.memory - process_rss(process.pid), 0)
+                       for process, _ in self.running.values())
+        return len(self.running) == 0 or \
+            available_memory() - reserved >= self.memory
+
+    def start(self, intdir, cpus):
+        env = dict(os.environ, **self.env)
+        env['OMP_NUM_THREADS'] = str(len(cpus))
+        env['OMP_PLACES'] = ','.join(f'{{{x}}}' for x in cpus)
+        env['OMP_PROC_BIND'] = 'close'
+
+        def set_affinity():
+            if hasattr(os, 'sched_setaffinity'):
+                os.sched_setaffinity(0, cpus)
+
+        log = open(Path(intdir, self.logName), 'ab')
+        process = subprocess.Popen(self.command, shell=True, cwd=intdir,
+                                   env=env, stdout=log,
+                                   stderr=subprocess.STDOUT,
+                                   preexec_fn=set_affinity)
+        log.close()
+        self.running[intdir] = (process, cpus)
+        self.state[intdir] = dict(status='running', pid=process.pid,
+                                  cpus=cpus, start=time.time())
+        print(f'started {intdir} on CPUs {cpus}')
+        self.save()
+
+    def check(self, queue):
+        ''' record finished jobs, free their CPUs and requeue failures '''
+        for intdir, (process, cpus) in list(self.running.items()):
+            returncode = process.poll()
+            if returncode is None:
+                continue
+            del self.running[intdir]
+            self.release(cpus)
+            job = self.state[intdir]
+            job.update(status='done' if returncode == 0 else 'failed',
+                       returncode=returncode, end=time.time())
+            print(f'{intdir} {job["status"]} (exit {returncode}, '
+                  f'{job["end"] - job["start"]:.0f} s)')
+            if returncode != 0 and self.attempts[intdir] <= self.retries:
+                print(f'retrying {intdir}')
+                job['status'] = 'queued'
+                queue.append(intdir)
+            elif self.onFinish is not None:
+                self.onFinish(intdir, returncode)
+            self.save()
+
+    def ready(self, intdir):
+        ''' whether a queued job can start now '''
+        return True
+
+    def schedule(self, queue):
+        ''' called every poll before starting jobs '''
+        pass
+
+    def sample(self, dt):
+        ''' accumulate CPU-seconds with and without a job allocated to
+        them (not whether the job kept them busy) '''
+        free = sum(len(x) for x in self.free)
+        allocated = sum(len(x) for x in self.sockets) - free
+        self.stats['unallocatedCpuSeconds'] += free*dt
+        self.stats['allocatedCpuSeconds'] += allocated*dt
+        self.stats['maxRunning'] = max(self.stats['maxRunning'],
+                                       len(self.running))
+
+    def run(self):
+        ''' run all queued jobs, return the state dictionary '''
+        queue = self.queued()
+        print(f'{len(queue)} jobs, {self.cpus} CPUs each, up to '
+              f'{self.maxJobs} at once on sockets {self.sockets}')
+        t0 = time.perf_counter()
+        while queue or self.running:
+            self.check(queue)
+            self.schedule(queue)
+            for intdir in [x for x in queue if self.ready(x)]:
+                if not self.can_start():
+                    break
+                cpus = self.allocate()
+                if cpus is None:
+                    break
+                queue.remove(intdir)
+                self.attempts[intdir] = self.attempts.get(intdir, 0) + 1
+                self.start(intdir, cpus)
+            if self.running or queue:
+                time.sleep(self.poll)
+            t1 = time.perf_counter()
+            self.sample(t1 - t0)
+            t0 = t1
+
+        return self.state
@@ -0,0 +1,198 @@
+"""
+Shared content-addressed cache of Sentinel-1 SAFE zips
+
+Scenes are stored once under their ASF md5sum:
+
+CACHE/objects/<md5sum>/<sceneName>.zip
+
+and interferogram directories link to them. Zips already downloaded
+where a link should go are moved into the cache if their size and md5sum
+match, and otherwise left alone, never deleted. The index (CACHE/index.json)
+records each scene's url, expected size, last use and the interferogram
+directories that still need it (references). prep_pair, prep_stack and
+plan_stacks add references, run_isce drops them once a pair has been
+processed, and evict() deletes the least recently used scenes that no
+pending pair needs until the cache fits a size limit. The index is only
+changed while holding an exclusive lock on CACHE/.lock, so several
+processes can share one cache.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+GB = 1024**3
+
+
+class slcCache:
+
+    """ Content-addressed SLC cache with reference counts and LRU eviction.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root).resolve()
+        self.indexFile = Path(self.root, 'index.json')
+        os.makedirs(Path(self.root, 'objects'), exist_ok=True)
+
+    @contextmanager
+    def index(self):
+        ''' locked read-modify-write of the index '''
+        with open(Path(self.root, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index = {}
+            if self.indexFile.is_file():
+                with open(self.indexFile) as f:
+                    index = json.load(f)
+            yield index
+            tmpfile = Path(self.root, 'index.json.tmp')
+            with open(tmpfile, 'w') as f:
+                json.dump(index, f, indent=1)
+            os.replace(tmpfile, self.indexFile)
+
+    def read_index(self):
+        ''' snapshot of the index under a shared lock '''
+        with open(Path(self.root, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            if not self.indexFile.is_file():
+                return {}
+            with open(self.indexFile) as f:
+                return json.load(f)
+
+    def path(self, md5, fileName):
+        return Path(self.root, 'objects', md5, fileName)
+
+    def is_complete(self, md5, index=None):
+        ''' scene is in the cache with its expected size '''
+        index = self.read_index() if index is None else index
+        entry = index.get(md5)
+        if entry is None:
+            return False
+        path = self.path(md5, entry['fileName'])
+        return path.is_file() and (entry['bytes'] is None or
+                                   path.stat().st_size == entry['bytes'])
+
+    def add(self, scenes, intdir, links=None):
+        ''' reference scenes (rows with md5sum, fileName, url, bytes) for
+        intdir, return their cache paths. If links is a directory, each
+        scene is also symlinked there as fileName '''
+        intdir = str(Path(intdir).resolve())
+        paths = []
+        with self.index() as index:
+            for scene in scenes:
+                md5 = str(scene['md5sum'])
+                nbytes = scene.get('bytes')
+                entry = index.setdefault(md5, dict(
+                    fileName=str(scene['fileName']), url=str(scene['url']),
+                    bytes=None if nbytes is None else int(nbytes), refs=[]))
+                if intdir not in entry['refs']:
+                    entry['refs'].append(intdir)
+                entry['lastUsed'] = time.time()
+                path = self.path(md5, entry['fileName'])
+                os.makedirs(path.parent, exist_ok=True)
+                paths.append(path)
+                if links is not None:
+                    self.link(path, Path(links, entry['fileName']),
+                              nbytes=entry['bytes'])
+        return paths
+
+    def link(self, path, dest, hard=False, nbytes=None):
+        ''' point dest at a cached scene, a hardlink only works once the
+        scene has been downloaded. A file already at dest is never
+        deleted: if the cache does not have the scene yet and the file
+        has the expected size (nbytes) and md5sum it is moved into the
+        cache, otherwise it is left in place unlinked. Returns whether
+        dest points at the cache '''
+        dest = Path(dest)
+        if dest.is_symlink():
+            if dest.resolve() == path.resolve():
+                return True
+            dest.unlink()
+        elif dest.exists():
+            if path.exists() and os.path.samefile(dest, path):
+                return True
+            if path.exists() or not self.matches(dest, path.parent.name,
+                                                 nbytes):
+                print(f'not linking {dest} to the cache: it is not '
+                      f'{path.parent.name} or the cache already has it')
+                return False
+            # may be another filesystem, shutil.move copies then deletes
+            shutil.move(dest, path)
+        if hard and path.is_file():
+            os.link(path, dest)
+        else:
+            os.symlink(path, dest)
+        return True
+
+    @staticmethod
+    def matches(path, md5, nbytes=None):
+        ''' file at path has size nbytes (if given) and md5sum md5 '''
+        if nbytes is not None and os.path.getsize(path) != nbytes:
+            return False
+        digest = hashlib.md5()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2**24), b''):
+                digest.update(chunk)
+        return digest.hexdigest() == md5
+
+    def release(self, intdir):
+        ''' intdir no longer needs its scenes '''
+        intdir = str(Path(intdir).resolve())
+        with self.index() as index:
+            for entry in index.values():
+                if intdir in entry['refs']:
+                    entry['refs'].remove(intdir)
+                    entry['lastUsed'] = time.time()
+
+    def size(self, index=None):
+        ''' bytes of scenes on disk '''
+        index = self.read_index() if index is None else index
+        total = 0
+        for md5, entry in index.items():
+            path = self.path(md5, entry['fileName'])
+            if path.is_file():
+                total += path.stat().st_size
+        return total
+
+    def evict(self, maxBytes):
+        ''' delete unreferenced scenes, least recently used first, until the
+        cache holds at most maxBytes. Returns the md5sums removed '''
+        removed = []
+        with self.index() as index:
+            total = self.size(index)
+            unused = sorted((md5 for md5, entry in index.items()
+                             if not entry['refs']),
+                            key=lambda x: index[x]['lastUsed'])
+            for md5 in unused:
+                if total <= maxBytes:
+                    break
+                path = self.path(md5, index[md5]['fileName'])
+                if path.is_file():
+                    total -= path.stat().st_size
+                    path.unlink()
+                if path.parent.is_dir():
+                    for extra in path.parent.iterdir():
+                        # partial downloads
+                        extra.unlink()
+                    path.parent.rmdir()
+                del index[md5]
+                removed.append(md5)
+        return removed
+
+    def expected(self, dest):
+        ''' (bytes, md5sum) for a path in the cache, (None, None) outside '''
+        dest = Path(dest)
+        if dest.parent.parent != Path(self.root, 'objects'):
+            return None, None
+        entry = self.read_index().get(dest.parent.name)
+        if entry is None:
+            return None, None
+        return entry['bytes'], dest.parent.name
+
+    def verify(self, md5):
+        ''' md5 of the cached file matches its key '''
+        entry = self.read_index()[md5]
+        return self.matches(self.path(md5, entry['fileName']), md5)
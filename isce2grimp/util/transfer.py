@@ -0,0 +1,221 @@
+"""
+Copy interferogram products to an output (archive) directory
+
+Files are transferred by a thread pool, largest first. On the same
+filesystem a file is cloned (FICLONE reflink, copy-on-write) when the
+filesystem supports it, or hardlinked if asked (only safe for files that
+are never rewritten in place); otherwise it is copied in chunks. Files
+matching the compress patterns and at least minCompress bytes are stored
+zstd compressed as <name>.zst (needs zstandard), streamed chunk by chunk.
+
+Every file is read once and its sha256 recorded, with its size and
+modification time, in DESTDIR/isce2grimp.manifest.json. A later transfer
+skips files whose source size and mtime match the manifest and whose
+stored copy is still there, and files whose mtime changed but whose
+content did not (same checksum) are only re-recorded. Copies are written
+to a temporary name and renamed, so an interrupted transfer never leaves
+a partial file under the final name.
+"""
+import fcntl
+import fnmatch
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+MANIFEST = 'isce2grimp.manifest.json'
+MB = 1024**2
+CHUNK = 16 * MB
+# linux/fs.h _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+def load_manifest(destdir):
+    path = Path(destdir, MANIFEST)
+    if not path.is_file():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, destdir):
+    ''' write the manifest atomically '''
+    path = Path(destdir, MANIFEST)
+    tmpfile = Path(destdir, f'{MANIFEST}.tmp')
+    with open(tmpfile, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmpfile, path)
+    return path
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reflink(source, dest):
+    ''' clone source to dest, False where the filesystem cannot '''
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def _copy(source, dest, compressor=None):
+    ''' chunked copy (compressed with a zstandard compressor), returns
+    the sha256 of source '''
+    digest = hashlib.sha256()
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        writer = compressor.stream_writer(dst, closefd=False) \
+            if compressor else dst
+        for chunk in iter(lambda: src.read(CHUNK), b''):
+            digest.update(chunk)
+            writer.write(chunk)
+        if compressor:
+            writer.close()
+    return digest.hexdigest()
+
+
+def _transfer_one(source, dest, compress, hardlink, level):
+    ''' worker: store source as dest (dest.zst when compressed), returns
+    (method, sha256, stored name) '''
+    dest = Path(dest)
+    os.makedirs(dest.parent, exist_ok=True)
+    if compress:
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError('compressed transfer needs zstandard '
+                              '(pip install zstandard)') from e
+        dest = dest.with_name(dest.name + '.zst')
+    tmpfile = dest.with_name(f'.{dest.name}.tmp')
+    if tmpfile.exists():
+        tmpfile.unlink()
+    sameDevice = os.stat(source).st_dev == os.stat(dest.parent).st_dev
+    try:
+        if compress:
+            method = 'compressed'
+            checksum = _copy(source, tmpfile, zstandard.ZstdCompressor(
+                level=level, threads=-1))
+        elif sameDevice and _reflink(source, tmpfile):
+            method, checksum = 'reflinked', file_digest(source)
+        elif sameDevice and hardlink:
+            if tmpfile.exists():
+                tmpfile.unlink()
+            os.link(source, tmpfile)
+            method, checksum = 'hardlinked', file_digest(source)
+        else:
+            method, checksum = 'copied', _copy(source, tmpfile)
+        if method != 'hardlinked':
+            shutil.copystat(source, tmpfile)
+        os.replace(tmpfile, dest)
+    finally:
+        if tmpfile.exists():
+            tmpfile.unlink()
+    return method, checksum, dest.name
+
+
+def _compressible(relpath, size, compress, minCompress):
+    return size >= minCompress and any(fnmatch.fnmatch(relpath, x)
+                                       for x in compress)
+
+
+def transfer(files, destdir, workers=4, compress=(), minCompress=64 * MB,
+             level=3, hardlink=False, log=print):
+    ''' transfer files (source paths, or (source, path relative to
+    destdir) pairs) to destdir. compress lists fnmatch patterns of
+    relative paths to store zstd compressed. Returns one row per file
+    (file, status, bytes, seconds, error), status one of skipped,
+    missing, failed or the transfer method '''
+    destdir = Path(destdir)
+    os.makedirs(destdir, exist_ok=True)
+    manifest = load_manifest(destdir)
+    rows, todo = {}, []
+    for entry in files:
+        source, relpath = (entry, Path(entry).name) \
+            if isinstance(entry, (str, Path)) else entry
+        relpath = str(relpath)
+        row = dict(file=relpath, status='', bytes=0, seconds=0.0, error='')
+        rows[relpath] = row
+        try:
+            stat = os.stat(source)
+        except FileNotFoundError:
+            row['status'] = 'missing'
+            continue
+        row['bytes'] = stat.st_size
+        known = manifest.get(relpath)
+        if known and known['bytes'] == stat.st_size and \
+                Path(destdir, relpath).with_name(known['stored']).is_file():
+            if known['mtime'] == stat.st_mtime:
+                row['status'] = 'skipped'
+                continue
+            # touched but maybe not changed
+            if file_digest(source) == known['sha256']:
+                known['mtime'] = stat.st_mtime
+                row['status'] = 'skipped'
+                continue
+        zst = _compressible(relpath, stat.st_size, compress, minCompress)
+        todo.append((source, relpath, stat, zst))
+
+    # largest first so one big raster does not finish last on its own
+    todo.sort(key=lambda x: x[2].st_size, reverse=True)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {pool.submit(_timed, _transfer_one, source,
+                               Path(destdir, relpath), zst, hardlink,
+                               level): (source, relpath, stat)
+                   for source, relpath, stat, zst in todo}
+        for future in as_completed(futures):
+            source, relpath, stat = futures[future]
+            row = rows[relpath]
+            try:
+                (method, checksum, stored), row['seconds'] = future.result()
+            except Exception as e:
+                row.update(status='failed', error=f'{type(e).__name__}: {e}')
+                manifest.pop(relpath, None)
+                continue
+            row['status'] = method
+            manifest[relpath] = dict(
+                bytes=stat.st_size, mtime=stat.st_mtime, sha256=checksum,
+                stored=stored, storedBytes=Path(
+                    destdir, relpath).with_name(stored).stat().st_size,
+                method=method, time=time.time())
+    save_manifest(manifest, destdir)
+    rows = list(rows.values())
+    if log:
+        log(format_transfer(rows))
+    return rows
+
+
+def _timed(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, round(time.perf_counter() - t0, 3)
+
+
+def format_transfer(rows):
+    ''' one line per file transferred, missing or failed, then totals '''
+    lines = []
+    for r in rows:
+        if r['status'] == 'missing':
+            lines.append(f'not found: {r["file"]}')
+        elif r['status'] == 'failed':
+            lines.append(f'failed: {r["file"]} {r["error"]}')
+        elif r['status'] != 'skipped':
+            lines.append(f'{r["status"]}: {r["file"]} '
+                         f'({r["bytes"] / MB:.1f} MB, {r["seconds"]:.1f} s)')
+    counts = {}
+    for r in rows:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    moved = sum(r['bytes'] for r in rows
+                if r['status'] not in ('skipped', 'missing', 'failed'))
+    lines.append(', '.join(f'{n} {s}' for s, n in sorted(counts.items()))
+                 + f' ({moved / MB:.1f} MB)')
+    return '\n'.join(lines)
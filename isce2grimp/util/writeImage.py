@@ -1,36 +1,49 @@
 #writeImage.py
+import mmap
 import numpy as np
+from .readImage import checkType, releasePages
 
 def writeImage(fileName,x,dataType) :
     """ write a binary image of size nx by ny with dataType = to one ['f4','>f4','>u2','u2','>i2','i2','>u4','u4','>i4','i4','u1'] """
 #
 # reads several types of binary images and creates a numpy matrix
 #
-    types=['f4','>f4','f8','>f8','>u2','u2','>i2','i2','>u4','u4','>i4','i4','u1']
-    if not dataType in types :
-        print('\nError readImage: Specified data type, \033[1m',dataType,'\033[0m not in accepted types :\n\n\t',types,'\n')
-        exit()
-    x1=x
-    if 'f4' in dataType :
-        x1=x.astype('float32')
-    if 'f8' in dataType :
-        x1=x.astype('float64')        
-    elif 'i2' in dataType :
-        x1=x.astype('int16')
-    elif 'i4' in dataType :
-        x1=x.astype('int32')
-    elif 'u2' in dataType :
-        x1=x.astype('uint16')
-    elif 'u4' in dataType :
-        x1=x.astype('uint32')        
-    
-    if '>' in dataType :
-        x1.byteswap(True)
-
-    sh=x1.shape
-  #  x1=x1.transpose()
-    dt=np.dtype(dataType)
-    fOut=open(fileName,'w')
+    checkType(dataType, caller='writeImage')
+    # single conversion to the output type and byte order (no copy if x
+    # already matches)
+    x1=np.asarray(x,dtype=np.dtype(dataType))
+    fOut=open(fileName,'wb')
     x1.tofile(fOut)
     fOut.close()
     return
+
+def writeImageBlocks(fileName,blocks,nx,ny,dataType) :
+    """ write a binary image of size nx by ny with dataType as for writeImage
+    from an iterator of row blocks (each nlines by nx) into a preallocated
+    memory map. Blocks are converted to dataType as they are copied in and
+    written pages are released, so memory stays bounded by one block """
+    checkType(dataType, caller='writeImageBlocks')
+    dt=np.dtype(dataType)
+    lineBytes=nx*dt.itemsize
+    with open(fileName,'w+b') as fOut :
+        fOut.truncate(ny*lineBytes)
+        if ny*lineBytes == 0 :
+            return
+        with mmap.mmap(fOut.fileno(),ny*lineBytes) as mm :
+            x=np.frombuffer(mm,dtype=dt).reshape(ny,nx)
+            line0=0
+            try :
+                for block in blocks :
+                    block=np.asarray(block).reshape(-1,nx)
+                    n=block.shape[0]
+                    if line0+n > ny :
+                        raise ValueError(f'{fileName}: blocks exceed {ny} lines')
+                    x[line0:line0+n]=block
+                    mm.flush()
+                    releasePages(mm,line0*lineBytes,(line0+n)*lineBytes)
+                    line0+=n
+            finally :
+                del x
+    if line0 != ny :
+        raise ValueError(f'{fileName}: blocks gave {line0} of {ny} lines')
+    return
@@ -0,0 +1,10 @@
+"""Fixtures shared by several test modules."""
+import pytest
+
+from .synthetic import write_dem_tiles
+
+
+@pytest.fixture
+def tiles(tmpdir):
+    ''' synthetic GLO-30 tiles and geoid, see synthetic.write_dem_tiles '''
+    return str(tmpdir), write_dem_tiles(tmpdir)
@@ -0,0 +1,79 @@
+"""Local HTTP file server with range requests, throttling and faults."""
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    ''' serves server.files {path: bytes}; server.ranges toggles range
+    support, server.rate limits each connection (bytes/s) and
+    server.drops closes that many responses half way through '''
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def head(self):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return None
+        return data
+
+    def do_HEAD(self):
+        data = self.head()
+        if data is None:
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        if self.server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_GET(self):
+        data = self.head()
+        if data is None:
+            return
+        rangeHeader = self.headers.get('Range')
+        with self.server.lock:
+            self.server.requests.append((self.path, rangeHeader))
+            drop = self.server.drops > 0
+            self.server.drops -= drop
+        start, stop = 0, len(data)
+        if rangeHeader and self.server.ranges:
+            first, last = rangeHeader.split('=')[1].split('-')
+            start = int(first)
+            stop = int(last) + 1 if last else len(data)
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             f'bytes {start}-{stop - 1}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(stop - start))
+        self.end_headers()
+        body = data[start:stop]
+        if drop:
+            self.wfile.write(body[:len(body)//2])
+            self.close_connection = True
+            return
+        block = 64*1024
+        for i in range(0, len(body), block):
+            self.wfile.write(body[i:i + block])
+            if self.server.rate:
+                time.sleep(block / self.server.rate)
+
+
+def serve(files, ranges=True, rate=None):
+    ''' start a server in a thread, return it and its base url '''
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+    server.daemon_threads = True
+    server.files = files
+    server.ranges = ranges
+    server.rate = rate
+    server.drops = 0
+    server.requests = []
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}'
@@ -0,0 +1,123 @@
+"""Synthetic ASF inventory rows with the GPKG schema, topsApp logs and
+GLO-30 DEM tiles."""
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+import shapely
+from rasterio.transform import from_origin
+
+from pathlib import Path
+from isce2grimp.util import dem
+
+
+def make_inventory(paths=(83, 90), start='2019-12-01', nacq=20, nframes=5,
+                   jitter=0.0, seed=0):
+    ''' nacq 6-day acquisitions of nframes consecutive frames per path,
+    frame footprints optionally shifted along track by up to jitter deg '''
+    rng = np.random.default_rng(seed)
+    rows = []
+    for path in paths:
+        for i in range(nacq):
+            t0 = pd.Timestamp(start) + pd.Timedelta(days=6*i, hours=path % 24)
+            orbit = 10000 + 175*i + path
+            platform = 'Sentinel-1A' if i % 2 == 0 else 'Sentinel-1B'
+            shift = rng.uniform(-jitter, jitter)
+            for j in range(nframes):
+                lat0 = 60 + 1.5*j + shift
+                lon0 = -60 + 0.1*path
+                name = (f'S1{platform[-1]}_IW_SLC__1SDH_'
+                        f'{(t0 + pd.Timedelta(seconds=25*j)):%Y%m%dT%H%M%S}_'
+                        f'{orbit:06d}_{path:03d}{j:02d}')
+                rows.append(dict(
+                    fileName=f'{name}.zip', sceneName=name,
+                    beamModeType='IW', polarization='HH+HV',
+                    granuleType='SENTINEL_1A_FRAME', orbit=orbit,
+                    processingDate=t0, processingLevel='SLC',
+                    url=f'https://datapool.asf.alaska.edu/SLC/SA/{name}.zip',
+                    flightDirection='ASCENDING', bytes=4000000000 + j,
+                    fileID=f'{name}-SLC', pathNumber=path, sensor='C-SAR',
+                    frameNumber=200 + j, groupID=f'S1_{path}_{j}',
+                    md5sum=f'{orbit:016x}{j:016x}',
+                    startTime=t0 + pd.Timedelta(seconds=25*j),
+                    stopTime=t0 + pd.Timedelta(seconds=25*j + 28),
+                    platform=platform,
+                    geometry=shapely.box(lon0, lat0, lon0 + 3, lat0 + 1.7)))
+    gf = gpd.GeoDataFrame(rows, crs='EPSG:4326')
+    for col in ['processingDate', 'startTime', 'stopTime']:
+        gf[col] = gf[col].astype('datetime64[s]')
+
+    return gf
+
+
+def write_gpkg(gf, gpkg):
+    ''' one layer per relative orbit as in update_inventory.write_layers '''
+    for relOrb, subset in gf.groupby('pathNumber'):
+        subset.to_file(gpkg, driver='GPKG', layer=str(relOrb))
+
+
+LOG_PREFIX = '2019-05-02 20:31:58,468 - isce.insar - INFO - '
+
+
+def write_isce_log(path, ascNodeTime='2019-04-14 08:01:23.123456',
+                   nfiller=1000, restarts=0, catalog=True):
+    ''' isce.log with the sensor catalogs near the start, then nfiller
+    processing lines; each restart repeats the catalog with a different
+    time. Returns the file size '''
+    sensor = ['ascendingnodetime', 'output', 'polarization', 'swaths']
+    values = {'reference': [ascNodeTime, 'referencedir', 'hh', '[1, 2, 3]'],
+              'secondary': ['2019-04-26 08:01:24.5', 'secondarydir', 'hh',
+                            '[1, 2, 3]']}
+    filler = LOG_PREFIX + 'isce.topsinsar.runFineResamp - processing burst ' \
+        'with geometry offsets and range misregistration = 0.001\n'
+    with open(path, 'w') as f:
+        for run in range(restarts + 1):
+            f.write(LOG_PREFIX + 'topsApp.py started\n')
+            if catalog:
+                for role, vals in values.items():
+                    if run:
+                        vals = ['2000-01-01 00:00:00.0'] + vals[1:]
+                    for name, value in zip(sensor, vals):
+                        f.write(f'{LOG_PREFIX}{role}.sensor.{name} = {value}\n')
+            f.write(LOG_PREFIX + 'reference.product.numberofbursts = 9\n')
+            for _ in range(nfiller):
+                f.write(filler)
+    return os.path.getsize(path)
+
+
+def height(lon, lat):
+    return 100 + 10*lon + 20*lat
+
+
+def undulation(lon, lat):
+    return 30 + 0.5*lon - 0.2*lat
+
+
+def write_tif(path, array, transform):
+    with rasterio.open(path, 'w', driver='GTiff', width=array.shape[1],
+                       height=array.shape[0], count=1, dtype='float32',
+                       crs='EPSG:4326', transform=transform) as dst:
+        dst.write(array.astype('float32'), 1)
+
+
+def write_dem_tiles(tiledir):
+    ''' GLO-30 style tiles of a linear height surface for 69-71N, 51-49W,
+    with 69N 50W missing (ocean), and a geoid grid. High latitude tiles
+    have coarser longitude posting as in GLO-30. Returns the geoid path '''
+    for lat, lon in [(70, -51), (70, -50), (69, -51)]:
+        ny, nx = 120, 40
+        dx, dy = 1/nx, 1/ny
+        lons = lon + (np.arange(nx) + 0.5)*dx
+        lats = lat + 1 - (np.arange(ny) + 0.5)*dy
+        lon2, lat2 = np.meshgrid(lons, lats)
+        write_tif(Path(tiledir, f'{dem.tile_name(lat, lon)}.tif'),
+                  height(lon2, lat2), from_origin(lon, lat + 1, dx, dy))
+    res = 0.25
+    lons = -60 + (np.arange(80) + 0.5)*res
+    lats = 80 - (np.arange(80) + 0.5)*res
+    lon2, lat2 = np.meshgrid(lons, lats)
+    geoid = str(Path(tiledir, 'geoid.tif'))
+    write_tif(geoid, undulation(lon2, lat2), from_origin(-60, 80, res, res))
+    return geoid
@@ -0,0 +1,65 @@
+"""Tests for batch conversion of many interferogram directories."""
+import os
+import time
+
+import pytest
+
+from pathlib import Path
+from isce2grimp.util import batch
+
+
+def fake_convert(intdir, outdir, convert=False, scale=1):
+    ''' stands in for convert_isce.convert_intdir '''
+    if 'bad' in intdir:
+        raise RuntimeError('no merged/filt_topophase.unw')
+    os.makedirs(outdir, exist_ok=True)
+    for name in ['filt_topophase.unw', 'geodat2x7.in'] + \
+            (['filt_topophase.uw'] if convert else []):
+        Path(outdir, name).write_text(str(os.getpid() * scale))
+
+
+@pytest.fixture
+def intdirs(tmpdir):
+    dirs = []
+    for name in ['90-227-1-2', '90-227-2-3', '90-227-bad-4']:
+        intdir = Path(tmpdir, 'ifgs', name)
+        os.makedirs(Path(intdir, 'merged'))
+        for x in batch.INPUTS:
+            Path(intdir, x).write_text('')
+        dirs.append(str(intdir))
+    return dirs
+
+
+def test_expand_dirs(intdirs, tmpdir):
+    Path(tmpdir, 'ifgs', 'notadir').write_text('')
+    pattern = str(Path(tmpdir, 'ifgs', '90-227-*'))
+    assert batch.expand_dirs([pattern, intdirs[0]]) == intdirs
+    assert batch.expand_dirs([str(Path(tmpdir, 'ifgs', '*'))]) == intdirs
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_run_batch(intdirs, tmpdir, workers):
+    pairs = [(x, str(Path(tmpdir, 'out', os.path.basename(x))))
+             for x in intdirs]
+    rows = batch.run_batch(fake_convert, pairs, workers=workers,
+                           convert=True, scale=2)
+    assert [r['intdir'] for r in rows] == intdirs
+    assert [r['status'] for r in rows] == ['converted', 'converted', 'failed']
+    assert 'RuntimeError' in rows[2]['error']
+    assert Path(pairs[0][1], 'filt_topophase.uw').is_file()
+
+    # second pass only retries the failure and directories with new inputs
+    time.sleep(0.01)
+    Path(intdirs[1], 'merged', 'filt_topophase.unw').write_text('rerun')
+    rows = batch.run_batch(fake_convert, pairs, workers=workers, convert=True)
+    assert [r['status'] for r in rows] == ['skipped', 'converted', 'failed']
+    # .uw missing without -c is not needed, with -c it is
+    os.remove(Path(pairs[0][1], 'filt_topophase.uw'))
+    assert batch.is_up_to_date(intdirs[0], pairs[0][1])
+    assert not batch.is_up_to_date(intdirs[0], pairs[0][1], convert=True)
+    rows = batch.run_batch(fake_convert, pairs, force=True)
+    assert [r['status'] for r in rows] == ['converted', 'converted', 'failed']
+
+    table = batch.format_summary(rows)
+    assert '90-227-bad-4' in table
+    assert table.splitlines()[-1] == '2 converted, 0 skipped, 1 failed'
@@ -0,0 +1,44 @@
+"""Tests for convert_isce runs from cached metadata (no ISCE needed)."""
+import json
+
+import numpy as np
+import pytest
+
+from isce2grimp.cli import convert_isce
+from isce2grimp.util import metadata
+from .test_metadata import geodat_metadata
+
+
+@pytest.fixture
+def intdir(tmp_path):
+    ''' an int directory with a metadata cache and a small .unw '''
+    nr, na = 40, 50
+    intdir = tmp_path / 'int'
+    (intdir / 'merged').mkdir(parents=True)
+    metadata.save_metadata(dict(geodat_metadata(), width=nr, length=na),
+                           str(intdir))
+    rng = np.random.default_rng(0)
+    isceUNW = intdir / 'merged' / 'filt_topophase.unw'
+    rng.normal(size=(na, 2*nr)).astype('f4').tofile(isceUNW)
+    np.ones((na, nr), dtype='u1').tofile(f'{isceUNW}.conncomp')
+    return intdir
+
+
+@pytest.mark.parametrize('looks', [[], ['2']])
+def test_convert_from_cache(tmp_path, intdir, looks):
+    ''' -c with and without --looks gives the .uw, the geodat files and
+    the look levels '''
+    outdir = tmp_path / 'out'
+    argv = ['-c', '-i', str(intdir), '-o', str(outdir)]
+    argv += ['--looks'] + looks if looks else []
+    assert convert_isce.main(argv) == 0
+    for name in ['filt_topophase.uw', 'geodat30x6.in', 'frames.583.593',
+                 'convert_isce.stages.json']:
+        assert (outdir / name).is_file()
+    assert (outdir / 'filt_topophase.uw').stat().st_size == 40 * 50 * 4
+    level = [outdir / 'geodat60x12.in', outdir / 'filt_topophase.60x12.uw']
+    assert [x.is_file() for x in level] == [bool(looks)] * 2
+    if looks:
+        assert level[1].stat().st_size == 20 * 25 * 4
+    stages = json.loads((outdir / 'convert_isce.stages.json').read_text())
+    assert 'configure' not in json.dumps(stages)
@@ -0,0 +1,125 @@
+"""Tests for streaming .unw to .uw conversion."""
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+
+from pathlib import Path
+from isce2grimp.util.convertuw import convertuw, NODATA
+from isce2grimp.util.multilook import parse_looks
+
+DATADIR = Path(__file__).parent / 'data'
+
+
+def make_geodat(path, nr, na):
+    ''' copy test geodat file with a different image size '''
+    with open(DATADIR / 'geodat30x6.in') as f:
+        text = f.read()
+    text = text.replace('2218  2270  30  6', f'{nr}  {na}  30  6')
+    geodat = os.path.join(path, 'geodat30x6.in')
+    with open(geodat, 'w') as f:
+        f.write(text)
+    return geodat
+
+
+@pytest.mark.parametrize('nlines', [1, 7, 50, 1024])
+def test_convertuw_matches_full_image(tmpdir, nlines):
+    nr, na = 40, 50
+    rng = np.random.default_rng(0)
+    unw = rng.normal(size=(na, 2*nr)).astype('f4')
+    cc = rng.integers(0, 3, size=(na, nr)).astype('u1')
+    isceUNW = str(tmpdir.join('filt_topophase.unw'))
+    unw.tofile(isceUNW)
+    cc.tofile(isceUNW + '.conncomp')
+    geodat = make_geodat(tmpdir, nr, na)
+
+    convertuw(isceUNW, geodat, nlines=nlines)
+
+    expected = unw[:, nr:].copy()
+    expected[cc == 0] = NODATA
+    uw = np.fromfile(str(tmpdir.join('filt_topophase.uw')), dtype='>f4')
+    np.testing.assert_array_equal(uw.reshape(na, nr), expected)
+
+
+def test_convertuw_truncated_input(tmpdir):
+    nr, na = 40, 50
+    isceUNW = str(tmpdir.join('filt_topophase.unw'))
+    np.zeros((na - 1, 2*nr), dtype='f4').tofile(isceUNW)
+    np.ones((na, nr), dtype='u1').tofile(isceUNW + '.conncomp')
+    geodat = make_geodat(tmpdir, nr, na)
+    with pytest.raises(ValueError):
+        convertuw(isceUNW, geodat, nlines=16)
+
+
+def test_convertuw_bounded_memory(tmpdir):
+    ''' peak RSS should not grow with image size (sparse synthetic input),
+    also with look levels '''
+    nr, na = 4000, 12000  # 384 MB .unw
+    isceUNW = str(tmpdir.join('filt_topophase.unw'))
+    with open(isceUNW, 'wb') as f:
+        f.truncate(nr * 2 * na * 4)
+    with open(isceUNW + '.conncomp', 'wb') as f:
+        f.truncate(nr * na)
+    geodat = make_geodat(tmpdir, nr, na)
+
+    script = ('import sys; from isce2grimp.util.convertuw import convertuw; '
+              'from isce2grimp.util.profiling import peak_rss; '
+              'convertuw(sys.argv[1], sys.argv[2], nlines=256, '
+              'looks=[(2, 2), (4, 4)]); '
+              'print("RSS", peak_rss())')
+    stdout = subprocess.run([sys.executable, '-c', script, isceUNW, geodat],
+                            stdout=subprocess.PIPE, text=True,
+                            check=True).stdout
+    rss = float(stdout.split('RSS')[-1])
+    assert rss < 250
+
+
+def reference_looks(uw, weight, rf, af):
+    ''' weighted looks of the whole image at once '''
+    na, nr = uw.shape
+    uw, weight = uw[:na//af*af, :nr//rf*rf], weight[:na//af*af, :nr//rf*rf]
+    shape = (na//af, af, nr//rf, rf)
+    wsum = weight.reshape(shape).sum(axis=(1, 3))
+    dsum = (uw * weight).reshape(shape).sum(axis=(1, 3))
+    return np.where(wsum > 0, dsum / np.where(wsum > 0, wsum, 1), NODATA)
+
+
+@pytest.mark.parametrize('nlines', [1, 7, 50])
+def test_convertuw_looks(tmpdir, nlines):
+    ''' coarser levels match a weighted mean of the full image, whatever
+    the block size, and look-less pixels are NODATA '''
+    nr, na = 40, 50
+    rng = np.random.default_rng(1)
+    unw = rng.normal(size=(na, 2*nr)).astype('f4')
+    cc = rng.integers(0, 3, size=(na, nr)).astype('u1')
+    # one look of the 2x2 level without connected pixels
+    cc[:2, :2] = 0
+    cor = rng.uniform(0, 1, size=(na, nr)).astype('f4')
+    isceUNW = str(tmpdir.join('filt_topophase.unw'))
+    unw.tofile(isceUNW)
+    cc.tofile(isceUNW + '.conncomp')
+    cor.tofile(str(tmpdir.join('phsig.cor')))
+    geodat = make_geodat(tmpdir, nr, na)
+
+    files = convertuw(isceUNW, geodat, nlines=nlines, looks=[(2, 2), (3, 4)],
+                      coherence=str(tmpdir.join('phsig.cor')))
+    assert [os.path.basename(x) for x in files] == [
+        'filt_topophase.uw', 'filt_topophase.60x12.uw',
+        'filt_topophase.90x24.uw']
+
+    weight = (cc > 0) * cor.astype('f8')
+    for path, (rf, af) in zip(files[1:], [(2, 2), (3, 4)]):
+        uw = np.fromfile(path, dtype='>f4').reshape(na // af, nr // rf)
+        expected = reference_looks(unw[:, nr:].astype('f8'), weight, rf, af)
+        np.testing.assert_allclose(uw, expected, rtol=1e-5, atol=1e-6)
+    uw = np.fromfile(files[1], dtype='>f4').reshape(na // 2, nr // 2)
+    assert uw[0, 0] == NODATA
+
+
+def test_parse_looks():
+    assert parse_looks('2') == (2, 2)
+    assert parse_looks('4x2') == (4, 2)
+    for value in ['0', '2x', 'x2', '2.5']:
+        with pytest.raises(ValueError):
+            parse_looks(value)
@@ -0,0 +1,85 @@
+"""Tests for the GLO-30 to ISCE DEM builder on synthetic tiles."""
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+import rasterio
+
+from pathlib import Path
+from isce2grimp.util import dem
+from .synthetic import height, undulation
+
+
+def test_build_dem(tiles, tmpdir):
+    tiledir, geoid = tiles
+    outname = str(tmpdir.join('glo30_isce.dem.wgs84'))
+    width, length = dem.build_dem([69, 71, -51, -49], 1/30, tiledir=tiledir,
+                                  outname=outname, geoid=geoid, workers=2)
+    assert (width, length) == (60, 60)
+    out = np.fromfile(outname, dtype='<f4').reshape(length, width)
+    lons = -51 + (np.arange(width) + 0.5)/30
+    lats = 71 - (np.arange(length) + 0.5)/30
+    lon2, lat2 = np.meshgrid(lons, lats)
+    expected = height(lon2, lat2) + undulation(lon2, lat2)
+    # bilinear is exact for a linear surface, also across tile seams,
+    # except on the ROI border and next to the missing tile
+    valid = np.ones((60, 60), dtype=bool)
+    valid[[0, -1], :] = valid[:, [0, -1]] = False
+    valid[29:, 29:] = False
+    np.testing.assert_allclose(out[valid], expected[valid], atol=1e-2)
+    # missing tile
+    assert (out[30:, 30:] == -32768).all()
+
+    # same with one process
+    serial = str(tmpdir.join('serial.dem.wgs84'))
+    dem.build_dem([69, 71, -51, -49], 1/30, tiledir=tiledir, outname=serial,
+                  geoid=geoid, workers=1)
+    assert Path(serial).read_bytes() == Path(outname).read_bytes()
+
+
+@pytest.mark.parametrize('n', [30, 60])
+def test_tile_seams(tiles, tmpdir, n):
+    ''' pixels on either side of a seam between two GLO-30 tiles match
+    a single mosaic, each tile uses its neighbours at the edges '''
+    tiledir, geoid = tiles
+    outname = str(tmpdir.join('glo30_isce.dem.wgs84'))
+    width, length = dem.build_dem([69, 71, -51, -49], 1/n, tiledir=tiledir,
+                                  outname=outname, workers=1)
+    out = np.fromfile(outname, dtype='<f4').reshape(length, width)
+    lons = -51 + (np.arange(width) + 0.5)/n
+    lats = 71 - (np.arange(length) + 0.5)/n
+    expected = height(*np.meshgrid(lons, lats))
+    # 70N tiles at 51W | 50W, and 51W tiles at 70N / 69N
+    for seam in [np.s_[1:n - 1, n - 2:n + 2], np.s_[n - 2:n + 2, 1:n - 1]]:
+        np.testing.assert_allclose(out[seam], expected[seam], atol=1e-2)
+
+
+def test_headers(tiles, tmpdir):
+    tiledir, geoid = tiles
+    outname = str(tmpdir.join('glo30_isce.dem.wgs84'))
+    dem.build_dem([69, 71, -51, -49], 1/30, tiledir=tiledir, outname=outname)
+    root = ET.parse(outname + '.xml').getroot()
+    props = {p.get('name'): p.find('value').text
+             for p in root.findall('property')}
+    assert props['width'] == '60' and props['length'] == '60'
+    assert props['data_type'] == 'FLOAT'
+    coords = {c.get('name'): {p.get('name'): float(p.find('value').text)
+                              for p in c.findall('property')
+                              if p.get('name') != 'family'
+                              and p.get('name') != 'name'}
+              for c in root.findall('component')}
+    assert coords['coordinate1']['startingvalue'] == -51
+    assert coords['coordinate2']['startingvalue'] == 71
+    assert np.isclose(coords['coordinate2']['delta'], -1/30)
+
+    with rasterio.open(outname + '.vrt') as src:
+        assert src.bounds == pytest.approx((-51, 69, -49, 71))
+        data = src.read(1)
+        assert src.nodata == -32768
+    assert (data == np.fromfile(outname, dtype='<f4').reshape(60, 60)).all()
+
+
+def test_resolution_must_divide_degree():
+    with pytest.raises(ValueError):
+        dem.pixels_per_degree(0.0007)
+    assert dem.pixels_per_degree(0.000277777777778) == 3600
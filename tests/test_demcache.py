@@ -0,0 +1,67 @@
+"""Tests for the persistent DEM tile cache."""
+import os
+
+import numpy as np
+
+from pathlib import Path
+from isce2grimp.util import dem
+from isce2grimp.util.demcache import demCache
+from .httpstub import serve
+
+ROI = [69, 71, -51, -49]
+
+
+def serve_tiles(tiledir):
+    files = {}
+    for path in Path(tiledir).glob('Copernicus*.tif'):
+        files[f'/{path.stem}/{path.name}'] = path.read_bytes()
+    return serve(files)
+
+
+def test_fetch_and_reuse(tiles, tmpdir):
+    tiledir, geoid = tiles
+    server, url = serve_tiles(tiledir)
+    cache = demCache(tmpdir.join('cache'))
+    n = dem.pixels_per_degree(1/30)
+    try:
+        assert cache.fetch(dem.roi_tiles(ROI), url, n=n, geoid=geoid) == 3
+        # ocean tiles, in the ROI and around it, are remembered
+        ring = {x for tile in dem.roi_tiles(ROI)
+                for x in dem.neighbours(*tile)}
+        assert cache.missing() == {dem.tile_name(*x) for x in ring
+                                   if x not in [(70, -51), (70, -50),
+                                                (69, -51)]}
+        nrequests = len(server.requests)
+        assert cache.fetch(dem.roi_tiles(ROI), url, n=n, geoid=geoid) == 0
+        assert len(server.requests) == nrequests
+
+        outname = str(tmpdir.join('cached.dem.wgs84'))
+        dem.build_dem(ROI, 1/30, outname=outname, geoid=geoid, workers=1,
+                      cache=cache)
+        plain = str(tmpdir.join('plain.dem.wgs84'))
+        dem.build_dem(ROI, 1/30, tiledir=tiledir, outname=plain,
+                      geoid=geoid, workers=1)
+        assert Path(outname).read_bytes() == Path(plain).read_bytes()
+        tileFile = cache.tile_path(70, -51, n, geoid)
+        assert tileFile.is_file()
+        assert not cache.tile_path(69, -50, n, geoid).exists()
+
+        # a neighbouring ROI only needs tiles that were not processed,
+        # processed tiles are used even without their GLO-30 source
+        mtime = tileFile.stat().st_mtime_ns
+        os.remove(cache.raw_path(70, -51))
+        assert cache.fetch(dem.roi_tiles([70, 71, -51, -50]), url, n=n,
+                           geoid=geoid) == 0
+        outname = str(tmpdir.join('neighbour.dem.wgs84'))
+        dem.build_dem([70, 71, -51, -50], 1/30, outname=outname, geoid=geoid,
+                      workers=1, cache=cache)
+        assert tileFile.stat().st_mtime_ns == mtime
+        out = np.fromfile(outname, dtype='<f4').reshape(30, 30)
+        full = np.fromfile(plain, dtype='<f4').reshape(60, 60)
+        assert (out == full[:30, :30]).all()
+
+        # another posting is processed separately
+        assert cache.fetch(dem.roi_tiles([70, 71, -51, -50]), url, n=60,
+                           geoid=geoid) == 1
+    finally:
+        server.shutdown()
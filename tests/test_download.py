@@ -0,0 +1,150 @@
+"""Tests for the native downloader against a local HTTP server."""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from pathlib import Path
+from isce2grimp.cli import download_slcs
+from isce2grimp.util.download import DownloadError, downloader
+from isce2grimp.util.slccache import slcCache
+from .httpstub import serve
+
+KB = 1024
+NAME = '/S1A_IW_SLC__1SDH_20200101T000000_030000_037000_1234.zip'
+
+
+@pytest.fixture
+def data():
+    return np.random.default_rng(0).bytes(1000*KB)
+
+
+@pytest.fixture
+def server(data):
+    server, url = serve({NAME: data})
+    yield server, url
+    server.shutdown()
+
+
+def make_downloader(log, **kwargs):
+    kwargs = dict(dict(connections=4, chunkSize=100*KB, retries=2), **kwargs)
+    return downloader(log=log.append, **kwargs)
+
+
+def test_ranges(tmpdir, server, data):
+    server, url = server
+    dest = str(tmpdir.join('scene.zip'))
+    log = []
+    dl = make_downloader(log)
+    md5 = hashlib.md5(data).hexdigest()
+    assert dl.fetch(url + NAME, dest, len(data), md5) == len(data)
+    assert Path(dest).read_bytes() == data
+    assert not os.path.exists(dest + '.part')
+    assert not os.path.exists(dest + '.part.json')
+    assert len(server.requests) == 10
+    assert all(r is not None for _, r in server.requests)
+    events = [json.loads(x) for x in log]
+    assert events[-1]['event'] == 'done'
+    assert events[-1]['bytes'] == len(data)
+
+    # complete files are skipped
+    assert dl.fetch(url + NAME, dest, len(data), md5) == 0
+    assert json.loads(log[-1])['event'] == 'skip'
+
+
+def test_single_stream(tmpdir, data):
+    server, url = serve({NAME: data}, ranges=False)
+    dest = str(tmpdir.join('scene.zip'))
+    dl = make_downloader([])
+    assert dl.fetch(url + NAME, dest) == len(data)
+    assert Path(dest).read_bytes() == data
+    assert server.requests == [(NAME, None)]
+    server.shutdown()
+
+
+def test_resume(tmpdir, server, data):
+    server, url = server
+    dest = str(tmpdir.join('scene.zip'))
+    # an interrupted download with chunks 0-5 written
+    part = bytearray(len(data))
+    part[:600*KB] = data[:600*KB]
+    Path(dest + '.part').write_bytes(bytes(part))
+    with open(dest + '.part.json', 'w') as f:
+        json.dump(dict(url=url + NAME, total=len(data), chunkSize=100*KB,
+                       done=[0, 1, 2, 3, 4, 5]), f)
+    dl = make_downloader([])
+    assert dl.fetch(url + NAME, dest, len(data),
+                    hashlib.md5(data).hexdigest()) == 400*KB
+    assert Path(dest).read_bytes() == data
+    assert sorted(r for _, r in server.requests) == [
+        f'bytes={i*100*KB}-{(i + 1)*100*KB - 1}' for i in range(6, 10)]
+
+
+def test_retry_dropped_connection(tmpdir, server, data):
+    server, url = server
+    server.drops = 2
+    dest = str(tmpdir.join('scene.zip'))
+    log = []
+    dl = make_downloader(log)
+    dl.fetch(url + NAME, dest, len(data))
+    assert Path(dest).read_bytes() == data
+    assert sum(json.loads(x)['event'] == 'retry' for x in log) == 2
+
+
+def test_checksum_mismatch(tmpdir, server, data):
+    server, url = server
+    dest = str(tmpdir.join('scene.zip'))
+    log = []
+    dl = make_downloader(log)
+    with pytest.raises(DownloadError):
+        dl.fetch(url + NAME, dest, len(data), '0'*32)
+    assert not os.path.exists(dest)
+    error = json.loads(log[-1])
+    assert error['event'] == 'error' and 'md5sum' in error['error']
+    with pytest.raises(DownloadError):
+        dl.fetch(url + NAME, dest, len(data) + 1)
+    with pytest.raises(DownloadError):
+        dl.fetch(url + '/missing.zip', dest)
+
+
+def test_rate_limit(tmpdir, server, data):
+    server, url = server
+    dl = make_downloader([], rateLimit=2000*KB)
+    t0 = time.perf_counter()
+    dl.fetch(url + NAME, str(tmpdir.join('scene.zip')))
+    # one second of burst allowance is not given up front
+    assert time.perf_counter() - t0 >= 0.4
+
+
+def test_cli(tmpdir, server, data):
+    server, url = server
+    links = tmpdir.join('download-links.txt')
+    links.write(f'{url}{NAME}\n{url}/missing.zip\n')
+    outdir = tmpdir.mkdir('out')
+    args = ['-i', str(links), '-d', str(outdir), '-n', '2', '--chunk', '1']
+    assert download_slcs.main(args) == 1
+    assert Path(outdir, NAME[1:]).read_bytes() == data
+
+
+def test_cli_cache_links(tmpdir, server, data):
+    ''' scenes linked from the SLC cache are downloaded into the cache,
+    leaving the links in place '''
+    server, url = server
+    cache = slcCache(tmpdir.join('cache'))
+    outdir = tmpdir.mkdir('out')
+    md5 = hashlib.md5(data).hexdigest()
+    [path] = cache.add([dict(md5sum=md5, fileName=NAME[1:], url=url + NAME,
+                             bytes=len(data))], tmpdir.join('pair'),
+                       links=str(outdir))
+    links = tmpdir.join('download-links.txt')
+    links.write(f'{url}{NAME}\n')
+    args = ['-i', str(links), '-d', str(outdir), '-n', '2', '--chunk', '1']
+    assert download_slcs.main(args) == 0
+    link = Path(outdir, NAME[1:])
+    assert link.is_symlink() and link.resolve() == path
+    assert path.read_bytes() == data
+    assert cache.is_complete(md5)
+    assert os.listdir(path.parent) == [NAME[1:]]
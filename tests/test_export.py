@@ -0,0 +1,82 @@
+"""Tests for the COG and Zarr copies made by convertuw."""
+import numpy as np
+import pytest
+import rasterio
+from rasterio.windows import Window
+
+from isce2grimp.util import geodatrxa
+from isce2grimp.util.convertuw import convertuw, NODATA
+from isce2grimp.util.export import radar_gcps
+from .test_convertuw import make_geodat
+
+
+@pytest.fixture
+def image(tmpdir):
+    ''' synthetic .unw/.conncomp larger than one 512 tile each way '''
+    nr, na = 700, 600
+    rng = np.random.default_rng(2)
+    unw = np.zeros((na, 2*nr), dtype='f4')
+    unw[:, nr:] = np.add.outer(np.linspace(0, 20, na), np.linspace(0, 5, nr))
+    cc = rng.integers(0, 3, size=(na, nr)).astype('u1')
+    isceUNW = str(tmpdir.join('filt_topophase.unw'))
+    unw.tofile(isceUNW)
+    cc.tofile(isceUNW + '.conncomp')
+    return isceUNW, make_geodat(tmpdir, nr, na), nr, na
+
+
+def test_cog(tmpdir, image):
+    ''' a COG with overviews, the same values as the .uw and the geodat
+    in its tags, whatever the block size '''
+    isceUNW, geodat, nr, na = image
+    convertuw(isceUNW, geodat, nlines=100, export=['cog'])
+    uw = np.fromfile(str(tmpdir.join('filt_topophase.uw')),
+                     dtype='>f4').reshape(na, nr)
+    with rasterio.open(str(tmpdir.join('filt_topophase.uw.tif'))) as src:
+        assert src.tags(ns='IMAGE_STRUCTURE')['LAYOUT'] == 'COG'
+        assert src.block_shapes[0] == (512, 512)
+        assert src.overviews(1) == [2]
+        assert src.nodata == NODATA
+        np.testing.assert_array_equal(src.read(1), uw)
+        window = Window(500, 400, 100, 150)
+        np.testing.assert_array_equal(src.read(1, window=window),
+                                      uw[400:550, 500:600])
+        tags = src.tags()
+        assert tags['GEODAT'] == open(geodat).read()
+        assert (int(tags['RANGE_LOOKS']), int(tags['AZIMUTH_LOOKS'])) == (30, 6)
+        gcps, crs = src.gcps
+        assert len(gcps) == 25 and crs.to_epsg() == 4326
+    cc = np.fromfile(isceUNW + '.conncomp', dtype='u1').reshape(na, nr)
+    with rasterio.open(str(tmpdir.join('filt_topophase.conncomp.tif'))) as src:
+        np.testing.assert_array_equal(src.read(1), cc)
+    assert not tmpdir.join('filt_topophase.uw.tif.tmp.tif').exists()
+
+
+def test_gcps_match_geodat_corners(tmpdir):
+    ''' the corner GCPs of the full size test image are the geodat
+    corners (descending: first line and near range is ur) '''
+    georxa = geodatrxa(file=make_geodat(tmpdir, 2218, 2270))
+    gcps = radar_gcps(georxa)
+    ur, ll = gcps[0], gcps[-1]
+    assert (ur.row, ur.col, ll.row, ll.col) == (0.5, 0.5, 2269.5, 2217.5)
+    np.testing.assert_allclose([ur.y, ur.x], georxa.corners[3], atol=1e-3)
+    np.testing.assert_allclose([ll.y, ll.x], georxa.corners[0], atol=1e-3)
+
+
+def test_zarr(tmpdir, image):
+    zarr = pytest.importorskip('zarr')
+    isceUNW, geodat, nr, na = image
+    convertuw(isceUNW, geodat, nlines=100, export=['zarr'])
+    uw = np.fromfile(str(tmpdir.join('filt_topophase.uw')),
+                     dtype='>f4').reshape(na, nr)
+    group = zarr.open_group(str(tmpdir.join('filt_topophase.zarr')), mode='r')
+    assert group['phase'].chunks == (512, 512)
+    np.testing.assert_array_equal(group['phase'][:], uw)
+    np.testing.assert_array_equal(group['phase'][400:550, 500:600],
+                                  uw[400:550, 500:600])
+    assert group.attrs['GEODAT'] == open(geodat).read()
+
+
+def test_unknown_format(tmpdir, image):
+    isceUNW, geodat, nr, na = image
+    with pytest.raises(ValueError, match='export formats'):
+        convertuw(isceUNW, geodat, export=['netcdf'])
@@ -0,0 +1,115 @@
+"""Tests for geodat file geocoding."""
+import os
+import numpy as np
+import pytest
+import rasterio
+
+from pathlib import Path
+from isce2grimp.util import geodatrxa
+
+GEODAT = Path(__file__).parent / 'data' / 'geodat30x6.in'
+
+
+@pytest.fixture
+def geodat():
+    return geodatrxa(file=str(GEODAT))
+
+
+def test_corners_geocode_to_image_edges(geodat):
+    # descending: ur is early near range, ll is late far range
+    ll, lr, ul, ur, center = geodat.corners
+    r, az, t = geodat.llzToRA([ur[0], ll[0]], [ur[1], ll[1]], 0)
+    nearOffset = (geodat.nlr - 1) / 2
+    np.testing.assert_allclose(r[0], nearOffset, atol=1)
+    np.testing.assert_allclose(az[0], 0, atol=1)
+    np.testing.assert_allclose(r[1], geodat.nr*geodat.nlr - 1 - nearOffset,
+                               atol=1)
+    np.testing.assert_allclose(az[1], (geodat.na - 1)*geodat.nla, atol=1)
+
+
+def test_llzToRA_matches_scalar(geodat):
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(68.8, 70.5, 20)
+    lon = rng.uniform(-62, -56, 20)
+    z = rng.uniform(0, 2000, 20)
+    r, az, t = geodat.llzToRA(lat, lon, z)
+    for i in range(len(lat)):
+        rs, azs, ts = geodat.llzPtToRA(lat[i], lon[i], z[i])
+        assert r[i] == pytest.approx(rs, abs=1e-6)
+        assert az[i] == pytest.approx(azs, abs=1e-6)
+        assert t[i] == pytest.approx(ts, abs=1e-9)
+
+
+def test_llzToRA_shape_and_off_orbit(geodat):
+    lat = np.array([[69.7, 69.8], [0.0, 69.9]])
+    r, az, t = geodat.llzToRA(lat, -59.5, 0)
+    assert r.shape == lat.shape
+    assert np.isnan(r[1, 0])
+    assert np.isfinite(r[0]).all()
+
+
+def test_demToRA(geodat, tmpdir):
+    demFile = str(tmpdir.join('dem.tif'))
+    z = np.full((4, 5), 100, dtype='f4')
+    transform = rasterio.transform.from_origin(-60, 70, 0.1, 0.1)
+    with rasterio.open(demFile, 'w', driver='GTiff', height=4, width=5,
+                       count=1, dtype='float32', crs='EPSG:4326',
+                       transform=transform) as dst:
+        dst.write(z, 1)
+    r, az, t = geodat.demToRA(demFile)
+    rs, azs, ts = geodat.llzPtToRA(70 - 0.35, -60 + 0.45, 100)
+    assert r.shape == (4, 5)
+    assert r[3, 4] == pytest.approx(rs, abs=1e-6)
+    assert az[3, 4] == pytest.approx(azs, abs=1e-6)
+
+
+def test_orbit_interpolator(geodat):
+    from isce2grimp.util.orbit import orbitInterpolator
+    t = geodat.stateTime
+    hermite = orbitInterpolator(t, geodat.position, geodat.velocity)
+    cubic = orbitInterpolator(t, geodat.position, geodat.velocity,
+                              kind='cubic')
+    pos, vel = hermite(t)
+    np.testing.assert_allclose(pos, geodat.position)
+    np.testing.assert_allclose(vel, geodat.velocity)
+
+    tm = 0.5 * (t[1:] + t[:-1])
+    np.testing.assert_allclose(hermite.position(tm), cubic.position(tm),
+                               atol=1)
+    np.testing.assert_allclose(hermite.velocity(tm), cubic.velocity(tm),
+                               atol=1e-2)
+
+    pos, vel = hermite(t[3])
+    assert pos.shape == vel.shape == (3,)
+    assert np.isnan(hermite.position(t[-1] + 1)).all()
+
+
+def test_interp_pos_vel(geodat):
+    t = geodat.stateTime[2]
+    assert geodat.interpPos(t) == pytest.approx(list(geodat.position[2]))
+    assert geodat.interpVel(t) == pytest.approx(list(geodat.velocity[2]))
+    assert geodat.interpPos(geodat.stateTime[:4]).shape == (3, 4)
+
+
+def test_geodat_cache(tmpdir):
+    geodatFile = str(tmpdir.join('geodat30x6.in'))
+    with open(GEODAT) as f:
+        text = f.read()
+    with open(geodatFile, 'w') as f:
+        f.write(text)
+    parsed = geodatrxa(file=geodatFile, cache=True)
+    assert os.path.exists(geodatFile + '.cache.json')
+    assert 'llzToEcef' not in vars(parsed)
+
+    cached = geodatrxa(file=geodatFile, cache=True)
+    for key in geodatrxa.cacheFields:
+        np.testing.assert_array_equal(getattr(cached, key),
+                                      getattr(parsed, key))
+    assert cached.llzPtToRA(69.75, -59.5, 0) == parsed.llzPtToRA(69.75,
+                                                                 -59.5, 0)
+
+    # stale sidecar is ignored when the geodat file changes
+    with open(geodatFile, 'w') as f:
+        f.write(text.replace('2218  2270  30  6', '1109  1135  60  12'))
+    changed = geodatrxa(file=geodatFile, cache=True)
+    assert (changed.nr, changed.nla) == (1109, 12)
@@ -0,0 +1,108 @@
+"""Tests for the vectorized zero-Doppler geolocation."""
+import datetime
+
+import numpy as np
+import pytest
+
+from pathlib import Path
+from isce2grimp.util import geodatrxa
+from isce2grimp.util import geolocate
+from isce2grimp.util.orbit import orbitInterpolator
+from .test_metadata import geodat_metadata
+
+GEODAT = Path(__file__).parent / 'data' / 'geodat30x6.in'
+
+
+@pytest.fixture
+def geodat():
+    return geodatrxa(file=str(GEODAT))
+
+
+@pytest.fixture
+def orbit(geodat):
+    return orbitInterpolator(geodat.stateTime, geodat.position,
+                             geodat.velocity)
+
+
+def test_ecef_round_trip():
+    rng = np.random.default_rng(1)
+    lat = rng.uniform(-89.9, 89.9, 1000)
+    lon = rng.uniform(-180, 180, 1000)
+    h = rng.uniform(-500, 9000, 1000)
+    out = geolocate.ecef_to_llh(geolocate.llh_to_ecef(lat, lon, h))
+    np.testing.assert_allclose(out[0], lat, atol=1e-9)
+    np.testing.assert_allclose(out[1], lon, atol=1e-9)
+    np.testing.assert_allclose(out[2], h, atol=1e-4)
+
+
+def test_inverts_geo2rdr(geodat, orbit):
+    ''' rdr2geo then the repo's zero-Doppler llzToRA gives back the same
+    time and range, at the requested height '''
+    rng = np.random.default_rng(0)
+    shape = (50, 40)
+    t = rng.uniform(geodat.t0, geodat.t1, shape)
+    r = rng.uniform(geodat.nearRangem(), geodat.farRangem(), shape)
+    h = rng.uniform(0, 3000, shape)
+    lat, lon, hgt = geolocate.rdr2geo(orbit, t, r, h)
+    assert lat.shape == shape
+    np.testing.assert_allclose(hgt, h, atol=1e-3)
+    rr, _, tt = geodat.llzToRA(lat, lon, hgt)
+    np.testing.assert_allclose(tt, t, atol=1e-5)
+    np.testing.assert_allclose(rr * geodat.slpRg + geodat.rNearSLP, r,
+                               atol=1e-2)
+    # outside the orbit
+    lat, lon, hgt = geolocate.rdr2geo(orbit, geodat.stateTime[-1] + 100,
+                                      geodat.centerRangem())
+    assert np.isnan(lat)
+
+
+def test_corners_match_isce(geodat):
+    ''' geodat30x6.in corners were written by ISCE rdr2geo '''
+    meta = geodat_metadata()
+    # sensing times from the geodat (last line is not on a whole second)
+    t0 = geodat.datetime
+    meta['sensing'] = [(t0 + datetime.timedelta(seconds=x)).isoformat()
+                       for x in (0, 0.5 * (geodat.t1 - geodat.t0),
+                                 geodat.t1 - geodat.t0)]
+    geometry = geolocate.scene_geometry(meta)
+    corners = np.array([geometry[x] for x in ['ll', 'lr', 'ul', 'ur',
+                                              'center']])
+    np.testing.assert_allclose(corners, geodat.corners, atol=2e-5)
+    assert 700e3 < geometry['altitude'] < 720e3
+    assert 30 < geometry['incidenceMid'] < 46
+
+
+def test_incidence(orbit, geodat):
+    t = np.full(3, 0.5 * (geodat.t0 + geodat.t1))
+    r = np.array([geodat.nearRangem(), geodat.centerRangem(),
+                  geodat.farRangem()])
+    lat, lon, h, target, sat, _ = geolocate.rdr2geo(orbit, t, r, full=True)
+    incidence = geolocate.incidence_angle(target, sat, lat, lon)
+    # the normal is the gradient of the ellipsoid equation
+    D = np.array([1 / geolocate.WGS84_A**2, 1 / geolocate.WGS84_A**2,
+                  1 / geolocate.WGS84_B**2])
+    normal = target * D
+    normal /= np.linalg.norm(normal, axis=1, keepdims=True)
+    los = sat - target
+    los /= np.linalg.norm(los, axis=1, keepdims=True)
+    expected = np.degrees(np.arccos(np.sum(normal * los, axis=1)))
+    np.testing.assert_allclose(incidence, expected, atol=1e-6)
+    assert (np.diff(incidence) > 0).all()
+
+
+def test_footprint():
+    meta = geodat_metadata()
+    feature = geolocate.footprint(meta, spacing=5000)
+    ring = np.array(feature['geometry']['coordinates'][0])
+    assert (ring[0] == ring[-1]).all()
+    x, y = ring[:, 0], ring[:, 1]
+    assert np.sum(x[:-1] * y[1:] - x[1:] * y[:-1]) > 0
+    xyz = geolocate.llh_to_ecef(y, x, 0.0)
+    steps = np.linalg.norm(np.diff(xyz, axis=0), axis=1)
+    assert steps.max() <= 5000
+    # corners are on the outline
+    corners = np.array([meta_corner[::-1] for meta_corner in
+                        geolocate.scene_geometry(meta).values()
+                        if isinstance(meta_corner, list)][:4])
+    for corner in corners:
+        assert np.abs(ring - corner).sum(axis=1).min() < 1e-5
@@ -0,0 +1,115 @@
+"""Tests for the per-pixel geometry layers."""
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from pathlib import Path
+from isce2grimp.util import geodatrxa
+from isce2grimp.util import geometry
+
+GEODAT = Path(__file__).parent / 'data' / 'geodat30x6.in'
+
+
+@pytest.fixture
+def geodat():
+    return geodatrxa(file=str(GEODAT))
+
+
+@pytest.fixture
+def short_geodat(tmp_path):
+    ''' the first 100 lines of geodat30x6.in, to keep the tests quick '''
+    path = tmp_path / 'geodat30x6.in'
+    path.write_text(GEODAT.read_text().replace('2218  2270  30  6',
+                                               '2218  100  30  6'))
+    return str(path)
+
+
+def read_layer(path, georxa):
+    return np.fromfile(path, dtype='>f4').reshape(georxa.na, georxa.nr)
+
+
+def test_corners_match_geodat(geodat):
+    ''' first and last line corners at the geodat corners, incidence near
+    the geodat phic (37.5, rounded in this file) '''
+    georxa = geometry._open_geodat(str(GEODAT))
+    first = geometry.pixel_geometry(georxa, 0, 1)
+    last = geometry.pixel_geometry(georxa, geodat.na - 1, geodat.na)
+    # descending and right looking: the first line is north, near range
+    # is east, so ll, lr, ul, ur are late far, late near, early far, early near
+    corners = np.array([[x['lat'][0, i], x['lon'][0, i]] for x, i in
+                        [(last, -1), (last, 0), (first, -1), (first, 0)]])
+    np.testing.assert_allclose(corners, geodat.corners[:4], atol=1e-3)
+    middle = geometry.pixel_geometry(georxa, geodat.na // 2,
+                                     geodat.na // 2 + 1)
+    assert abs(middle['inc'][0, geodat.nr // 2] - geodat.phic) < 1
+
+
+def test_layers(tmp_path, short_geodat):
+    ''' unit look vectors, incidence increasing with range and a
+    southward heading '''
+    georxa = geodatrxa(file=short_geodat)
+    files = geometry.geometry_layers(short_geodat, str(tmp_path / 'geometry'),
+                                     nlines=30, workers=1)
+    assert sorted(files) == sorted(geometry.LAYERS)
+    los = np.stack([read_layer(files[x], georxa)
+                    for x in ['losE', 'losN', 'losU']])
+    np.testing.assert_allclose(np.linalg.norm(los, axis=0), 1, atol=1e-6)
+    inc = read_layer(files['inc'], georxa)
+    assert (np.diff(inc, axis=1) > 0).all()
+    np.testing.assert_allclose(inc, np.degrees(np.arccos(los[2])), atol=1e-4)
+    heading = read_layer(files['heading'], georxa)
+    assert 180 < heading.min() and heading.max() < 270
+    # right looking on a southward pass: the satellite is east of the targets
+    assert (los[0] > 0).all()
+
+
+def test_inverts_geo2rdr(geodat):
+    ''' pixel lat/lon geocode back to their own pixel '''
+    georxa = geometry._open_geodat(str(GEODAT))
+    layers = geometry.pixel_geometry(georxa, 1000, 1010)
+    r, az, _ = geodat.llzToRA(layers['lat'], layers['lon'], 0.0)
+    rows, cols = np.mgrid[1000:1010, 0:geodat.nr]
+    # single look pixels, see llzPtToRA
+    np.testing.assert_allclose((r - (geodat.nlr - 1) / 2) / geodat.nlr,
+                               cols, atol=1e-3)
+    np.testing.assert_allclose(az / geodat.nla, rows, atol=1e-3)
+
+
+def test_workers_match_serial(tmp_path, short_geodat):
+    serial = geometry.geometry_layers(short_geodat, str(tmp_path / 'serial'),
+                                      layers=['inc'], nlines=70, workers=1)
+    pool = geometry.geometry_layers(short_geodat, str(tmp_path / 'pool'),
+                                    layers=['inc'], nlines=30, workers=2)
+    assert (Path(serial['inc']).read_bytes() ==
+            Path(pool['inc']).read_bytes())
+
+
+def test_dem_height(tmp_path, geodat):
+    ''' a flat 1000 m DEM gives targets at 1000 m, matching rdr2geo at
+    a constant height, and nodata falls back to the ellipsoid '''
+    demFile = tmp_path / 'dem.tif'
+    z = np.full((200, 400), 1000, dtype='f4')
+    # no data east of 59W
+    z[:, 240:] = -32768
+    with rasterio.open(demFile, 'w', driver='GTiff', width=400, height=200,
+                       count=1, dtype='float32', crs='EPSG:4326', nodata=-32768,
+                       transform=from_origin(-65, 72, 0.025, 0.025)) as dst:
+        dst.write(z, 1)
+    georxa = geometry._open_geodat(str(GEODAT))
+    layers = geometry.pixel_geometry(georxa, 0, 20, dem=str(demFile))
+    t, r = geometry.pixel_times_ranges(georxa, 0, 20)
+    t, r = np.meshgrid(t, r, indexing='ij')
+    for height, inside in [(1000.0, lambda x: x < -59.1),
+                           (0.0, lambda x: x > -58.9)]:
+        lat, lon, h = geometry.rdr2geo(georxa.orbit, t, r, height=height)
+        mask = inside(lon)
+        assert mask.sum() > 1000
+        np.testing.assert_allclose(layers['lat'][mask], lat[mask], atol=1e-7)
+        np.testing.assert_allclose(layers['lon'][mask], lon[mask], atol=1e-7)
+
+
+def test_unknown_layer(tmp_path):
+    with pytest.raises(ValueError, match='unknown layers'):
+        geometry.geometry_layers(str(GEODAT), str(tmp_path / 'g'),
+                                 layers=['slope'])
@@ -0,0 +1,47 @@
+"""Tests for binary image readers and writers."""
+import numpy as np
+import pytest
+
+import isce2grimp.util as u
+
+
+@pytest.mark.parametrize('dataType', ['f4', '>f4', '>i2', 'u1', '>f8'])
+def test_read_write_roundtrip(tmpdir, dataType):
+    x = (np.arange(12*7).reshape(7, 12) % 100).astype(dataType)
+    fileName = str(tmpdir.join('image'))
+    u.writeImage(fileName, x, dataType)
+    y = u.readImage(fileName, 12, 7, dataType)
+    assert y.dtype.isnative
+    np.testing.assert_array_equal(x, y)
+
+
+def test_mmap_image_is_lazy_big_endian(tmpdir):
+    x = np.arange(20, dtype='f4').reshape(4, 5)
+    fileName = str(tmpdir.join('image'))
+    u.writeImage(fileName, x, '>f4')
+    y = u.mmapImage(fileName, 5, 4, '>f4')
+    assert isinstance(y, np.memmap)
+    assert y.dtype == np.dtype('>f4')
+    np.testing.assert_array_equal(y[1:3], x[1:3])
+
+
+@pytest.mark.parametrize('nlines', [1, 3, 10])
+def test_write_read_blocks(tmpdir, nlines):
+    x = np.random.default_rng(1).normal(size=(10, 6)).astype('f4')
+    fileName = str(tmpdir.join('image'))
+    blocks = (x[i:i+nlines] for i in range(0, 10, nlines))
+    u.writeImageBlocks(fileName, blocks, 6, 10, '>f4')
+    np.testing.assert_array_equal(u.readImage(fileName, 6, 10, '>f4'), x)
+
+    y = np.concatenate([b for _, b in
+                        u.readImageBlocks(fileName, 6, 10, '>f4', nlines)])
+    assert y.dtype.isnative
+    np.testing.assert_array_equal(y, x)
+
+
+def test_write_blocks_wrong_size(tmpdir):
+    fileName = str(tmpdir.join('image'))
+    with pytest.raises(ValueError):
+        u.writeImageBlocks(fileName, [np.zeros((3, 6))], 6, 4, 'f4')
+    with pytest.raises(ValueError):
+        u.writeImageBlocks(fileName, [np.zeros((5, 6))], 6, 4, 'f4')
@@ -0,0 +1,62 @@
+"""Tests for the shared GPKG/GeoParquet inventory reader."""
+import pandas as pd
+import pytest
+
+from isce2grimp.util import inventory
+from .synthetic import make_inventory, write_gpkg
+
+
+@pytest.fixture
+def stores(tmpdir):
+    gpkg = str(tmpdir.join('asf_inventory.gpkg'))
+    store = str(tmpdir.join('asf_inventory.parquet'))
+    write_gpkg(make_inventory(), gpkg)
+    inventory.gpkg_to_parquet(gpkg, store)
+    return gpkg, store
+
+
+@pytest.mark.parametrize('query', [
+    dict(path=83),
+    dict(path=90, frame=202),
+    dict(path=83, start='2020-01-01', end='2020-02-15'),
+    dict(path=90, orbit=[10440, 10615], frame=[201, 203]),
+    dict(start='2019-12-30'),
+])
+def test_parquet_matches_gpkg(stores, tmpdir, query):
+    gpkg, store = stores
+    missing = str(tmpdir.join('missing.parquet'))
+    fromGPKG = inventory.read_inventory(**query, gpkg=gpkg, store=missing)
+    fromParquet = inventory.read_inventory(**query, gpkg=gpkg, store=store)
+    assert len(fromParquet) > 0
+    key = ['startTime', 'sceneName']
+    fromGPKG = fromGPKG.sort_values(key).reset_index(drop=True)
+    fromParquet = fromParquet.sort_values(key).reset_index(drop=True)
+    assert list(fromParquet.sceneName) == list(fromGPKG.sceneName)
+    assert (fromParquet.pathNumber == fromGPKG.pathNumber).all()
+    assert fromParquet.geometry.equals(fromGPKG.geometry)
+
+
+def test_column_projection(stores):
+    gpkg, store = stores
+    gf = inventory.read_inventory(83, columns=['orbit', 'startTime'],
+                                  store=store)
+    assert list(gf.columns) == ['orbit', 'startTime']
+    assert isinstance(gf, pd.DataFrame)
+
+
+def test_write_parquet_appends(stores):
+    gpkg, store = stores
+    new = make_inventory(paths=(83,), start='2020-04-01', nacq=2)
+    # overlapping scene is replaced, not duplicated
+    new = pd.concat([new, inventory.read_inventory(83, store=store).tail(1)])
+    inventory.write_parquet(new, store)
+    gf = inventory.read_inventory(83, store=store)
+    assert len(gf) == 20*5 + 2*5
+    assert gf.sceneName.is_unique
+    assert gf.startTime.is_monotonic_increasing
+
+
+def test_missing_path(stores):
+    gpkg, store = stores
+    with pytest.raises(ValueError):
+        inventory.read_inventory(17, store=store)
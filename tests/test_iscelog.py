@@ -0,0 +1,73 @@
+"""Tests for the streaming isce.log parser."""
+import datetime
+import os
+
+import pytest
+
+from pathlib import Path
+from isce2grimp.util import iscelog
+from .synthetic import LOG_PREFIX, write_isce_log
+
+PRODUCT = '''<productmanager_name>
+    <component name="instance">
+        <property name="numberofbursts">
+            <value>9</value>
+        </property>
+        <property name="ascendingNodeTime">
+            <value>2019-04-14 08:01:20.5</value>
+        </property>
+    </component>
+</productmanager_name>
+'''
+
+
+def test_scan_log(tmpdir):
+    logFile = str(tmpdir.join('isce.log'))
+    write_isce_log(logFile, restarts=2)
+    fields = iscelog.scan_log(logFile)
+    # first occurrence, restarts are ignored
+    assert fields['reference.sensor.ascendingnodetime'] == \
+        '2019-04-14 08:01:23.123456'
+    # the rest of the catalog block is kept
+    assert fields['secondary.sensor.ascendingnodetime'] == \
+        '2019-04-26 08:01:24.5'
+    assert fields['reference.sensor.swaths'] == '[1, 2, 3]'
+    assert 'reference.product.numberofbursts' not in fields
+
+
+def test_early_stop(tmpdir):
+    ''' a value appended after the catalog is never read '''
+    logFile = str(tmpdir.join('isce.log'))
+    write_isce_log(logFile, nfiller=10)
+    with open(logFile, 'a') as f:
+        f.write(f'{LOG_PREFIX}reference.sensor.late = 1\n')
+    assert 'reference.sensor.late' not in iscelog.scan_log(logFile)
+    fields = iscelog.scan_log(logFile, required=['reference.sensor.late'])
+    assert fields['reference.sensor.late'] == '1'
+
+
+def test_product_fallback(tmpdir):
+    intdir = str(tmpdir)
+    write_isce_log(Path(intdir, 'isce.log'), catalog=False)
+    with pytest.raises(ValueError, match='ascendingnodetime not in'):
+        iscelog.read_sensor_metadata(intdir)
+    os.makedirs(Path(intdir, 'fine_coreg'))
+    Path(intdir, 'fine_coreg', 'IW2.xml').write_text(PRODUCT)
+    fields = iscelog.read_sensor_metadata(intdir)
+    assert iscelog.parse_time(fields['reference.sensor.ascendingnodetime']) \
+        == datetime.datetime(2019, 4, 14, 8, 1, 20, 500000)
+
+
+def test_missing_log(tmpdir):
+    with pytest.raises(ValueError, match='isce.log'):
+        iscelog.read_sensor_metadata(str(tmpdir))
+    Path(tmpdir, 'isce.log').write_text('')
+    assert iscelog.scan_log(str(tmpdir.join('isce.log'))) == {}
+
+
+def test_parse_time():
+    assert iscelog.parse_time('2019-04-14 08:01:23') == \
+        datetime.datetime(2019, 4, 14, 8, 1, 23)
+    assert iscelog.parse_time('2019-04-14T08:01:23.5').microsecond == 500000
+    with pytest.raises(ValueError, match='unrecognized'):
+        iscelog.parse_time('')
@@ -0,0 +1,133 @@
+"""Tests for the conversion metadata cache and geodat writer."""
+import datetime
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from pathlib import Path
+from isce2grimp.util import metadata
+from isce2grimp.util.geodatrxa import geodatrxa
+
+GEODAT = Path(__file__).parent / 'data' / 'geodat30x6.in'
+
+
+def geodat_metadata():
+    ''' cached metadata that should reproduce tests/data/geodat30x6.in '''
+    lines = GEODAT.read_text().splitlines()
+    corners = [[float(x) for x in line.split()] for line in lines[33:38]]
+    vectors = [[float(x) for x in line.split()] for line in lines[65:]]
+    t0 = datetime.datetime(2021, 9, 4, 9, 9)
+    return dict(
+        name='S1A_IW_SLC__1SDH_20210904T090950_20210904T091018_039530_04ABED_0000',
+        rlooks=30, alooks=6, width=2218, length=2270,
+        passDirection='DESCENDING', prf=486.48631029955294,
+        sensing=['2021-09-04T09:09:50.000000', '2021-09-04T09:10:04.000000',
+                 '2021-09-04T09:10:18.000000'],
+        ranges=[800033.778649, 877503.362959, 954972.947269],
+        ascendingNodeTime='2021-09-04T08:42:00.000000', frames=[583, 593],
+        geometry=dict(altitude=711300.0, incidenceMid=37.5,
+                      **dict(zip(['ll', 'lr', 'ul', 'ur', 'center'],
+                                 corners))),
+        swaths=[],
+        orbit=dict(time=[(t0 + datetime.timedelta(seconds=10*i)).isoformat()
+                         for i in range(15)],
+                   position=vectors[0::2], velocity=vectors[1::2]))
+
+
+def test_geodat_from_metadata(tmpdir):
+    ''' cached metadata gives the geodat file convert_isce wrote '''
+    metadata.write_geodat_config(metadata.geodat_params(geodat_metadata()),
+                                 str(tmpdir))
+    written = Path(tmpdir, 'geodat30x6.in').read_text()
+    assert written == GEODAT.read_text()
+    geo = geodatrxa(file=str(tmpdir.join('geodat30x6.in')))
+    assert (geo.nr, geo.na) == (2218, 2270)
+
+
+def test_save_load(tmpdir):
+    intdir = str(tmpdir)
+    for source in ['topsApp.xml', 'fine_coreg/IW1.xml']:
+        os.makedirs(Path(intdir, source).parent, exist_ok=True)
+        Path(intdir, source).write_text('')
+    assert metadata.load_metadata(intdir) is None
+    meta = geodat_metadata()
+    metadata.save_metadata(meta, intdir)
+    loaded = metadata.load_metadata(intdir)
+    assert loaded == dict(meta, version=metadata.VERSION)
+
+    # reprocessed products make the cache stale
+    time.sleep(0.01)
+    Path(intdir, 'fine_coreg', 'IW1.xml').write_text('new')
+    assert metadata.load_metadata(intdir) is None
+    metadata.save_metadata(meta, intdir)
+    assert metadata.load_metadata(intdir) is not None
+    # as does another cache version
+    metadata.save_metadata(meta, intdir)
+    path = metadata.metadata_file(intdir)
+    Path(path).write_text(Path(path).read_text().replace(
+        f'"version": {metadata.VERSION}', '"version": 0'))
+    assert metadata.load_metadata(intdir) is None
+
+
+def test_isce_objects():
+    ''' extraction only needs the product and orbit attributes '''
+    t0 = datetime.datetime(2021, 9, 4, 9, 9, 50, 123456)
+    bursts = [SimpleNamespace(
+        sensingStart=t0 + datetime.timedelta(seconds=2.758*i),
+        sensingStop=t0 + datetime.timedelta(seconds=2.758*i + 3.1),
+        rangePixelSize=2.329562, azimuthTimeInterval=0.002055556299999998,
+        passDirection='DESCENDING') for i in range(3)]
+    frame = SimpleNamespace(sensingStart=bursts[0].sensingStart,
+                            sensingStop=bursts[-1].sensingStop,
+                            startingRange=800000.0, farRange=850000.0,
+                            bursts=bursts)
+    swath = metadata.swath_metadata(frame)
+    assert swath['sensingStart'] == '2021-09-04T09:09:50.123456'
+    assert len(swath['bursts']) == 3
+    assert swath['passDirection'] == 'DESCENDING'
+
+    class stateVector:
+        def __init__(self, i):
+            self.i = i
+
+        def getTime(self):
+            return t0 + datetime.timedelta(seconds=10*self.i)
+
+        def getPosition(self):
+            return [1e6*self.i, 2e6, 7e6]
+
+        def getVelocity(self):
+            return [1e3, -7e3, -2e3*self.i]
+
+    orbit = SimpleNamespace(_stateVectors=[stateVector(i) for i in range(4)])
+    meta = dict(orbit=metadata.orbit_metadata(orbit))
+    nvecs, svt0, stateVecs = metadata.statevecs(meta)
+    assert nvecs == 4
+    assert np.isclose(svt0, 9*3600 + 9*60 + 50.123456)
+    assert stateVecs.splitlines()[2] == '1.000000E+06 2.000000E+06 7.000000E+06'
+
+
+def test_multilook_metadata(tmpdir):
+    ''' the pixels of a 3 x 4 coarser geodat are centred on the pixels
+    they average in the original geodat '''
+    meta = geodat_metadata()
+    # the geodat sensing start is where geodatrxa puts the first line
+    metadata.write_geodat_config(metadata.geodat_params(meta), str(tmpdir))
+    coarse = metadata.multilook_metadata(meta, 3, 4)
+    metadata.write_geodat_config(metadata.geodat_params(coarse), str(tmpdir))
+    fine = geodatrxa(file=str(tmpdir.join('geodat30x6.in')))
+    geo = geodatrxa(file=str(tmpdir.join('geodat90x24.in')))
+    assert (geo.nr, geo.na, geo.nlr, geo.nla) == (739, 567, 90, 24)
+    # first look: lines 0-3, pixels 0-2; last look: lines 2264-2267
+    assert np.isclose(geo.t0, fine.t0 + 1.5 * fine.nla / fine.prf, atol=1e-6)
+    assert np.isclose(geo.t1, fine.t0 + 2265.5 * fine.nla / fine.prf,
+                      atol=1e-6)
+    assert np.isclose(geo.nearRangem(),
+                      fine.nearRangem() + fine.nlr * fine.slpRg, atol=1e-3)
+    assert np.isclose(geo.farRangem(),
+                      fine.nearRangem() + 2215 * fine.nlr * fine.slpRg,
+                      atol=1e-3)
+    # corners of the truncated image, still near the original ones
+    np.testing.assert_allclose(geo.corners, fine.corners, atol=0.05)
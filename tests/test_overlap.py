@@ -0,0 +1,38 @@
+"""Tests for the STRtree frame-overlap index."""
+import numpy as np
+import pandas as pd
+
+from isce2grimp.util.overlap import overlapIndex
+from .synthetic import make_inventory
+
+
+def brute_force(gf, ref):
+    return gf.geometry.map(lambda x: x.intersection(ref).area/ref.area)
+
+
+def test_fractions_match_brute_force():
+    gf = make_inventory(paths=(83,), nacq=30, nframes=5, jitter=0.8)
+    index = overlapIndex(gf)
+    for i in [0, 7, 42, 149]:
+        ref = gf.geometry.iloc[i]
+        overlap = index.fractions(ref)
+        assert overlap.index.equals(gf.index)
+        np.testing.assert_allclose(overlap, brute_force(gf, ref))
+        assert overlap.iloc[i] == 1.0
+
+
+def test_long_stack_time_range():
+    # 300 acquisitions x 5 frames, far beyond the old 200 row window
+    gf = make_inventory(paths=(90,), nacq=300, nframes=5, jitter=0.8)
+    index = overlapIndex(gf)
+    ref = gf.geometry.iloc[2]
+    selected = index.select(ref, minOverlap=0.1)
+    expected = brute_force(gf, ref) >= 0.1
+    assert list(selected.index) == list(gf.index[expected])
+    assert selected.orbit.nunique() == 300
+
+    start, end = pd.Timestamp('2020-06-01'), pd.Timestamp('2020-12-31')
+    selected = index.select(ref, start=start, end=end)
+    inRange = gf.startTime.between(start, end)
+    assert list(selected.index) == list(gf.index[expected & inRange])
+    assert (selected.overlap >= 0.1).all()
@@ -0,0 +1,103 @@
+"""Tests for pipelined SLC download and processing."""
+import json
+import os
+import sys
+import threading
+import time
+
+from pathlib import Path
+from isce2grimp.util import dinosar
+from isce2grimp.util.pipeline import pipelineQueue, required_scenes
+
+# fails unless every SAFE zip in topsApp.xml is present
+DUMMY = '''
+import sys
+from isce2grimp.util.pipeline import required_scenes
+import os
+sys.exit(any(not os.path.exists(x) for _, x in required_scenes('.')))
+'''
+URL = 'https://datapool.asf.alaska.edu/SLC/SA'
+
+
+def make_stack(tmpdir, orbits):
+    ''' prep_stack layout, pairs of consecutive orbits sharing zips '''
+    tmpData = Path(tmpdir, 'tmp-data-90')
+    tmpData.mkdir()
+    names = {x: f'S1A_IW_SLC__1SDH_{x}.zip' for x in orbits}
+    with open(Path(tmpData, 'download-links.txt'), 'w') as f:
+        f.write('\n'.join(f'{URL}/{x}' for x in names.values()))
+    dirs = []
+    for ref, sec in zip(orbits, orbits[1:]):
+        intdir = Path(tmpdir, f'90-227-{ref}-{sec}')
+        intdir.mkdir()
+        inputDict = dict(topsinsar=dict(
+            reference=dict(safe=[f'../tmp-data-90/{names[ref]}']),
+            secondary=dict(safe=[f'../tmp-data-90/{names[sec]}'])))
+        dinosar.write_xml(dinosar.dict2xml(inputDict),
+                          outname=Path(intdir, 'topsApp.xml'))
+        dirs.append(str(intdir))
+    return dirs
+
+
+class fakeFetch:
+
+    def __init__(self, fail=(), flaky=()):
+        self.calls = []
+        self.fail = fail
+        self.flaky = set(flaky)
+        self.lock = threading.Lock()
+
+    def __call__(self, url, dest, size=None, md5=None):
+        with self.lock:
+            self.calls.append(url)
+            if os.path.basename(url) in self.flaky:
+                self.flaky.remove(os.path.basename(url))
+                raise ConnectionError('reset by peer')
+        if os.path.basename(url) in self.fail:
+            raise ConnectionError('not found')
+        time.sleep(0.05)
+        with open(dest, 'wb') as f:
+            f.write(b'x' * 1000)
+        return 1000
+
+
+def make_queue(tmpdir, dirs, fetch, **kwargs):
+    cpu = sorted(os.sched_getaffinity(0))[0]
+    return pipelineQueue(dirs, f'{sys.executable} -c "{DUMMY}"',
+                         fetch=fetch, backoff=0.01, sockets=[[cpu]], cpus=1,
+                         memory=0, poll=0.02,
+                         stateFile=str(tmpdir.join('state.json')),
+                         statsFile=str(tmpdir.join('stats.json')), **kwargs)
+
+
+def test_required_scenes(tmpdir):
+    dirs = make_stack(tmpdir, [13416, 13591])
+    scenes = required_scenes(dirs[0])
+    assert [x for x, _ in scenes] == [f'{URL}/S1A_IW_SLC__1SDH_13416.zip',
+                                      f'{URL}/S1A_IW_SLC__1SDH_13591.zip']
+    assert scenes[0][1] == str(Path(tmpdir, 'tmp-data-90',
+                                    'S1A_IW_SLC__1SDH_13416.zip'))
+
+
+def test_pipeline_shared_scenes(tmpdir):
+    orbits = [13416, 13591, 13766, 13941, 14116]
+    dirs = make_stack(tmpdir, orbits)
+    fetch = fakeFetch(flaky=['S1A_IW_SLC__1SDH_13766.zip'])
+    state = make_queue(tmpdir, dirs, fetch, prefetch=2).run()
+    assert all(state[x]['status'] == 'done' for x in dirs)
+    # 5 scenes for 4 pairs, one retried
+    assert len(fetch.calls) == len(orbits) + 1
+    with open(tmpdir.join('stats.json')) as f:
+        stats = json.load(f)
+    assert stats['downloadBytes'] == 1000*len(orbits)
+    assert max(x['downloads'] for x in stats['samples']) <= 4
+    assert stats['allocatedCpuSeconds'] > 0
+
+
+def test_failed_download_only_blocks_its_pairs(tmpdir):
+    dirs = make_stack(tmpdir, [13416, 13591, 13766, 13941])
+    fetch = fakeFetch(fail=['S1A_IW_SLC__1SDH_13416.zip'])
+    state = make_queue(tmpdir, dirs, fetch, prefetch=1,
+                       downloadRetries=1).run()
+    assert [state[x]['status'] for x in dirs] == ['failed', 'done', 'done']
+    assert 'not found' in state[dirs[0]]['error']
@@ -0,0 +1,105 @@
+"""Tests for batch stack planning against prep_stack."""
+import os
+import sys
+import yaml
+import pytest
+
+from pathlib import Path
+from isce2grimp.cli import plan_stacks, prep_stack
+from isce2grimp.util import inventory, planner
+from .synthetic import make_inventory, write_gpkg
+
+JOBS = [dict(path=90, frame=202, start='2020-01-01', npairs=3),
+        dict(path=90, frame=203, start='2020-01-01', end='2020-03-01',
+             jump=2, npairs=10),
+        dict(path=83, frame=201, reference=10783, npairs=2, match_frame=True)]
+
+
+@pytest.fixture
+def gf():
+    return make_inventory(nacq=30, jitter=0.8)
+
+
+def run_prep_stack(gf, job, monkeypatch):
+    layer = gf[gf.pathNumber == job['path']].reset_index(drop=True)
+    monkeypatch.setattr(prep_stack, 'read_inventory', lambda *a, **k: layer)
+    argv = ['prep_stack', '-p', str(job['path']), '-f', str(job['frame']),
+            '-n', str(job['npairs']), '-j', str(job.get('jump', 0))]
+    if 'start' in job:
+        argv += ['-s', job['start']]
+    if 'end' in job:
+        argv += ['-e', job['end']]
+    if 'reference' in job:
+        argv += ['-r', str(job['reference'])]
+    if job.get('match_frame'):
+        argv += ['-m']
+    monkeypatch.setattr(sys, 'argv', argv)
+    prep_stack.main()
+
+
+def test_plan_matches_prep_stack(gf, tmpdir, monkeypatch):
+    layers = {path: x.reset_index(drop=True)
+              for path, x in gf.groupby('pathNumber')}
+    plan = planner.plan_jobs(JOBS, layers)
+    assert plan.intdir.is_unique
+
+    planned = Path(tmpdir, 'planned')
+    planned.mkdir()
+    planner.write_plan(plan, planned)
+    stacked = Path(tmpdir, 'stacked')
+    stacked.mkdir()
+    monkeypatch.chdir(stacked)
+    for job in JOBS:
+        run_prep_stack(gf, job, monkeypatch)
+
+    assert sorted(os.listdir(planned)) == sorted(os.listdir(stacked))
+    for name in os.listdir(stacked):
+        for fname in ['topsApp.xml', 'download-links.txt']:
+            if Path(stacked, name, fname).exists():
+                assert (Path(planned, name, fname).read_text()
+                        == Path(stacked, name, fname).read_text())
+
+
+def test_cli_dry_run(gf, tmpdir, capsys):
+    gpkg = str(tmpdir.join('asf_inventory.gpkg'))
+    write_gpkg(gf, gpkg)
+    config = str(tmpdir.join('jobs.yml'))
+    with open(config, 'w') as f:
+        yaml.dump(dict(npairs=2, jobs=[dict(path=90, frame=202,
+                                            start='2020-01-01'),
+                                       dict(path=90, frame=202,
+                                            start='2020-01-01', npairs=3)]),
+                  f)
+    outdir = str(tmpdir.join('out'))
+    plan_stacks.main([config, '--dry-run', '-o', outdir, '--gpkg', gpkg,
+                      '--parquet', str(tmpdir.join('missing'))])
+    out = capsys.readouterr().out
+    # the first job's pairs are a subset of the second's
+    assert '3 pairs' in out
+    assert '90-202-11140-11315' in out
+    assert not Path(outdir).exists()
+
+
+@pytest.mark.parametrize('parquet', [False, True])
+def test_load_inventory_reads_job_paths(tmpdir, monkeypatch, parquet):
+    ''' only the relative orbits the jobs use are read '''
+    gf = make_inventory(paths=(17, 83, 90), nacq=10)
+    gpkg = str(tmpdir.join('asf_inventory.gpkg'))
+    store = str(tmpdir.join('asf_inventory.parquet'))
+    write_gpkg(gf, gpkg)
+    if parquet:
+        inventory.gpkg_to_parquet(gpkg, store)
+    paths = []
+
+    def read_inventory(path=None, **kwargs):
+        paths.append(path)
+        return inventory.read_inventory(path, **kwargs)
+
+    monkeypatch.setattr(planner, 'read_inventory', read_inventory)
+    layers = planner.load_inventory(JOBS, gpkg=gpkg, store=store)
+    assert paths == [83, 90]
+    assert sorted(layers) == [83, 90]
+    # the reference orbit job has no start date
+    for path, layer in layers.items():
+        assert len(layer) == (gf.pathNumber == path).sum()
+        assert layer.startTime.is_monotonic_increasing
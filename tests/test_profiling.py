@@ -0,0 +1,54 @@
+"""Tests for the stage timer and cProfile helper."""
+import json
+import pstats
+import time
+
+import numpy as np
+import pytest
+
+from isce2grimp.util.profiling import profiled, stageTimer
+
+
+def busy(seconds):
+    t0 = time.process_time()
+    while time.process_time() - t0 < seconds:
+        np.sqrt(np.arange(1000.0)).sum()
+
+
+def test_stages(tmpdir):
+    timer = stageTimer()
+    with timer.stage('sleep'):
+        time.sleep(0.2)
+    with timer.stage('compute'):
+        busy(0.2)
+    with timer.stage('allocate'):
+        data = np.ones(50 * 1024**2 // 8)
+        data += 1
+    with pytest.raises(ValueError):
+        with timer.stage('fail'):
+            raise ValueError('bad')
+    path = str(tmpdir.join('out', 'stages.json'))
+    timer.save(path)
+
+    with open(path) as f:
+        report = json.load(f)
+    stages = {s['name']: s for s in report['stages']}
+    assert list(stages) == ['sleep', 'compute', 'allocate', 'fail']
+    assert stages['sleep']['wall'] >= 0.2 and stages['sleep']['cpu'] < 0.1
+    assert stages['compute']['cpu'] >= 0.2
+    # earlier tests in the same process may have set a higher peak
+    assert stages['allocate']['peakRSS'] >= 50
+    assert all(s['peakRSSIncrease'] >= 0 for s in stages.values())
+    assert stages['fail']['error'] == 'ValueError: bad'
+    assert report['wall'] >= sum(s['wall'] for s in report['stages'])
+    assert 'compute' in timer.summary()
+
+
+def test_profiled(tmpdir):
+    path = str(tmpdir.join('run.prof'))
+    with profiled(path):
+        busy(0.05)
+    stats = pstats.Stats(path)
+    assert any(name == 'busy' for _, _, name in stats.stats)
+    with profiled(None) as profile:
+        assert profile is None
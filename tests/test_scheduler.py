@@ -0,0 +1,129 @@
+"""Tests for the run_isce --queue scheduler with a stand-in topsApp."""
+import json
+import os
+import subprocess
+import sys
+import time
+import pytest
+
+from pathlib import Path
+from types import SimpleNamespace
+from isce2grimp.cli import run_isce
+from isce2grimp.util import scheduler
+
+# records its environment and affinity, exits with the code in exitcode.txt
+DUMMY = '''
+import json, os, sys, time
+time.sleep(0.2)
+cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+with open('dummy.json', 'w') as f:
+    json.dump(dict(omp=os.environ['OMP_NUM_THREADS'],
+                   places=os.environ['OMP_PLACES'], cpus=cpus,
+                   start=time.time()), f)
+code = int(open('exitcode.txt').read()) if os.path.exists('exitcode.txt') else 0
+sys.exit(code)
+'''
+
+
+def make_dirs(tmpdir, n, fail=()):
+    dummy = Path(tmpdir, 'topsApp_dummy.py')
+    dummy.write_text(DUMMY)
+    dirs = []
+    for i in range(n):
+        intdir = Path(tmpdir, f'90-227-{13416 + i}-{13591 + i}')
+        intdir.mkdir()
+        if i in fail:
+            Path(intdir, 'exitcode.txt').write_text('3')
+        dirs.append(str(intdir))
+    return dirs, f'{sys.executable} {dummy}'
+
+
+def test_topology():
+    sockets = scheduler.topology()
+    cpus = [x for socket in sockets for x in socket]
+    assert len(cpus) == len(set(cpus)) > 0
+
+
+def test_allocate_packs_sockets(tmpdir):
+    queue = scheduler.jobQueue([], 'true', cpus=3, sockets=[[0, 1, 2, 3],
+                                                          [4, 5, 6, 7]],
+                               stateFile=str(tmpdir.join('state.json')))
+    assert queue.maxJobs == 2
+    first = queue.allocate()
+    second = queue.allocate()
+    assert first == [0, 1, 2] and second == [4, 5, 6]
+    # 2 left over, one on each socket
+    assert queue.allocate() is None
+    queue.release(first)
+    assert queue.free == [[0, 1, 2, 3], [7]]
+
+
+def test_queue_runs_all(tmpdir):
+    dirs, command = make_dirs(tmpdir, 4, fail=(2,))
+    stateFile = str(tmpdir.join('state.json'))
+    cpu = sorted(os.sched_getaffinity(0))[0]
+    queue = scheduler.jobQueue(dirs, command, cpus=1, maxJobs=2,
+                               sockets=[[cpu]], stateFile=stateFile,
+                               memory=0, poll=0.05)
+    state = queue.run()
+    with open(stateFile) as f:
+        assert json.load(f) == state
+    assert [state[x]['status'] for x in dirs] == ['done', 'done', 'failed',
+                                                  'done']
+    assert state[dirs[2]]['returncode'] == 3
+    for intdir in dirs:
+        with open(Path(intdir, 'dummy.json')) as f:
+            job = json.load(f)
+        assert job['omp'] == '1' and job['places'] == f'{{{cpu}}}'
+        assert job['cpus'] == [cpu]
+    # one CPU, so jobs never overlap
+    spans = sorted((state[x]['start'], state[x]['end']) for x in dirs)
+    assert all(a[1] <= b[0] for a, b in zip(spans, spans[1:]))
+
+
+@pytest.mark.parametrize('grown, started', [(0, 2), (8, 4), (16, 6)])
+def test_memory_reserved_per_job(tmpdir, monkeypatch, grown, started):
+    ''' jobs that have not grown yet count against free memory, fully
+    grown jobs are already out of MemAvailable '''
+    monkeypatch.setattr(scheduler, 'available_memory',
+                        lambda: 40 * scheduler.GB)
+    monkeypatch.setattr(scheduler, 'process_rss',
+                        lambda pid: grown * scheduler.GB)
+    queue = scheduler.jobQueue([], 'true', cpus=1, maxJobs=6,
+                               sockets=[[x] for x in range(8)],
+                               stateFile=str(tmpdir.join('state.json')),
+                               memory=16 * scheduler.GB)
+    n = 0
+    while queue.can_start():
+        queue.running[f'job{n}'] = (SimpleNamespace(pid=n), queue.allocate())
+        n += 1
+    assert n == started
+
+
+def test_process_rss():
+    ''' a shell's resident size includes the command it runs '''
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'import subprocess, sys; subprocess.run('
+         '[sys.executable, "-c", "import time; x = bytearray(200 * 2**20); '
+         'time.sleep(2)"])'])
+    time.sleep(1)
+    try:
+        assert scheduler.process_rss(process.pid) > 200 * 2**20
+    finally:
+        process.wait()
+
+
+def test_cli_resume(tmpdir):
+    dirs, command = make_dirs(tmpdir, 3, fail=(1,))
+    stateFile = str(tmpdir.join('state.json'))
+    args = ['--queue', *dirs, '-n', '1', '--mem', '0', '--state', stateFile,
+            '--command', command]
+    assert run_isce.main(args) == 1
+
+    os.remove(Path(dirs[1], 'exitcode.txt'))
+    for intdir in dirs:
+        os.remove(Path(intdir, 'dummy.json'))
+    assert run_isce.main(args) == 0
+    # only the failed directory ran again
+    assert [Path(x, 'dummy.json').exists() for x in dirs] == [False, True,
+                                                             False]
@@ -0,0 +1,114 @@
+"""Tests for the shared content-addressed SLC cache."""
+import hashlib
+import os
+import time
+
+from pathlib import Path
+from isce2grimp.util import planner
+from isce2grimp.util.pipeline import required_scenes
+from isce2grimp.util.slccache import slcCache
+from .synthetic import make_inventory
+
+
+def scene(i, nbytes=100):
+    name = f'S1A_IW_SLC__1SDH_{i:06d}'
+    return dict(md5sum=f'{i:032x}', fileName=f'{name}.zip',
+                url=f'https://datapool.asf.alaska.edu/SLC/SA/{name}.zip',
+                bytes=nbytes)
+
+
+def download(cache, md5, nbytes=100):
+    entry = cache.read_index()[md5]
+    with open(cache.path(md5, entry['fileName']), 'wb') as f:
+        f.write(b'x' * nbytes)
+
+
+def test_references_and_links(tmpdir):
+    cache = slcCache(tmpdir.join('cache'))
+    links = Path(tmpdir, 'tmp-data-90')
+    links.mkdir()
+    cache.add([scene(1), scene(2)], tmpdir.join('pair12'), links=links)
+    cache.add([scene(2), scene(3)], tmpdir.join('pair23'), links=links)
+    index = cache.read_index()
+    assert len(index) == 3
+    assert len(index[scene(2)['md5sum']]['refs']) == 2
+    link = Path(links, scene(2)['fileName'])
+    assert link.is_symlink()
+    assert link.resolve() == cache.path(scene(2)['md5sum'],
+                                        scene(2)['fileName'])
+    assert not cache.is_complete(scene(2)['md5sum'])
+    download(cache, scene(2)['md5sum'])
+    assert cache.is_complete(scene(2)['md5sum'])
+    assert link.read_bytes() == b'x' * 100
+
+
+def test_existing_files_are_kept(tmpdir):
+    ''' a downloaded zip already in tmp-data moves into the cache, a file
+    that does not match is left alone '''
+    cache = slcCache(tmpdir.join('cache'))
+    links = Path(tmpdir, 'tmp-data-90')
+    links.mkdir()
+    data = b'SAFE zip'
+    good = dict(scene(1), md5sum=hashlib.md5(data).hexdigest(),
+                bytes=len(data))
+    Path(links, good['fileName']).write_bytes(data)
+    Path(links, scene(2)['fileName']).write_bytes(b'partial')
+    cache.add([good, scene(2)], tmpdir.join('pair12'), links=links)
+
+    link = Path(links, good['fileName'])
+    assert link.is_symlink() and link.read_bytes() == data
+    assert cache.is_complete(good['md5sum']) and cache.verify(good['md5sum'])
+    other = Path(links, scene(2)['fileName'])
+    assert not other.is_symlink() and other.read_bytes() == b'partial'
+    assert not cache.path(scene(2)['md5sum'], scene(2)['fileName']).exists()
+
+    # linking again (another pair) changes nothing
+    cache.add([good, scene(2)], tmpdir.join('pair23'), links=links)
+    assert link.is_symlink() and other.read_bytes() == b'partial'
+
+
+def test_evict_unreferenced_lru(tmpdir):
+    cache = slcCache(tmpdir.join('cache'))
+    for i in range(4):
+        cache.add([scene(i)], tmpdir.join(f'pair{i}'))
+        download(cache, scene(i)['md5sum'])
+        time.sleep(0.01)
+    assert cache.size() == 400
+    # nothing is evicted while every pair still needs its scene
+    assert cache.evict(0) == []
+    for i in [2, 0, 1]:
+        cache.release(tmpdir.join(f'pair{i}'))
+        time.sleep(0.01)
+    assert cache.evict(250) == [scene(2)['md5sum'], scene(0)['md5sum']]
+    assert cache.size() == 200
+    assert not cache.path(scene(2)['md5sum'], scene(2)['fileName']).exists()
+    assert sorted(cache.read_index()) == [scene(1)['md5sum'],
+                                          scene(3)['md5sum']]
+
+
+def test_verify(tmpdir):
+    cache = slcCache(tmpdir.join('cache'))
+    data = b'SAFE zip'
+    md5 = hashlib.md5(data).hexdigest()
+    cache.add([dict(scene(1), md5sum=md5, bytes=len(data))], tmpdir)
+    path = cache.path(md5, scene(1)['fileName'])
+    path.write_bytes(data)
+    assert cache.verify(md5)
+    path.write_bytes(b'SAFE zap')
+    assert not cache.verify(md5)
+
+
+def test_plan_links_through_cache(tmpdir):
+    gf = make_inventory(paths=(90,), nacq=6)
+    layers = {90: gf}
+    plan = planner.plan_jobs([dict(path=90, frame=202, start='2019-12-01',
+                                   npairs=2)], layers)
+    cache = slcCache(tmpdir.join('cache'))
+    planner.write_plan(plan, tmpdir, cache=cache)
+    intdir = Path(tmpdir, plan.intdir[0])
+    scenes = required_scenes(intdir)
+    index = cache.read_index()
+    for url, dest in scenes:
+        md5 = [k for k, v in index.items() if v['url'] == url][0]
+        assert dest == str(cache.path(md5, os.path.basename(url)))
+        assert str(intdir.resolve()) in index[md5]['refs']
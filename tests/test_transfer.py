@@ -0,0 +1,116 @@
+"""Tests for the parallel, manifest checked product transfer."""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from pathlib import Path
+from isce2grimp.util import transfer as t
+
+
+@pytest.fixture
+def sources(tmpdir):
+    ''' a few files of different sizes, one in a subdirectory '''
+    src = Path(tmpdir, 'int')
+    os.makedirs(src / 'merged')
+    rng = np.random.default_rng(0)
+    files = []
+    for name, size in [('isce.log', 1000), ('topsApp.xml', 10),
+                       ('merged/filt_topophase.unw', 3 * 2**20 + 5)]:
+        Path(src, name).write_bytes(rng.bytes(size))
+        files.append((str(Path(src, name)), name))
+    return files
+
+
+def sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def test_transfer_and_manifest(tmpdir, sources):
+    dest = Path(tmpdir, 'out')
+    rows = t.transfer(sources + [(str(Path(tmpdir, 'nohup.out')),
+                                  'nohup.out')], dest, workers=2, log=None)
+    status = {r['file']: r['status'] for r in rows}
+    assert status['nohup.out'] == 'missing'
+    # tmpfs and most test filesystems cannot clone
+    assert {status[x] for _, x in sources} <= {'copied', 'reflinked'}
+    manifest = json.loads(Path(dest, t.MANIFEST).read_text())
+    for source, name in sources:
+        assert Path(dest, name).read_bytes() == Path(source).read_bytes()
+        assert manifest[name]['sha256'] == sha256(source)
+        assert manifest[name]['bytes'] == os.path.getsize(source)
+        # copystat keeps the source mtime
+        assert os.path.getmtime(Path(dest, name)) == os.path.getmtime(source)
+    assert 'nohup.out' not in manifest
+    assert not list(dest.rglob('.*.tmp'))
+
+
+def test_skip_unchanged(tmpdir, sources):
+    dest = Path(tmpdir, 'out')
+    t.transfer(sources, dest, log=None)
+    rows = t.transfer(sources, dest, log=None)
+    assert {r['status'] for r in rows} == {'skipped'}
+
+    # touched but the same content: skipped, new mtime recorded
+    log = sources[0][0]
+    os.utime(log, (time.time() + 10, time.time() + 10))
+    rows = t.transfer(sources, dest, log=None)
+    assert {r['status'] for r in rows} == {'skipped'}
+    manifest = t.load_manifest(dest)
+    assert manifest['isce.log']['mtime'] == os.stat(log).st_mtime
+
+    # changed content, or a deleted copy, is transferred again
+    Path(log).write_bytes(b'new log')
+    os.remove(Path(dest, 'topsApp.xml'))
+    rows = t.transfer(sources, dest, log=None)
+    copied = sorted(r['file'] for r in rows if r['status'] != 'skipped')
+    assert copied == ['isce.log', 'topsApp.xml']
+    assert Path(dest, 'isce.log').read_bytes() == b'new log'
+    assert t.load_manifest(dest)['isce.log']['sha256'] == sha256(log)
+
+
+def test_hardlink(tmpdir, sources):
+    dest = Path(tmpdir, 'out')
+    rows = t.transfer(sources, dest, hardlink=True, log=None)
+    for row, (source, name) in zip(rows, sources):
+        if row['status'] == 'hardlinked':
+            assert os.path.samefile(source, Path(dest, name))
+        else:
+            assert row['status'] == 'reflinked'
+
+
+def test_failure_reported(tmpdir, sources):
+    ''' a failed file does not stop the others and is not in the manifest '''
+    dest = Path(tmpdir, 'out')
+    os.makedirs(Path(dest, 'isce.log'))
+    rows = t.transfer(sources, dest, log=None)
+    status = {r['file']: r for r in rows}
+    assert status['isce.log']['status'] == 'failed'
+    assert status['isce.log']['error']
+    assert status['topsApp.xml']['status'] in ('copied', 'reflinked')
+    assert 'isce.log' not in t.load_manifest(dest)
+    assert 'failed: isce.log' in t.format_transfer(rows)
+
+
+def test_zstd(tmpdir, sources):
+    zstandard = pytest.importorskip('zstandard')
+    dest = Path(tmpdir, 'out')
+    rows = t.transfer(sources, dest, compress=['merged/*'],
+                      minCompress=2**20, log=None)
+    status = {r['file']: r['status'] for r in rows}
+    assert status['merged/filt_topophase.unw'] == 'compressed'
+    assert status['isce.log'] != 'compressed'
+    stored = Path(dest, 'merged', 'filt_topophase.unw.zst')
+    source = sources[2][0]
+    with open(stored, 'rb') as f:
+        data = zstandard.ZstdDecompressor().stream_reader(f).read()
+    assert data == Path(source).read_bytes()
+    manifest = t.load_manifest(dest)['merged/filt_topophase.unw']
+    assert manifest['stored'] == 'filt_topophase.unw.zst'
+    assert manifest['sha256'] == sha256(source)
+    rows = t.transfer(sources, dest, compress=['merged/*'],
+                      minCompress=2**20, log=None)
+    assert {r['status'] for r in rows} == {'skipped'}
@@ -0,0 +1,224 @@
+"""Tests for concurrent, resumable inventory updates against a stub ASF API."""
+import json
+import os
+import threading
+import time
+import fiona
+import geopandas as gpd
+import pandas as pd
+import pytest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from isce2grimp.cli import update_inventory
+from .synthetic import make_inventory
+
+
+def canned_features():
+    ''' synthetic scenes as ASF search GeoJSON (string dates) '''
+    gf = make_inventory(start='2019-12-01', nacq=20)
+    for col in ['processingDate', 'startTime', 'stopTime']:
+        gf[col] = gf[col].dt.strftime('%Y-%m-%dT%H:%M:%S.000000Z')
+    return json.loads(gf.to_json())['features']
+
+
+class StubASF(BaseHTTPRequestHandler):
+    features = []
+    requests = []
+    fail = set()
+    # silently return at most cap results, whatever maxResults is
+    cap = None
+    # windows longer than slowDays around these dates never answer in time
+    slow = set()
+    slowDays = 20
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        start, end = pd.Timestamp(params['start']), pd.Timestamp(params['end'])
+        self.requests.append((start, end))
+        if any(start <= pd.Timestamp(x) < end for x in self.fail):
+            self.send_response(500)
+            self.end_headers()
+            return
+        if end - start > pd.Timedelta(days=self.slowDays) and \
+                any(start <= pd.Timestamp(x) < end for x in self.slow):
+            time.sleep(2)
+            self.close_connection = True
+            return
+        selected = [f for f in self.features
+                    if start <= pd.Timestamp(f['properties']['startTime'])
+                    .tz_localize(None) <= end]
+        # like ASF, newest first and cut at maxResults
+        selected = sorted(selected, reverse=True,
+                          key=lambda f: f['properties']['startTime'])
+        selected = selected[:int(params.get('maxResults', 2000))]
+        selected = selected[:self.cap]
+        body = json.dumps(dict(type='FeatureCollection',
+                               features=selected)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/geo+json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_asf():
+    StubASF.features = canned_features()
+    StubASF.requests = []
+    StubASF.fail = set()
+    StubASF.slow = set()
+    StubASF.cap = None
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubASF)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield StubASF, f'http://127.0.0.1:{server.server_port}/search'
+    server.shutdown()
+
+
+def read_layers(gpkg):
+    return {layer: gpd.read_file(gpkg, layer=layer)
+            for layer in fiona.listlayers(gpkg)}
+
+
+def test_get_windows():
+    windows = update_inventory.get_windows('2020-01-15 10:00:01',
+                                           '2020-03-10')
+    assert windows == [('2020-01-15 10:00:01', '2020-02-01 00:00:00'),
+                       ('2020-02-01 00:00:00', '2020-03-01 00:00:00'),
+                       ('2020-03-01 00:00:00', '2020-03-10 00:00:00')]
+
+
+def test_ingest_new_inventory(tmpdir, stub_asf):
+    stub, url = stub_asf
+    gpkg = str(tmpdir.join('asf_inventory.gpkg'))
+    update_inventory.main(['-i', gpkg, '-e', '2020-06-01', '--url', url,
+                           '-w', '4'])
+    layers = read_layers(gpkg)
+    assert sorted(layers) == ['83', '90']
+    for gf in layers.values():
+        assert len(gf) == 20*5
+        assert gf.startTime.is_monotonic_increasing
+    assert not Path(gpkg + '.checkpoint').exists()
+
+    # next run only asks for scenes after the last one
+    stub.requests.clear()
+    update_inventory.main(['-i', gpkg, '-e', '2020-06-01', '--url', url])
+    assert all(start > pd.Timestamp('2020-03-24 18:02') for start, end in
+               stub.requests)
+    assert len(read_layers(gpkg)['83']) == 20*5
+
+
+def test_resume_after_failure(tmpdir, stub_asf):
+    stub, url = stub_asf
+    gpkg = str(tmpdir.join('asf_inventory.gpkg'))
+    stub.fail = {'2020-02-01'}
+    # synthetic acquisitions are 6 days apart
+    args = ['-i', gpkg, '-e', '2020-06-01', '--url', url, '--retries', '0',
+            '--max-gap', '7']
+    with pytest.raises(RuntimeError):
+        update_inventory.main(args)
+    assert not Path(gpkg).exists()
+    with open(Path(gpkg + '.checkpoint', 'manifest.json')) as f:
+        manifest = json.load(f)
+    failed = [w for w in manifest['windows'].values()
+              if w['status'] == 'failed']
+    assert [w['start'] for w in failed] == ['2020-02-01 00:00:00']
+
+    stub.fail = set()
+    stub.requests.clear()
+    update_inventory.main(args)
+    assert stub.requests == [(pd.Timestamp('2020-02-01'),
+                              pd.Timestamp('2020-03-01'))]
+    assert len(read_layers(gpkg)['90']) == 20*5
+
+
+def test_rerun_after_partial_write(tmpdir, stub_asf, monkeypatch):
+    ''' layers written before a failed write are not appended twice '''
+    stub, url = stub_asf
+    gpkg = str(tmpdir.join('asf_inventory.gpkg'))
+    args = ['-i', gpkg, '-e', '2020-03-01', '--url', url]
+    update_inventory.main(args)
+    args[3] = '2020-06-01'
+    to_file = gpd.GeoDataFrame.to_file
+
+    def fail_on_90(gf, path, layer=None, **kwargs):
+        if layer == '90':
+            raise RuntimeError('disk full')
+        return to_file(gf, path, layer=layer, **kwargs)
+
+    monkeypatch.setattr(gpd.GeoDataFrame, 'to_file', fail_on_90)
+    with pytest.raises(RuntimeError, match='disk full'):
+        update_inventory.main(args)
+    assert Path(gpkg + '.checkpoint').exists()
+    monkeypatch.setattr(gpd.GeoDataFrame, 'to_file', to_file)
+    update_inventory.main(args)
+    for gf in read_layers(gpkg).values():
+        assert len(gf) == 20*5
+        assert gf.sceneName.is_unique
+
+
+def test_split_truncated_windows(tmpdir, stub_asf):
+    stub, url = stub_asf
+    gpkg = str(tmpdir.join('asf_inventory.gpkg'))
+    # months hold up to 8 acquisitions x 2 paths x 5 frames = 80 scenes
+    args = ['-i', gpkg, '-e', '2020-06-01', '--url', url,
+            '--max-results', '30']
+    update_inventory.main(args)
+    for gf in read_layers(gpkg).values():
+        assert len(gf) == 20*5
+    with open(gpkg + '.windows.json') as f:
+        history = json.load(f)
+    split = [k for k, w in history.items() if w['status'] == 'split']
+    assert '2020-01-01 00:00:00/2020-02-01 00:00:00' in split
+    assert all(w['count'] < 30 for w in history.values()
+               if w['status'] == 'complete')
+
+    # a rebuild goes straight to the pieces of known busy windows
+    os.remove(gpkg)
+    stub.requests.clear()
+    update_inventory.main(args)
+    assert len(stub.requests) == sum(w['status'] == 'complete'
+                                     for w in history.values())
+    assert len(read_layers(gpkg)['83']) == 20*5
+
+
+def test_requery_uncovered_window_start(tmpdir, stub_asf):
+    ''' a response cut below maxResults misses the oldest scenes, the
+    start of its window is queried again '''
+    stub, url = stub_asf
+    stub.cap = 25
+    gpkg = str(tmpdir.join('asf_inventory.gpkg'))
+    update_inventory.main(['-i', gpkg, '-e', '2020-06-01', '--url', url])
+    for gf in read_layers(gpkg).values():
+        assert len(gf) == 20*5
+    # the newest 25 scenes in January start on the 18th
+    assert (pd.Timestamp('2020-01-01'), pd.Timestamp('2020-01-18 18:00')) \
+        in stub.requests
+    with open(gpkg + '.windows.json') as f:
+        history = json.load(f)
+    entry = history['2020-01-01 00:00:00/2020-02-01 00:00:00']
+    assert entry['status'] == 'split' and entry['count'] == 25
+
+
+def test_split_timed_out_windows(tmpdir, stub_asf, monkeypatch):
+    ''' a window that times out is queried once, not retried, and split '''
+    stub, url = stub_asf
+    monkeypatch.setattr(update_inventory, 'TIMEOUT', 0.5)
+    stub.slow = {'2020-02-10'}
+    gpkg = str(tmpdir.join('asf_inventory.gpkg'))
+    update_inventory.main(['-i', gpkg, '-e', '2020-06-01', '--url', url])
+    month = (pd.Timestamp('2020-02-01'), pd.Timestamp('2020-03-01'))
+    assert stub.requests.count(month) == 1
+    assert (month[0], pd.Timestamp('2020-02-15 12:00')) in stub.requests
+    for gf in read_layers(gpkg).values():
+        assert len(gf) == 20*5
+    with open(gpkg + '.windows.json') as f:
+        history = json.load(f)
+    entry = history['2020-02-01 00:00:00/2020-03-01 00:00:00']
+    assert entry['status'] == 'split' and entry['count'] is None